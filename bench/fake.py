@@ -0,0 +1,92 @@
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from pdep.trace import trace_api_call
+
+
+class FakeNotFound(Exception):
+    pass
+
+
+class FakeClient:
+
+    def __init__(self, provider: 'FakeProvider', service):
+        self.__provider = provider
+        self.__service = service
+
+    def __getattr__(self, operation):
+        if operation.startswith("_"):
+            raise AttributeError(operation)
+        return lambda **kwargs: self.__provider.call(self.__service, operation, **kwargs)
+
+
+class FakeProvider:
+    # generic in-memory cloud: create_<kind>, describe_<kind>s, update_<kind> and delete_<kind>
+
+    def __init__(self, latency=0.0, jitter=0.0, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__lock = threading.Lock()
+        self.__items = {}
+        self.__ids = itertools.count(1)
+        self.__calls = Counter()
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def items(self):
+        return self.__items
+
+    @property
+    def calls(self) -> Counter:
+        with self.__lock:
+            return Counter(self.__calls)
+
+    def reset_calls(self):
+        with self.__lock:
+            self.__calls.clear()
+
+    def create_client(self, service):
+        return FakeClient(self, service)
+
+    def drift(self, item_id, **changes):
+        with self.__lock:
+            self.__items[item_id].update(changes)
+
+    def call(self, service, operation, **kwargs):
+        with self.__lock:
+            self.__calls[f"{service}.{operation}"] += 1
+        trace_api_call(service, operation)
+        if self.__latency or self.__jitter:
+            time.sleep(self.__latency + random.uniform(0, self.__jitter))
+
+        action, _, kind = operation.partition("_")
+        with self.__lock:
+            if action == "create":
+                item_id = f"{kind}-{next(self.__ids)}"
+                self.__items[item_id] = {"Id": item_id, "Kind": kind, "State": "available", **kwargs}
+                return dict(self.__items[item_id])
+            if action == "describe":
+                return {"Items": [dict(self.__items[item_id]) for item_id in kwargs.get("Ids", [])
+                                  if item_id in self.__items]}
+            if action == "update":
+                if kwargs["Id"] not in self.__items:
+                    raise FakeNotFound(kwargs["Id"])
+                self.__items[kwargs["Id"]].update(kwargs)
+                return dict(self.__items[kwargs["Id"]])
+            if action == "delete":
+                if self.__items.pop(kwargs["Id"], None) is None:
+                    raise FakeNotFound(kwargs["Id"])
+                return {}
+        raise Exception(f"unsupported fake operation {service}.{operation}")
@@ -0,0 +1,168 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from dataclasses_json import dataclass_json
+
+from pdep import zstr
+from pdep.aio import AsyncSimplifiedResource, AsyncBasePlan, AsyncProvider
+from pdep.plan import SimplifiedResource, BaseBackbone
+from pdep.preview import UPDATE, REPLACE
+from pdep.utils import log_func
+
+
+@dataclass_json
+@dataclass
+class NodeInput:
+    name: zstr = None
+    parent_id: zstr = None
+    level: int = 0
+    tags: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass_json
+@dataclass
+class NodeOutput:
+    id: zstr = None
+    name: zstr = None
+
+
+def describe_nodes(provider, ids):
+    res = provider.create_client('bench').describe_nodes(Ids=ids)
+    return {item['Id']: item for item in res['Items']}
+
+
+class Node(SimplifiedResource[NodeInput, NodeOutput]):
+
+    @log_func()
+    def create(self, provider, apply_uuid, dry):
+        if dry:
+            self._output.id = "node-dummy-id"
+            return
+        item = provider.create_client('bench').create_node(
+            Name=self.input.name,
+            ParentId=self.input.parent_id,
+            Tags=dict(self.input.tags)
+        )
+        self._output.id = item['Id']
+        self._output.name = self.input.name
+
+    @classmethod
+    def describe(cls, provider, outputs: List[NodeOutput]):
+        found = describe_nodes(provider, [output.id for output in outputs])
+        return [found.get(output.id) for output in outputs]
+
+    @log_func()
+    def is_drifted(self, provider, dry):
+        item = self.get_description(provider)
+        return item is None or item['Name'] != self.input.name or item['Tags'] != self.input.tags
+
+    def plan_change(self, env_inputs: NodeInput) -> str:
+        if env_inputs.name != self.input.name or env_inputs.parent_id != self.input.parent_id:
+            return REPLACE
+        return UPDATE
+
+    @log_func()
+    def update(self, env_inputs: NodeInput, resource_manager, provider, apply_uuid, dry):
+        if self.plan_change(env_inputs) == REPLACE:
+            return False
+        if not dry:
+            provider.create_client('bench').update_node(Id=self._output.id, Tags=dict(self.input.tags))
+        return True
+
+    @log_func()
+    def do_destroy(self, env_inputs: NodeInput, resource_manager, provider, apply_uuid, dry):
+        if not dry:
+            provider.create_client('bench').delete_node(Id=self._output.id)
+
+
+class AsyncNode(AsyncSimplifiedResource[NodeInput, NodeOutput]):
+
+    @log_func()
+    async def create(self, provider: AsyncProvider, apply_uuid, dry):
+        if dry:
+            self._output.id = "node-dummy-id"
+            return
+        item = await provider.call('bench', 'create_node',
+                                   Name=self.input.name,
+                                   ParentId=self.input.parent_id,
+                                   Tags=dict(self.input.tags))
+        self._output.id = item['Id']
+        self._output.name = self.input.name
+
+    @classmethod
+    def describe(cls, provider, outputs: List[NodeOutput]):
+        found = describe_nodes(provider, [output.id for output in outputs])
+        return [found.get(output.id) for output in outputs]
+
+    @log_func()
+    async def is_drifted(self, provider: AsyncProvider, dry):
+        item = await self.get_description_async(provider)
+        return item is None or item['Name'] != self.input.name or item['Tags'] != self.input.tags
+
+    def plan_change(self, env_inputs: NodeInput) -> str:
+        if env_inputs.name != self.input.name or env_inputs.parent_id != self.input.parent_id:
+            return REPLACE
+        return UPDATE
+
+    @log_func()
+    async def update(self, env_inputs: NodeInput, resource_manager, provider: AsyncProvider, apply_uuid, dry):
+        if self.plan_change(env_inputs) == REPLACE:
+            return False
+        if not dry:
+            await provider.call('bench', 'update_node', Id=self._output.id, Tags=dict(self.input.tags))
+        return True
+
+    @log_func()
+    async def do_destroy(self, env_inputs: NodeInput, resource_manager, provider: AsyncProvider, apply_uuid, dry):
+        if not dry:
+            await provider.call('bench', 'delete_node', Id=self._output.id)
+
+
+@dataclass_json
+@dataclass
+class TreeInput:
+    count: int = 10
+    fanout: int = 4
+    depth: int = 0
+    prefix: zstr = "node"
+    tags: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass_json
+@dataclass
+class TreeOutput:
+    root: NodeOutput = None
+    count: int = 0
+
+
+class TreePlan(BaseBackbone[TreeInput, TreeOutput]):
+    # breadth first tree of `count` nodes, every node depends on its parent; depth 0 means unlimited
+    node_class = Node
+
+    def do_init_resources(self):
+        nodes = []
+        parents = [None]
+        level = 0
+        while len(nodes) < self.input.count and parents and (not self.input.depth or level < self.input.depth):
+            next_parents = []
+            for parent in parents:
+                for i in range(1 if parent is None else self.input.fanout):
+                    if len(nodes) >= self.input.count:
+                        break
+                    node = self.node_class(NodeInput(
+                        name=f"{self.input.prefix}-{len(nodes)}",
+                        parent_id=parent.output.id if parent else None,
+                        level=level,
+                        tags=dict(self.input.tags)
+                    ))
+                    nodes.append(node)
+                    next_parents.append(node)
+            parents = next_parents
+            level += 1
+
+        self.resources.nodes = nodes
+        self._output = TreeOutput(root=nodes[0].output if nodes else None, count=len(nodes))
+
+
+class AsyncTreePlan(AsyncBasePlan[TreeInput, TreeOutput], TreePlan):
+    node_class = AsyncNode
@@ -0,0 +1,139 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from uuid import UUID
+
+from bench.fake import FakeProvider
+from bench.plans import TreePlan, TreeInput
+from pdep import FileResourceManager, SqliteResourceManager, JournalResourceManager, Tracer
+from pdep.aws.dynamodb import DynamoDbResourceManager, InMemoryDynamoDbTable
+
+PLAN_UUID = UUID('5f0e4b7e-2a43-4c4f-9a53-8b1d2e6f7a10')
+
+MANAGERS = {
+    "file": lambda folder: FileResourceManager(Path(folder, "state.json"), cached=True),
+    "file-uncached": lambda folder: FileResourceManager(Path(folder, "state.json")),
+    "file-compact": lambda folder: FileResourceManager(Path(folder, "state.json"), cached=True, codec="json-compact"),
+    "file-orjson": lambda folder: FileResourceManager(Path(folder, "state.json"), cached=True, codec="orjson"),
+    "file-msgpack": lambda folder: FileResourceManager(Path(folder, "state.bin"), cached=True, codec="msgpack"),
+    "sqlite": lambda folder: SqliteResourceManager(Path(folder, "state.db")),
+    "journal": lambda folder: JournalResourceManager(Path(folder, "state.journal")),
+    "dynamodb-memory": lambda folder: DynamoDbResourceManager(InMemoryDynamoDbTable()),
+}
+
+
+def state_size(folder) -> int:
+    return sum(path.stat().st_size for path in Path(folder).iterdir() if path.is_file())
+
+
+def run_phase(name, provider: FakeProvider, func):
+    provider.reset_calls()
+    start_t = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start_t
+    return {f"{name}_s": round(duration, 4), f"{name}_calls": sum(provider.calls.values())}
+
+
+def bench_size(count, fanout, depth, manager, latency, max_workers, memory=True):
+    result = {"count": count, "fanout": fanout, "depth": depth, "manager": manager, "latency": latency,
+              "max_workers": max_workers}
+    tree_input = TreeInput(count=count, fanout=fanout, depth=depth)
+
+    with tempfile.TemporaryDirectory() as folder:
+        provider = FakeProvider(latency=latency)
+        rm = MANAGERS[manager](folder)
+
+        def apply(check_drift):
+            TreePlan(tree_input, PLAN_UUID).apply(rm, provider, check_drift=check_drift, max_workers=max_workers)
+
+        result.update(run_phase("apply", provider, lambda: apply(False)))
+        result["nodes"] = len(provider.items)
+        result["state_bytes"] = state_size(folder)
+        result.update(run_phase("preview", provider, lambda: TreePlan(tree_input, PLAN_UUID).preview(rm)))
+        result.update(run_phase("noop", provider, lambda: apply(False)))
+        result.update(run_phase("drift", provider, lambda: apply(True)))
+        result.update(run_phase("destroy", provider,
+                                lambda: TreePlan(tree_input, PLAN_UUID).destroy(rm, provider, max_workers=max_workers)))
+        if hasattr(rm, "close"):
+            rm.close()
+
+    if memory:
+        # a separate pass, tracemalloc slows everything down too much to share the timed one
+        with tempfile.TemporaryDirectory() as folder:
+            provider = FakeProvider()
+            rm = MANAGERS[manager](folder)
+            tracemalloc.start()
+            try:
+                TreePlan(tree_input, PLAN_UUID).apply(rm, provider, check_drift=False)
+                result["apply_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            finally:
+                tracemalloc.stop()
+                if hasattr(rm, "close"):
+                    rm.close()
+    return result
+
+
+def trace(count, fanout, depth, manager, latency, max_workers, path):
+    with tempfile.TemporaryDirectory() as folder:
+        rm = MANAGERS[manager](folder)
+        with Tracer() as tracer:
+            TreePlan(TreeInput(count=count, fanout=fanout, depth=depth), PLAN_UUID).apply(
+                rm, FakeProvider(latency=latency), check_drift=False, max_workers=max_workers)
+        if hasattr(rm, "close"):
+            rm.close()
+    tracer.write_chrome_trace(path)
+    print(tracer.summary())
+    print()
+
+
+COLUMNS = ["count", "manager", "apply_s", "apply_calls", "preview_s", "noop_s", "noop_calls", "drift_s", "drift_calls",
+           "destroy_s", "destroy_calls", "apply_peak_mb", "state_bytes"]
+
+
+def format_table(results) -> str:
+    lines = ["  ".join(f"{column:>13s}" for column in COLUMNS)]
+    for result in results:
+        lines.append("  ".join(f"{str(result.get(column, '-')):>13s}" for column in COLUMNS))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pdep synthetic plan benchmarks")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma separated resource counts")
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=0, help="maximum tree depth, 0 is unlimited")
+    parser.add_argument("--managers", default="file", help=f"comma separated, any of {','.join(MANAGERS)}")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake provider seconds per call")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", help="append results as json lines to this file")
+    parser.add_argument("--trace", help="write a chrome trace of the largest size's first apply to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.trace:
+        trace(int(args.sizes.split(",")[-1]), args.fanout, args.depth, args.managers.split(",")[0], args.latency,
+              args.max_workers, args.trace)
+    results = []
+    for manager in args.managers.split(","):
+        for count in (int(size) for size in args.sizes.split(",")):
+            result = bench_size(count, args.fanout, args.depth, manager, args.latency, args.max_workers,
+                                memory=not args.no_memory)
+            results.append(result)
+            print(format_table([result]).splitlines()[-1] if len(results) > 1 else format_table([result]),
+                  flush=True)
+
+    if args.json:
+        with open(args.json, "a") as fp:
+            for result in results:
+                fp.write(json.dumps({"at": time.time(), "pid": os.getpid(), **result}) + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+from bench.plans import NodeInput, NodeOutput
+from pdep.aws.backbones.net.interfaces import BasicNetBBOutput, BasicNetBBInput
+from pdep.aws.network import SubnetOutput, VpcOutput, SubnetInput
+from pdep.serde import to_dict, from_dict
+
+
+def subnet(i):
+    return SubnetOutput(arn=f"arn:aws:ec2:us-east-1:000000000000:subnet/subnet-{i}", subnet_id=f"subnet-{i}",
+                        cidr_block=f"10.0.{i}.0/24", availability_zone="us-east-1a", state="available")
+
+
+SAMPLES = [
+    NodeInput(name="node-1", parent_id="node-0", level=1, tags={"env": "bench", "owner": "pdep"}),
+    NodeOutput(id="node-1", name="node-1"),
+    SubnetInput(vpc_id="vpc-1", cidr_block="10.0.1.0/24", availability_zone="us-east-1a", tags={"env": "bench"}),
+    BasicNetBBInput(vpc_cidr_block="10.0.0.0/16", subnets_num=3, region="us-east-1", tags={"env": "bench"}),
+    BasicNetBBOutput(region="us-east-1", vpc=VpcOutput(vpc_id="vpc-1", cidr_block="10.0.0.0/16"),
+                     subnets=[subnet(i) for i in range(3)], public_subnets=[subnet(i) for i in range(3, 6)],
+                     private_subnets=[subnet(i) for i in range(6, 9)], db_subnets=[subnet(i) for i in range(9, 12)]),
+]
+
+
+def timed(func, number):
+    start_t = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start_t) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pdep.serde against dataclasses_json")
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'type':20s} {'to_dict us':>12s} {'compiled':>10s} {'speedup':>8s} "
+          f"{'from_dict us':>13s} {'compiled':>10s} {'speedup':>8s}")
+    for sample in SAMPLES:
+        cls = sample.__class__
+        data = sample.to_dict()
+        assert to_dict(sample) == data and from_dict(cls, data) == cls.from_dict(data), cls.__name__
+
+        to_old = timed(lambda: sample.to_dict(), args.number)
+        to_new = timed(lambda: to_dict(sample), args.number)
+        from_old = timed(lambda: cls.from_dict(data), args.number)
+        from_new = timed(lambda: from_dict(cls, data), args.number)
+        print(f"{cls.__name__:20s} {to_old:12.2f} {to_new:10.2f} {to_old / to_new:7.1f}x "
+              f"{from_old:13.2f} {from_new:10.2f} {from_old / from_new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
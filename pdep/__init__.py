@@ -1,5 +1,13 @@
 from pdep.plan import BaseResource, Connector, BasePlan, FileResourceManager, zstr, AwsLocalStackProvider
 from pdep.plan import output_property
+from pdep.codecs import StateCodec
+from pdep.drift import DriftCache
+from pdep.trace import Tracer
+from pdep.graph import DependencyGraph
+from pdep.sqlite import SqliteResourceManager
+from pdep.journal import JournalResourceManager
+from pdep.runner import FanOutRunner, Environment
+from pdep.aio import AsyncProvider, ThreadedAsyncProvider, AsyncSimplifiedResource, AsyncBasePlan
 
 __all__ = [
     "BaseResource",
@@ -7,7 +15,19 @@ __all__ = [
     "Connector",
     "resource",
     "FileResourceManager",
+    "SqliteResourceManager",
+    "JournalResourceManager",
+    "StateCodec",
     "zstr",
     "AwsLocalStackProvider",
-    "output_property"
+    "output_property",
+    "DriftCache",
+    "Tracer",
+    "DependencyGraph",
+    "AsyncProvider",
+    "ThreadedAsyncProvider",
+    "AsyncSimplifiedResource",
+    "AsyncBasePlan",
+    "FanOutRunner",
+    "Environment"
 ]
\ No newline at end of file
@@ -0,0 +1,43 @@
+import argparse
+import logging
+
+from pdep.codecs import CODECS, available_codecs, migrate_state_file
+
+
+def migrate(args):
+    for src in args.src:
+        dst = migrate_state_file(src, args.output, args.codec)
+        print(f"{src} -> {dst} ({args.codec})")
+
+
+def codecs(args):
+    available = available_codecs()
+    for name in CODECS:
+        print(f"{name:15s} {'available' if name in available else 'not installed'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pdep")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_migrate = commands.add_parser("migrate", help="re-encode state files with another codec",
+                                         description="FileResourceManager without a codec keeps writing a state "
+                                                     "file in the codec it was migrated to")
+    parser_migrate.add_argument("src", nargs="+", help="state file, journal snapshot or sqlite database")
+    parser_migrate.add_argument("--codec", default="json",
+                                help=f"one of {', '.join(CODECS)}, optionally with a '+zlib' suffix")
+    parser_migrate.add_argument("-o", "--output", help="write here instead of in place, single src only")
+    parser_migrate.set_defaults(func=migrate)
+
+    parser_codecs = commands.add_parser("codecs", help="list state codecs")
+    parser_codecs.set_defaults(func=codecs)
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate" and args.output and len(args.src) > 1:
+        parser_migrate.error("-o/--output takes a single src")
+    logging.basicConfig(level=logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
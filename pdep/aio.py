@@ -0,0 +1,431 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from pdep.executor import AsyncDagExecutor
+from pdep.inter import implements
+from pdep.trace import trace_span
+from pdep.plan import BaseResource, BasePlan, SimplifiedResource, ResourceManager, InputT, OutputT, \
+    state_transaction, _to_destroy_dependencies, _NOT_DESCRIBED
+from pdep.utils import log_func, load_class_from_str, Backoff, DEFAULT_BACKOFF
+
+
+@contextlib.asynccontextmanager
+async def state_transaction_async(resource_manager: ResourceManager, provider: 'AsyncProvider', apply_uuid, logger,
+                                  active=True):
+    # the sync engine's transaction, entered and left on the provider's threads
+    transaction = state_transaction(resource_manager, apply_uuid, logger, active)
+    await provider.run(transaction.__enter__)
+    try:
+        yield
+    except BaseException as e:
+        if not await provider.run(transaction.__exit__, type(e), e, e.__traceback__):
+            raise
+    else:
+        await provider.run(transaction.__exit__, None, None, None)
+
+
+class AsyncProvider:
+
+    @property
+    def sync_provider(self):
+        pass
+
+    async def run(self, func: Callable, *args) -> Any:
+        pass
+
+    async def call(self, service: str, operation: str, **kwargs) -> Any:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+@implements(AsyncProvider)
+class ThreadedAsyncProvider(AsyncProvider):
+
+    def __init__(self, provider, max_workers=32, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__provider = provider
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdep-aio")
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def sync_provider(self):
+        return self.__provider
+
+    async def run(self, func: Callable, *args) -> Any:
+        # the caller's context carries the current trace span into the worker thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.__pool, context.run, func, *args)
+
+    async def call(self, service: str, operation: str, **kwargs) -> Any:
+        client = self.__provider.create_client(service)
+        return await self.run(functools.partial(getattr(client, operation), **kwargs))
+
+    async def close(self) -> None:
+        self.__pool.shutdown(wait=False)
+
+
+class AsyncBatchWaiter:
+
+    def __init__(self, describe_many, is_ready, backoff: Backoff = None):
+        self.__describe_many = describe_many
+        self.__is_ready = is_ready
+        self.__backoff = backoff or DEFAULT_BACKOFF
+        self.__pending = {}
+        self.__poller = None
+
+    async def wait(self, key, timeout):
+        future = asyncio.get_running_loop().create_future()
+        self.__pending.setdefault(key, []).append(future)
+        if self.__poller is None or self.__poller.done():
+            self.__poller = asyncio.ensure_future(self.__poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"timeout")
+        finally:
+            futures = self.__pending.get(key)
+            if futures and future in futures:
+                futures.remove(future)
+                if not futures:
+                    del self.__pending[key]
+
+    async def __poll(self):
+        # a single task polls for every pending key
+        delays = self.__backoff.delays()
+        while self.__pending:
+            await asyncio.sleep(next(delays))
+            keys = list(self.__pending)
+            if not keys:
+                break
+            try:
+                descriptions = await self.__describe_many(keys)
+            except Exception as e:
+                for key in keys:
+                    for future in self.__pending.pop(key, []):
+                        if not future.done():
+                            future.set_exception(e)
+                continue
+            for key in keys:
+                description = descriptions.get(key)
+                if description is not None and self.__is_ready(description):
+                    for future in self.__pending.pop(key, []):
+                        if not future.done():
+                            future.set_result(description)
+
+
+_shared_async_waiters = weakref.WeakKeyDictionary()
+
+
+def shared_async_batch_waiter(owner, name, describe_many, is_ready, backoff: Backoff = None) -> AsyncBatchWaiter:
+    waiters = _shared_async_waiters.setdefault(owner, {})
+    if name not in waiters:
+        owner_ref = weakref.ref(owner)
+        waiters[name] = AsyncBatchWaiter(lambda keys: describe_many(owner_ref(), keys), is_ready, backoff)
+    return waiters[name]
+
+
+async def apply_async(res: BaseResource, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                      check_drift=True, apply_uuid=None):
+    if isinstance(res, (AsyncSimplifiedResource, AsyncBasePlan)):
+        await res.apply_async(resource_manager, provider, dry, check_drift, apply_uuid)
+    elif not res._applied:
+        # sync resources keep working through the provider's executor
+        await provider.run(res.apply, resource_manager, provider.sync_provider, dry, check_drift, apply_uuid)
+
+
+async def destroy_async(res: BaseResource, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                        from_deleted=False, apply_uuid=None):
+    if isinstance(res, AsyncSimplifiedResource):
+        await res.destroy_async(resource_manager, provider, dry, from_deleted, apply_uuid)
+    elif isinstance(res, AsyncBasePlan):
+        await res.destroy_async(resource_manager, provider, dry, apply_uuid)
+    elif isinstance(res, BasePlan):
+        if not res._applied:
+            await provider.run(functools.partial(res.destroy, resource_manager, provider.sync_provider, dry,
+                                                 apply_uuid=apply_uuid))
+    elif not res._applied:
+        await provider.run(functools.partial(res.destroy, resource_manager, provider.sync_provider, dry,
+                                             from_deleted=from_deleted, apply_uuid=apply_uuid))
+
+
+def _run_sync(coro_func, provider, max_workers, *args):
+    async def run():
+        if isinstance(provider, AsyncProvider):
+            # the caller's provider, and its pool, is reused and stays open
+            return await coro_func(*args[:1], provider, *args[1:])
+        async_provider = ThreadedAsyncProvider(provider, max_workers)
+        try:
+            return await coro_func(*args[:1], async_provider, *args[1:])
+        finally:
+            await async_provider.close()
+
+    return asyncio.run(run())
+
+
+class AsyncSimplifiedResource(SimplifiedResource[InputT, OutputT]):
+
+    async def wait_until_ready_async(self, provider: AsyncProvider, name, key, describe_many, is_ready,
+                                     timeout=None):
+        waiter = shared_async_batch_waiter(provider, f"{self.class_full_name}.{name}", describe_many, is_ready,
+                                           self.wait_backoff)
+        with trace_span("wait", self, waiter=name):
+            return await waiter.wait(key, timeout if timeout is not None else self.wait_timeout)
+
+    def apply(self, resource_manager: ResourceManager, provider, dry=False, check_dirft=True, apply_uuid=None):
+        if not self._applied:
+            # a single resource awaits one step at a time, a few threads are plenty
+            _run_sync(self.apply_async, provider, 4, resource_manager, dry, check_dirft, apply_uuid)
+
+    def destroy(self, resource_manager: ResourceManager, provider, dry=False, from_deleted=False, apply_uuid=None):
+        if not self._applied:
+            _run_sync(self.destroy_async, provider, 4, resource_manager, dry, from_deleted, apply_uuid)
+
+    @log_func()
+    async def apply_async(self, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                          check_drift=True, apply_uuid=None):
+        if self._applied:
+            return
+
+        first_apply = apply_uuid is None
+        if not apply_uuid:
+            apply_uuid = uuid.uuid4()
+            self.logger.info(f"New Apply apply_uuid:{apply_uuid}")
+
+        async with state_transaction_async(resource_manager, provider, apply_uuid, self.logger, active=first_apply):
+            for res in self._dependencies_to_apply():
+                await apply_async(res, resource_manager, provider, dry, check_drift, apply_uuid)
+
+            self.logger.debug(f"{self.full_name} apply dry:{dry}")
+            with trace_span("apply", self):
+                skip, input = await provider.run(self._begin_apply, resource_manager, check_drift)
+                if not skip:
+                    await self.do_apply_async(input, resource_manager, provider, dry, check_drift, apply_uuid)
+                    await provider.run(self._end_apply, resource_manager, apply_uuid)
+
+        if first_apply:
+            self.logger.info(f"Apply Finished apply_uuid:{apply_uuid}")
+
+    @log_func()
+    async def destroy_async(self, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                            from_deleted=False, apply_uuid=None):
+        if self._applied:
+            return
+
+        first_apply = apply_uuid is None
+        if not apply_uuid:
+            apply_uuid = uuid.uuid4()
+            self.logger.info(f"New Destroy apply_uuid:{apply_uuid}")
+
+        async with state_transaction_async(resource_manager, provider, apply_uuid, self.logger, active=first_apply):
+            if not from_deleted:
+                for res in self._dependents_to_destroy():
+                    await destroy_async(res, resource_manager, provider, dry, apply_uuid=apply_uuid)
+            org_output = self._output
+            with trace_span("destroy", self):
+                input = await provider.run(self._begin_destroy, resource_manager, from_deleted)
+                await self._traced_do_destroy_async(input, resource_manager, provider, apply_uuid, dry)
+                await provider.run(self._end_destroy, resource_manager, from_deleted, org_output)
+
+        if first_apply:
+            self.logger.info(f"Destroy Finished")
+
+    @log_func()
+    async def do_apply_async(self, env_inputs: InputT, resource_manager, provider: AsyncProvider, dry, check_drift,
+                             apply_uuid):
+        try:
+            await self._do_apply_async(env_inputs, resource_manager, provider, dry, check_drift, apply_uuid)
+        finally:
+            self._description = _NOT_DESCRIBED
+
+    async def _do_apply_async(self, env_inputs: InputT, resource_manager, provider: AsyncProvider, dry,
+                              check_drift, apply_uuid):
+        if env_inputs is None:
+            ret = await self._traced_create_async(provider, apply_uuid, dry)
+            if ret is False:
+                await self._traced_do_destroy_async(self.input, resource_manager, provider, apply_uuid, dry)
+                await self._traced_create_async(provider, apply_uuid, dry)
+            return
+        if env_inputs != self.input or (check_drift and await self._check_drifted_async(provider, dry)):
+            with trace_span("update", self):
+                updated = await self.update(env_inputs, resource_manager, provider, apply_uuid, dry)
+            if not updated:
+                if self.create_before_destroy:
+                    await provider.run(self.mark_destroy, resource_manager, env_inputs, apply_uuid)
+                else:
+                    await self._traced_do_destroy_async(env_inputs, resource_manager, provider, apply_uuid, dry)
+                ret = await self._traced_create_async(provider, apply_uuid, dry)
+                if ret is False:
+                    await self._traced_do_destroy_async(self.input, resource_manager, provider, apply_uuid, dry)
+                    await self._traced_create_async(provider, apply_uuid, dry)
+
+        else:
+            self.logger.info("nothing to do")
+
+    async def _check_drifted_async(self, provider: AsyncProvider, dry):
+        if self._drift_cached_clean():
+            return False
+        with trace_span("is_drifted", self):
+            drifted = await self.is_drifted(provider, dry)
+        self._record_drift_result(drifted, dry)
+        return drifted
+
+    async def _traced_create_async(self, provider: AsyncProvider, apply_uuid, dry):
+        with trace_span("create", self):
+            return await self.create(provider, apply_uuid, dry)
+
+    async def _traced_do_destroy_async(self, env_inputs: InputT, resource_manager, provider: AsyncProvider,
+                                       apply_uuid, dry):
+        with trace_span("do_destroy", self):
+            return await self.do_destroy(env_inputs, resource_manager, provider, apply_uuid, dry)
+
+    async def get_description_async(self, provider: AsyncProvider):
+        return await provider.run(self.get_description, provider.sync_provider)
+
+    @log_func()
+    async def update(self, env_inputs: InputT, resource_manager, provider: AsyncProvider, apply_uuid, dry):
+        return False
+
+    @log_func()
+    async def do_destroy(self, env_inputs: InputT, resource_manager, provider: AsyncProvider, apply_uuid, dry):
+        pass
+
+    @log_func()
+    async def create(self, provider: AsyncProvider, apply_uuid, dry):
+        pass
+
+    @log_func()
+    async def is_drifted(self, provider: AsyncProvider, dry):
+        pass
+
+
+class AsyncBasePlan(BasePlan[InputT, OutputT]):
+
+    def apply(self, resource_manager: ResourceManager, provider, dry=False, check_drift=True, apply_uuid=None,
+              max_workers=None):
+        if not self._applied:
+            max_workers = max_workers or 64
+            _run_sync(self.apply_async, provider, max_workers, resource_manager, dry, check_drift, apply_uuid,
+                      max_workers)
+
+    def destroy(self, resource_manager: ResourceManager, provider, dry=False, apply_uuid=None, max_workers=None):
+        if not self._applied:
+            max_workers = max_workers or 64
+            _run_sync(self.destroy_async, provider, max_workers, resource_manager, dry, apply_uuid, max_workers)
+
+    @log_func()
+    async def apply_async(self, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                          check_drift=True, apply_uuid=None, max_concurrency=64):
+        if self._applied:
+            return
+
+        first_apply = apply_uuid is None
+        if not apply_uuid:
+            apply_uuid = uuid.uuid4()
+            self.logger.info(f"New Apply apply_uuid:{apply_uuid}")
+
+        self.logger.debug(f"{self.full_name} apply dry:{dry}")
+
+        def begin_apply():
+            self._prefetch_states(resource_manager, resources)
+            found, state_dict = self._take_prefetched_state(self.uuid)
+            self._on_state_read(state_dict)
+            self.resolve_dependent_values()
+            return self._skip_memoized(resource_manager, state_dict, check_drift)
+
+        with trace_span("plan_apply", plan=self.class_full_name):
+            self.reset_apply_state()
+            resources = [value for path, value in self.resources.items() if isinstance(value, BaseResource)]
+            async with state_transaction_async(resource_manager, provider, apply_uuid, self.logger, active=first_apply):
+                try:
+                    if not await provider.run(begin_apply):
+                        if check_drift and not dry:
+                            with trace_span("prefetch_descriptions"):
+                                await provider.run(self._prefetch_descriptions, resources, resource_manager,
+                                                   provider.sync_provider)
+                        await AsyncDagExecutor(max_concurrency, logger=self.logger).run_graph(
+                            self.dependency_graph(),
+                            lambda res: apply_async(res, resource_manager, provider, dry, check_drift, apply_uuid)
+                        )
+
+                        self._resolve_output_values()
+                        await provider.run(resource_manager.set_state, self.uuid,
+                                           self._create_plan_state_dict(apply_uuid, dry))
+
+                    with trace_span("clean_to_destroy"):
+                        await self._clean_to_destroy_async(resource_manager, provider, dry, apply_uuid, max_concurrency)
+
+                    self._applied = True
+                finally:
+                    self._clear_prefetched_states()
+
+        if first_apply:
+            self.logger.info(f"Apply Finished plan:'{self.full_name}' output:{self.output} apply_uuid:{apply_uuid}")
+
+    @log_func()
+    async def destroy_async(self, resource_manager: ResourceManager, provider: AsyncProvider, dry=False,
+                            apply_uuid=None, max_concurrency=64):
+        if self._applied:
+            return
+
+        first_apply = apply_uuid is None
+        if not apply_uuid:
+            apply_uuid = uuid.uuid4()
+            self.logger.info(f"New Destroy apply_uuid:{apply_uuid}")
+
+        with trace_span("plan_destroy", plan=self.class_full_name):
+            self.reset_apply_state()
+            async with state_transaction_async(resource_manager, provider, apply_uuid, self.logger, active=first_apply):
+                try:
+                    resources = [res for path, res in self.resources.items()]
+                    await provider.run(self._prefetch_states, resource_manager, resources)
+                    await AsyncDagExecutor(max_concurrency, fail_fast=False, logger=self.logger).run_graph(
+                        self.destroy_graph(),
+                        lambda res: destroy_async(res, resource_manager, provider, dry, apply_uuid=apply_uuid)
+                    )
+                    await provider.run(resource_manager.delete_state, self.uuid)
+                    self._applied = True
+                finally:
+                    self._clear_prefetched_states()
+
+        if first_apply:
+            self.logger.info(f"Destroy Finished apply_uuid:{apply_uuid}")
+
+    async def _clean_to_destroy_async(self, resource_manager: ResourceManager, provider: AsyncProvider, dry,
+                                      apply_uuid, max_concurrency):
+        to_destroy = await provider.run(resource_manager.get_to_destroy)
+
+        async def destroy_state(state):
+            cls = load_class_from_str(state['class'])
+            self.logger.info(f"Destroying class:{cls} uuid:{state['uuid']}")
+            res = cls(state['input'])
+            res._set_uuid(state['uuid'])
+            await destroy_async(res, resource_manager, provider, dry, from_deleted=True, apply_uuid=apply_uuid)
+            self.logger.info(f"Destroying class:{cls} uuid:{state['uuid']} - Done")
+
+        # states written before 'depends' was recorded can only be destroyed in reverse order
+        if all('depends' in state for state in to_destroy):
+            destroy_before = _to_destroy_dependencies(to_destroy)
+            await AsyncDagExecutor(max_concurrency, fail_fast=False, logger=self.logger).run(
+                range(len(to_destroy)),
+                lambda i: destroy_before[i],
+                lambda i: destroy_state(to_destroy[i])
+            )
+        else:
+            for state in reversed(to_destroy):
+                await destroy_state(state)
@@ -0,0 +1,612 @@
+import logging
+import threading
+import time
+from hashlib import md5
+from typing import Dict, Any, List, Type, Tuple, Iterable
+from uuid import UUID
+
+import botocore.exceptions
+
+from pdep.codecs import StateCodec, get_codec, decode_state, encode_column
+from pdep.inter import implements
+from pdep.plan import ResourceManager, TransactionalResourceManager, OutputTypeNotFound, StateConflict
+from pdep.serde import from_dict
+from pdep.utils import log_func, class_full_name, Backoff
+
+OUTPUTS_INDEX = "folder_output_type"
+
+STATE_SK = "state"
+
+# TransactWriteItems takes at most this many actions
+TRANSACT_LIMIT = 100
+
+
+class DynamoDbTable:
+    # items are flat dicts of str, int and bytes; the key is (pk, sk), the outputs index is (otk, folder)
+
+    def get(self, pk: str, sk: str) -> dict | None:
+        pass
+
+    def batch_get(self, keys: List[Tuple[str, str]]) -> List[dict]:
+        pass
+
+    def put(self, item: dict, expected_version: int | None) -> None:
+        pass
+
+    def delete(self, pk: str, sk: str, expected_version: int | None = None) -> None:
+        pass
+
+    def query(self, pk: str) -> List[dict]:
+        pass
+
+    def query_outputs(self, otk: str, max_folder: str) -> List[dict]:
+        pass
+
+    def transact_write(self, puts: List[Tuple[dict, int | None]], deletes: List[Tuple[str, str, int | None]],
+                       token: str = None) -> None:
+        pass
+
+
+def _marshal(item: dict) -> dict:
+    attrs = {}
+    for key, value in item.items():
+        if value is None:
+            continue
+        if isinstance(value, int):
+            attrs[key] = {"N": str(value)}
+        elif isinstance(value, bytes):
+            attrs[key] = {"B": value}
+        else:
+            attrs[key] = {"S": value}
+    return attrs
+
+
+def _unmarshal(attrs: dict) -> dict:
+    item = {}
+    for key, value in attrs.items():
+        if "N" in value:
+            item[key] = int(value["N"])
+        elif "B" in value:
+            item[key] = bytes(value["B"])
+        else:
+            item[key] = value["S"]
+    return item
+
+
+def _is_condition_failure(e: botocore.exceptions.ClientError):
+    return e.response['Error']['Code'] in ("ConditionalCheckFailedException", "TransactionCanceledException")
+
+
+def _put_condition(expected_version: int | None) -> dict:
+    if expected_version is None:
+        return {"ConditionExpression": "attribute_not_exists(pk)"}
+    return {"ConditionExpression": "version = :expected",
+            "ExpressionAttributeValues": _marshal({":expected": expected_version})}
+
+
+def _delete_condition(expected_version: int | None) -> dict:
+    if expected_version is None:
+        return {}
+    return {"ConditionExpression": "attribute_not_exists(pk) OR version = :expected",
+            "ExpressionAttributeValues": _marshal({":expected": expected_version})}
+
+
+def _chunks(items: list, size: int) -> Iterable[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+@implements(DynamoDbTable)
+class Boto3DynamoDbTable(DynamoDbTable):
+
+    def __init__(self, client, table_name: str, backoff: Backoff = None, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__client = client
+        self.__table_name = table_name
+        self.__backoff = backoff if backoff else Backoff(initial=0.05, cap=2.0)
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def table_name(self):
+        return self.__table_name
+
+    @classmethod
+    def create(cls, client, table_name: str, wait=True, **kwargs) -> 'Boto3DynamoDbTable':
+        try:
+            client.create_table(
+                TableName=table_name,
+                BillingMode="PAY_PER_REQUEST",
+                AttributeDefinitions=[
+                    {"AttributeName": "pk", "AttributeType": "S"},
+                    {"AttributeName": "sk", "AttributeType": "S"},
+                    {"AttributeName": "otk", "AttributeType": "S"},
+                    {"AttributeName": "folder", "AttributeType": "S"},
+                ],
+                KeySchema=[
+                    {"AttributeName": "pk", "KeyType": "HASH"},
+                    {"AttributeName": "sk", "KeyType": "RANGE"},
+                ],
+                GlobalSecondaryIndexes=[{
+                    "IndexName": OUTPUTS_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "otk", "KeyType": "HASH"},
+                        {"AttributeName": "folder", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }],
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != "ResourceInUseException":
+                raise
+        if wait:
+            client.get_waiter("table_exists").wait(TableName=table_name)
+        return cls(client, table_name, **kwargs)
+
+    def get(self, pk: str, sk: str) -> dict | None:
+        res = self.__client.get_item(TableName=self.__table_name, Key=_marshal({"pk": pk, "sk": sk}),
+                                     ConsistentRead=True)
+        return _unmarshal(res["Item"]) if "Item" in res else None
+
+    def batch_get(self, keys: List[Tuple[str, str]]) -> List[dict]:
+        items = []
+        for chunk in _chunks(list(dict.fromkeys(keys)), 100):
+            request = {self.__table_name: {"Keys": [_marshal({"pk": pk, "sk": sk}) for pk, sk in chunk],
+                                           "ConsistentRead": True}}
+            delays = self.__backoff.delays()
+            while request:
+                res = self.__client.batch_get_item(RequestItems=request)
+                items.extend(_unmarshal(attrs) for attrs in res["Responses"].get(self.__table_name, []))
+                request = res.get("UnprocessedKeys")
+                if request:
+                    time.sleep(next(delays))
+        return items
+
+    def put(self, item: dict, expected_version: int | None) -> None:
+        try:
+            self.__client.put_item(TableName=self.__table_name, Item=_marshal(item), **_put_condition(expected_version))
+        except botocore.exceptions.ClientError as e:
+            if _is_condition_failure(e):
+                raise StateConflict([f"{item['pk']}/{item['sk']}"]) from e
+            raise
+
+    def delete(self, pk: str, sk: str, expected_version: int | None = None) -> None:
+        try:
+            self.__client.delete_item(TableName=self.__table_name, Key=_marshal({"pk": pk, "sk": sk}),
+                                      **_delete_condition(expected_version))
+        except botocore.exceptions.ClientError as e:
+            if _is_condition_failure(e):
+                raise StateConflict([f"{pk}/{sk}"]) from e
+            raise
+
+    def __query(self, **kwargs) -> List[dict]:
+        items = []
+        paginator = self.__client.get_paginator("query")
+        for page in paginator.paginate(TableName=self.__table_name, **kwargs):
+            items.extend(_unmarshal(attrs) for attrs in page["Items"])
+        return items
+
+    def query(self, pk: str) -> List[dict]:
+        return self.__query(KeyConditionExpression="pk = :pk", ExpressionAttributeValues=_marshal({":pk": pk}),
+                            ConsistentRead=True)
+
+    def query_outputs(self, otk: str, max_folder: str) -> List[dict]:
+        # every prefix of a folder sorts before it, so this is a range read on the index
+        return self.__query(IndexName=OUTPUTS_INDEX, KeyConditionExpression="otk = :otk AND folder <= :folder",
+                            ExpressionAttributeValues=_marshal({":otk": otk, ":folder": max_folder}))
+
+    def transact_write(self, puts: List[Tuple[dict, int | None]], deletes: List[Tuple[str, str, int | None]],
+                       token: str = None) -> None:
+        # all or nothing, unlike batch_write every action keeps its version condition
+        actions = [{"Put": {"TableName": self.__table_name, "Item": _marshal(item), **_put_condition(version)}}
+                   for item, version in puts]
+        actions += [{"Delete": {"TableName": self.__table_name, "Key": _marshal({"pk": pk, "sk": sk}),
+                                **_delete_condition(version)}} for pk, sk, version in deletes]
+        # the token makes a retried request a no-op instead of a conflict with itself
+        kwargs = {"ClientRequestToken": token} if token else {}
+        try:
+            self.__client.transact_write_items(TransactItems=actions, **kwargs)
+        except botocore.exceptions.ClientError as e:
+            if _is_condition_failure(e):
+                keys = [f"{item['pk']}/{item['sk']}" for item, version in puts] + \
+                       [f"{pk}/{sk}" for pk, sk, version in deletes]
+                reasons = e.response.get("CancellationReasons") or []
+                failed = [key for key, reason in zip(keys, reasons) if reason.get("Code") == "ConditionalCheckFailed"]
+                raise StateConflict(failed or keys) from e
+            raise
+
+
+@implements(DynamoDbTable)
+class InMemoryDynamoDbTable(DynamoDbTable):
+    # the same contract without a network, for tests and the bench
+
+    def __init__(self):
+        self.__items: Dict[Tuple[str, str], dict] = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def items(self):
+        return self.__items
+
+    def get(self, pk: str, sk: str) -> dict | None:
+        with self.__lock:
+            item = self.__items.get((pk, sk))
+            return dict(item) if item is not None else None
+
+    def batch_get(self, keys: List[Tuple[str, str]]) -> List[dict]:
+        with self.__lock:
+            return [dict(self.__items[key]) for key in dict.fromkeys(keys) if key in self.__items]
+
+    def __check_put(self, key, expected_version):
+        current = self.__items.get(key)
+        if expected_version is None:
+            conflict = current is not None
+        else:
+            conflict = current is None or current.get('version') != expected_version
+        if conflict:
+            raise StateConflict([f"{key[0]}/{key[1]}"])
+
+    def __check_delete(self, key, expected_version):
+        current = self.__items.get(key)
+        if expected_version is not None and current is not None and current.get('version') != expected_version:
+            raise StateConflict([f"{key[0]}/{key[1]}"])
+
+    def put(self, item: dict, expected_version: int | None) -> None:
+        key = (item['pk'], item['sk'])
+        with self.__lock:
+            self.__check_put(key, expected_version)
+            self.__items[key] = dict(item)
+
+    def delete(self, pk: str, sk: str, expected_version: int | None = None) -> None:
+        with self.__lock:
+            self.__check_delete((pk, sk), expected_version)
+            self.__items.pop((pk, sk), None)
+
+    def query(self, pk: str) -> List[dict]:
+        with self.__lock:
+            return [dict(item) for key, item in sorted(self.__items.items()) if key[0] == pk]
+
+    def query_outputs(self, otk: str, max_folder: str) -> List[dict]:
+        with self.__lock:
+            items = [dict(item) for item in self.__items.values()
+                     if item.get('otk') == otk and item.get('folder') is not None and item['folder'] <= max_folder]
+        return sorted(items, key=lambda item: item['folder'])
+
+    def transact_write(self, puts: List[Tuple[dict, int | None]], deletes: List[Tuple[str, str, int | None]],
+                       token: str = None) -> None:
+        with self.__lock:
+            for item, version in puts:
+                self.__check_put((item['pk'], item['sk']), version)
+            for pk, sk, version in deletes:
+                self.__check_delete((pk, sk), version)
+            for item, version in puts:
+                self.__items[(item['pk'], item['sk'])] = dict(item)
+            for pk, sk, version in deletes:
+                self.__items.pop((pk, sk), None)
+
+
+@implements(ResourceManager)
+class DynamoDbResourceManager(TransactionalResourceManager):
+
+    def __init__(self, table: DynamoDbTable, namespace="default", logger=None, codec: str | StateCodec = "json-compact",
+                 checkpoint_every=TRANSACT_LIMIT):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__table = table
+        self.__namespace = namespace
+        self.__codec = get_codec(codec)
+        self.__destroy_pk = f"{namespace}#to_destroy"
+        self.__folder = "/"
+        self.__lock = threading.RLock()
+        # uuid -> (version, created) we last read or wrote, the version is what the next conditional write expects
+        self.__seen: Dict[str, Tuple[int, int] | None] = {}
+        # the to_destroy partition as of the last get_to_destroy, a clean-up pass reads it once instead of per state
+        self.__destroy_cache: List[dict] | None = None
+        self.__written = 0
+        # changes of the open transaction, reads see them before they are written
+        self.__staged: Dict[str, Tuple[dict, int] | None] = {}
+        self.__staged_destroys: List[dict] = []
+        self.__staged_undestroys: List[Tuple[str, str]] = []
+        super().__init__(self.__lock, checkpoint_every)
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def folder(self) -> str:
+        return self.__folder
+
+    @folder.setter
+    def folder(self, folder):
+        self.__folder = folder
+
+    @property
+    def table(self) -> DynamoDbTable:
+        return self.__table
+
+    @property
+    def namespace(self):
+        return self.__namespace
+
+    def __state_pk(self, uuid: str):
+        return f"{self.__namespace}#{uuid}"
+
+    def __otk(self, output_type: str):
+        return f"{self.__namespace}#{output_type}"
+
+    def __to_item(self, pk, sk, uuid, state, version, created=None) -> dict:
+        return {
+            'pk': pk,
+            'sk': sk,
+            'uuid': uuid,
+            'folder': state.get('folder'),
+            'output_type': state.get('output_type'),
+            'otk': self.__otk(state['output_type']) if state.get('output_type') and sk == STATE_SK else None,
+            'plan_uuid': state.get('plan_uuid'),
+            'apply_uuid': state.get('apply_uuid'),
+            'created': created if created is not None else time.time_ns(),
+            'version': version,
+            'state': encode_column(self.__codec, state),
+        }
+
+    def __remember(self, uuid: str, item: dict | None):
+        with self.__lock:
+            self.__seen[uuid] = (item['version'], item['created']) if item else None
+
+    def __destroy_items(self, refresh=False) -> List[dict]:
+        with self.__lock:
+            cached = self.__destroy_cache
+        if refresh or cached is None:
+            cached = self.__table.query(self.__destroy_pk)
+            with self.__lock:
+                self.__destroy_cache = cached
+        with self.__lock:
+            undestroyed = set(self.__staged_undestroys)
+            return [item for item in cached if (item['pk'], item['sk']) not in undestroyed] + self.__staged_destroys
+
+    def __newest_destroy_item(self, uuid: str) -> dict | None:
+        # the newest generation, the one a clean-up pass destroys first
+        items = [item for item in self.__destroy_items() if item['uuid'] == uuid]
+        return items[-1] if items else None
+
+    @log_func()
+    def get_state(self, uuid: UUID | str, from_delete=False) -> dict | None:
+        uuid = str(uuid)
+        if from_delete:
+            item = self.__newest_destroy_item(uuid)
+            return decode_state(item['state']) if item else None
+
+        with self.__lock:
+            if uuid in self.__staged:
+                staged = self.__staged[uuid]
+                return staged[0] if staged else None
+        item = self.__table.get(self.__state_pk(uuid), STATE_SK)
+        self.__remember(uuid, item)
+        return decode_state(item['state']) if item else None
+
+    def __read_states(self, uuids: List[str]) -> Dict[str, dict | None]:
+        found = {item['uuid']: item for item in
+                 self.__table.batch_get([(self.__state_pk(uuid), STATE_SK) for uuid in uuids])}
+        states = {}
+        for uuid in uuids:
+            item = found.get(uuid)
+            self.__remember(uuid, item)
+            states[uuid] = decode_state(item['state']) if item else None
+        return states
+
+    @log_func()
+    def get_states(self, uuids: List[UUID | str]) -> Dict[str, dict | None]:
+        uuids = [str(uuid) for uuid in uuids]
+        with self.__lock:
+            staged = {uuid: self.__staged[uuid] for uuid in uuids if uuid in self.__staged}
+        states = self.__read_states([uuid for uuid in uuids if uuid not in staged])
+        states.update({uuid: value[0] if value else None for uuid, value in staged.items()})
+        return {uuid: states[uuid] for uuid in uuids}
+
+    def __forget(self, uuids: Iterable[str]):
+        # the next read fetches a fresh version
+        with self.__lock:
+            for uuid in uuids:
+                self.__seen.pop(uuid, None)
+
+    def __write(self, uuid: str, write):
+        # conditional on the version we last read, a record somebody else changed since is a conflict, not ours
+        # to overwrite
+        with self.__lock:
+            known = uuid in self.__seen
+            seen = self.__seen.get(uuid)
+        if not known:
+            self.__remember(uuid, self.__table.get(self.__state_pk(uuid), STATE_SK))
+            seen = self.__seen[uuid]
+        try:
+            item = write(seen)
+        except StateConflict as e:
+            self.__forget([uuid])
+            raise StateConflict([uuid]) from e
+        self.__remember(uuid, item)
+
+    def __set_writer(self, uuid: str, state: dict):
+        def write(seen):
+            version, created = seen if seen else (None, None)
+            item = self.__to_item(self.__state_pk(uuid), STATE_SK, uuid, state, (version or 0) + 1, created)
+            self.__table.put(item, version)
+            return item
+
+        return write
+
+    def __delete_writer(self, uuid: str):
+        def write(seen):
+            self.__table.delete(self.__state_pk(uuid), STATE_SK, seen[0] if seen else None)
+            return None
+
+        return write
+
+    def __stage(self, uuid: str, state: dict | None):
+        with self.__lock:
+            if state is None:
+                self.__staged[uuid] = None
+            else:
+                seen = self.__seen.get(uuid)
+                self.__staged[uuid] = (state, seen[1] if seen else time.time_ns())
+            self.__checkpoint_if_due()
+
+    def __checkpoint_if_due(self):
+        if self._checkpoint_due(self._pending_count()):
+            self.__write_staged()
+
+    def set_state(self, uuid: UUID | str, state: dict) -> None:
+        uuid = str(uuid)
+        state['folder'] = self.__folder
+        if self.in_transaction:
+            self.__stage(uuid, state)
+            return
+        self.__write(uuid, self.__set_writer(uuid, state))
+
+    def mark_destroy(self, uuid: UUID | str, state: dict) -> None:
+        uuid = str(uuid)
+        created = time.time_ns()
+        item = self.__to_item(self.__destroy_pk, f"{created:020d}#{uuid}", uuid, state, 1, created)
+        with self.__lock:
+            if self.in_transaction:
+                self.__staged_destroys.append(item)
+                self.__checkpoint_if_due()
+                return
+        self.__table.put(item, None)
+        with self.__lock:
+            if self.__destroy_cache is not None:
+                self.__destroy_cache.append(item)
+
+    def delete_state(self, uuid: UUID | str, from_delete=False) -> None:
+        uuid = str(uuid)
+        if from_delete:
+            item = self.__newest_destroy_item(uuid)
+            if item is None:
+                return
+            with self.__lock:
+                if item in self.__staged_destroys:
+                    self.__staged_destroys.remove(item)
+                    return
+                if self.in_transaction:
+                    self.__staged_undestroys.append((item['pk'], item['sk']))
+                    self.__checkpoint_if_due()
+                    return
+            self.__table.delete(item['pk'], item['sk'])
+            self.__uncache_destroy(item['pk'], item['sk'])
+            return
+
+        if self.in_transaction:
+            self.__stage(uuid, None)
+            return
+        self.__write(uuid, self.__delete_writer(uuid))
+
+    def __uncache_destroy(self, pk: str, sk: str):
+        with self.__lock:
+            if self.__destroy_cache is not None:
+                self.__destroy_cache = [item for item in self.__destroy_cache if (item['pk'], item['sk']) != (pk, sk)]
+
+    def get_to_destroy(self) -> List[Dict[str, Any]]:
+        return [decode_state(item['state']) for item in self.__destroy_items(refresh=True)]
+
+    def get_output(self, cls: Type):
+        # a state matches when its folder is a prefix of the current folder, the earliest written one wins
+        output_type = class_full_name(cls)
+        with self.__lock:
+            staged = dict(self.__staged)
+        matches = [(item['created'], decode_state(item['state']))
+                   for item in self.__table.query_outputs(self.__otk(output_type), self.__folder)
+                   if self.__folder.startswith(item['folder']) and item['uuid'] not in staged]
+        matches += [(created, state) for state, created in filter(None, staged.values())
+                    if state.get('output_type') == output_type and self.__folder.startswith(state['folder'])]
+        if not matches:
+            raise OutputTypeNotFound()
+        created, state = min(matches, key=lambda match: match[0])
+        return from_dict(cls, state['output'])
+
+    def put_states(self, states: Dict[UUID | str, dict]) -> None:
+        # bulk load, e.g. importing another manager's state, with the same version conditions as set_state: a
+        # record that exists and was never read here is a conflict
+        puts = []
+        for uuid, state in states.items():
+            uuid = str(uuid)
+            with self.__lock:
+                version, created = self.__seen.get(uuid) or (None, None)
+            puts.append((self.__to_item(self.__state_pk(uuid), STATE_SK, uuid, state, (version or 0) + 1, created),
+                         version))
+        for chunk in _chunks(puts, TRANSACT_LIMIT):
+            try:
+                self.__table.transact_write(chunk, [])
+            except StateConflict:
+                self.__forget(item['uuid'] for item, version in chunk)
+                raise
+            for item, version in chunk:
+                self.__remember(item['uuid'], item)
+
+    def __write_staged(self):
+        # only ever called holding the lock
+        staged, destroys, undestroys = self.__staged, self.__staged_destroys, self.__staged_undestroys
+        if not (staged or destroys or undestroys):
+            return
+
+        # versions for the conditions, the plan's prefetch has usually seen them all already
+        unseen = [uuid for uuid in staged if uuid not in self.__seen]
+        if unseen:
+            self.__read_states(unseen)
+
+        actions = []
+        for uuid, value in staged.items():
+            seen = self.__seen.get(uuid)
+            version, created = seen if seen else (None, None)
+            if value is None:
+                actions.append((uuid, None, (self.__state_pk(uuid), STATE_SK, version)))
+            else:
+                item = self.__to_item(self.__state_pk(uuid), STATE_SK, uuid, value[0], (version or 0) + 1, created)
+                actions.append((uuid, (item, version), None))
+        actions += [(None, (item, None), None) for item in destroys]
+        actions += [(None, None, (pk, sk, None)) for pk, sk in undestroys]
+
+        for chunk in _chunks(actions, TRANSACT_LIMIT):
+            self.__written += 1
+            token = str(UUID(md5(f"{self.apply_uuid}.{self.__written}".encode('utf-8')).hexdigest()))
+            try:
+                self.__table.transact_write([put for uuid, put, delete in chunk if put],
+                                            [delete for uuid, put, delete in chunk if delete], token)
+            except StateConflict:
+                # nothing of this chunk was written, it stays staged for the caller to roll back
+                self.__forget(uuid for uuid, put, delete in chunk if uuid is not None)
+                raise
+            for uuid, put, delete in chunk:
+                if uuid is not None:
+                    self.__remember(uuid, put[0] if put else None)
+                    del staged[uuid]
+                elif put:
+                    destroys.remove(put[0])
+                    if self.__destroy_cache is not None:
+                        self.__destroy_cache.append(put[0])
+                else:
+                    undestroys.remove(delete[:2])
+                    self.__uncache_destroy(*delete[:2])
+
+    @log_func()
+    def flush(self) -> None:
+        with self.__lock:
+            self.__write_staged()
+
+    def _pending_count(self) -> int:
+        return len(self.__staged) + len(self.__staged_destroys) + len(self.__staged_undestroys)
+
+    def _write_transaction(self) -> None:
+        # one TransactWriteItems per hundred changes instead of a write per resource
+        self.__write_staged()
+
+    def _drop_transaction(self) -> None:
+        self.__staged, self.__staged_destroys, self.__staged_undestroys = {}, [], []
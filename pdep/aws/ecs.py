@@ -1,10 +1,10 @@
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from typing import Dict, Any, List
 import botocore.exceptions
 from dataclasses_json import dataclass_json
 from pdep import zstr
 from pdep.plan import SimplifiedResource
-from pdep.utils import log_func, do_with_timeout, _dict_to_aws_tags
+from pdep.utils import log_func, _dict_to_aws_tags, Backoff
 
 
 def ecs_set_tags(ecs, tags, dry, arn):
@@ -35,7 +35,17 @@ class EcsClusterOutput:
     state: zstr = None
 
 
+def describe_clusters(provider, arns):
+    ecs = provider.create_client('ecs')
+    found = {}
+    for start in range(0, len(arns), 100):
+        res = ecs.describe_clusters(clusters=arns[start:start + 100])
+        found.update({cluster['clusterArn']: cluster for cluster in res['clusters']})
+    return found
+
+
 class EcsCluster(SimplifiedResource[EcsClusterInput, EcsClusterOutput]):
+    wait_backoff = Backoff(initial=0.5, cap=5.0)
 
     @log_func()
     def create(self, provider, apply_uuid, dry):
@@ -65,14 +75,9 @@ class EcsCluster(SimplifiedResource[EcsClusterInput, EcsClusterOutput]):
 
         ecs_set_tags(ecs, self.input.tags, dry, self._output.arn)
 
-        def check_cluster_status():
-            res = ecs.describe_clusters(clusters=[self._output.arn])
-            status = res['clusters'][0]['status']
-            self._output.state = status
-            return status != 'ACTIVE'
-
-        do_with_timeout(check_cluster_status, 30)
-
+        cluster = self.wait_until_ready(provider, 'active', self._output.arn, describe_clusters,
+                                        lambda desc: desc['status'] == 'ACTIVE')
+        self._output.state = cluster['status']
 
     @log_func()
     def do_destroy(self, env_inputs: Dict[str, Any], resource_manager, provider, apply_uuid, dry):
@@ -89,13 +94,18 @@ class EcsCluster(SimplifiedResource[EcsClusterInput, EcsClusterOutput]):
             else:
                 raise
 
+    @classmethod
+    def describe(cls, provider, outputs: List[EcsClusterOutput]) -> List[Dict[str, Any] | None]:
+        arns = [output.arn for output in outputs]
+        found = describe_clusters(provider, arns)
+        return [found.get(arn) for arn in arns]
+
     @log_func()
     def is_drifted(self, provider, dry):
-        ecs = provider.create_client('ecs')
         try:
-            res = ecs.describe_clusters(clusters=[self._output.arn])
-            status = res['clusters'][0]['status']
-            return status != 'ACTIVE'
+            cluster = self.get_description(provider)
+            if cluster is not None:
+                return cluster['status'] != 'ACTIVE'
         except botocore.exceptions.ClientError as e:
             if ".NotFound" in e.response['Error']['Code']:
                 pass
@@ -103,4 +113,4 @@ class EcsCluster(SimplifiedResource[EcsClusterInput, EcsClusterOutput]):
                 pass
             else:
                 raise
-        return True
\ No newline at end of file
+        return True
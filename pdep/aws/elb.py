@@ -7,7 +7,7 @@ from dateutil.tz import tzutc
 
 from pdep import zstr
 from pdep.plan import SimplifiedResource
-from pdep.utils import log_func, _dict_to_aws_tags
+from pdep.utils import log_func, _dict_to_aws_tags, Backoff
 
 
 @dataclass_json
@@ -28,7 +28,30 @@ class AlbOutput:
     dns_name: zstr = None
 
 
+def describe_load_balancers(provider, arns):
+    elbv2 = provider.create_client('elbv2')
+    found = {}
+    for start in range(0, len(arns), 20):
+        chunk = arns[start:start + 20]
+        try:
+            res = elbv2.describe_load_balancers(LoadBalancerArns=chunk)
+        except botocore.exceptions.ClientError as e:
+            if "NotFound" not in e.response['Error']['Code']:
+                raise
+            if len(chunk) == 1:
+                continue
+            # one missing arn fails the whole call, fall back to describing one by one
+            for arn in chunk:
+                found.update(describe_load_balancers(provider, [arn]))
+            continue
+        found.update({lb['LoadBalancerArn']: lb for lb in res['LoadBalancers']})
+    return found
+
+
 class Alb(SimplifiedResource[AlbInput, AlbOutput]):
+    describe_batch_size = 20
+    wait_backoff = Backoff(initial=1.0, cap=10.0)
+    wait_timeout = 600
 
     @log_func()
     def create(self, provider, apply_uuid, dry):
@@ -82,8 +105,8 @@ class Alb(SimplifiedResource[AlbInput, AlbOutput]):
         self._output.name = self.input.name
         self._output.arn = response['LoadBalancers'][0]['LoadBalancerArn']
         self._output.dns_name = response['LoadBalancers'][0]['DNSName']
-        waiter = elbv2.get_waiter('load_balancer_available')
-        waiter.wait(LoadBalancerArns=[self._output.arn])
+        self.wait_until_ready(provider, 'active', self._output.arn, describe_load_balancers,
+                              lambda desc: desc['State']['Code'] == 'active')
 
     @log_func()
     def do_destroy(self, env_inputs: Dict[str, Any], resource_manager, provider, apply_uuid, dry):
@@ -100,12 +123,18 @@ class Alb(SimplifiedResource[AlbInput, AlbOutput]):
             else:
                 raise
 
+    @classmethod
+    def describe(cls, provider, outputs: List[AlbOutput]) -> List[Dict[str, Any] | None]:
+        arns = [output.arn for output in outputs]
+        found = describe_load_balancers(provider, arns)
+        return [found.get(arn) for arn in arns]
+
     @log_func()
     def is_drifted(self, provider, dry):
-        elbv2 = provider.create_client('elbv2')
         try:
-            res = elbv2.describe_load_balancers(LoadBalancerArns=[self._output.arn])
-            return res['LoadBalancers'][0]['State']['Code'] != 'active'
+            lb = self.get_description(provider)
+            if lb is not None:
+                return lb['State']['Code'] != 'active'
         except botocore.exceptions.ClientError as e:
             if ".NotFound" in e.response['Error']['Code']:
                 pass
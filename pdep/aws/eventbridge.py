@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from typing import Dict, Any, List
 import botocore.exceptions
 from dataclasses_json import dataclass_json
 from pdep import zstr
@@ -22,6 +22,8 @@ class EventBusOutput:
 
 
 class EventBus(SimplifiedResource[EventBusInput, EventBusOutput]):
+    # one listing describes every bus, splitting a group would only repeat it
+    describe_batch_size = None
 
     @log_func()
     def create(self, provider, apply_uuid, dry):
@@ -64,12 +66,36 @@ class EventBus(SimplifiedResource[EventBusInput, EventBusOutput]):
             else:
                 raise
 
+    @classmethod
+    def describe(cls, provider, outputs: List[EventBusOutput]) -> List[Dict[str, Any] | None]:
+        events = provider.create_client('events')
+        # there is no multi bus describe, a single listing covers all of them
+        found = {}
+        kwargs = {}
+        while True:
+            res = events.list_event_buses(**kwargs)
+            for bus in res['EventBuses']:
+                found[bus['Name']] = bus
+            if not res.get('NextToken'):
+                break
+            kwargs['NextToken'] = res['NextToken']
+        return [found.get(output.name) for output in outputs]
+
+    def _describe_single(self, provider):
+        # the input names the bus, the output only has a name once create stored it
+        try:
+            return provider.create_client('events').describe_event_bus(Name=self.input.name)
+        except botocore.exceptions.ClientError as e:
+            if 'ResourceNotFound' in e.response['Error']['Code']:
+                return None
+            raise
+
     @log_func()
     def is_drifted(self, provider, dry):
-        events = provider.create_client('events')
         try:
-            res = events.describe_event_bus(Name=self.input.name)
-            return res['Name'] != self.input.name
+            bus = self.get_description(provider)
+            if bus is not None:
+                return bus['Name'] != self.input.name
         except botocore.exceptions.ClientError as e:
             if ".NotFound" in e.response['Error']['Code']:
                 pass
@@ -6,7 +6,7 @@ from dataclasses_json import dataclass_json
 
 from pdep import zstr
 from pdep.plan import SimplifiedResource
-from pdep.utils import log_func, _aws_tags_to_dict, _dict_to_aws_tags, do_with_timeout
+from pdep.utils import log_func, _aws_tags_to_dict, _dict_to_aws_tags, Backoff
 
 
 def ec2_set_tags(ec2, tags, dry, id_):
@@ -25,6 +25,28 @@ def ec2_set_tags(ec2, tags, dry, id_):
             raise
 
 
+def ec2_describe(provider, operation, result_key, filter_name, id_key, ids):
+    # a filter, unlike the ids parameter, does not fail the whole call when one id is missing
+    # outputs of resources never created have no id, boto3 rejects None before the request is sent
+    values = [id_ for id_ in ids if id_ is not None]
+    if not values:
+        return [None] * len(ids)
+    ec2_client = provider.create_client('ec2')
+    found = {}
+    for page in ec2_client.get_paginator(operation).paginate(Filters=[{'Name': filter_name, 'Values': values}]):
+        for item in page[result_key]:
+            found[item[id_key]] = item
+    return [found.get(id_) for id_ in ids]
+
+
+def describe_vpcs(provider, vpc_ids):
+    return ec2_describe(provider, 'describe_vpcs', 'Vpcs', 'vpc-id', 'VpcId', vpc_ids)
+
+
+def describe_subnets(provider, subnet_ids):
+    return ec2_describe(provider, 'describe_subnets', 'Subnets', 'subnet-id', 'SubnetId', subnet_ids)
+
+
 @dataclass_json
 @dataclass
 class VpcInput:
@@ -40,6 +62,7 @@ class VpcOutput:
 
 
 class Vpc(SimplifiedResource[VpcInput, VpcOutput]):
+    wait_backoff = Backoff(initial=0.2, cap=2.0)
 
     @log_func()
     def do_destroy(self, env_inputs: Dict[str, Any], resource_manager, provider, apply_uuid, dry):
@@ -70,7 +93,9 @@ class Vpc(SimplifiedResource[VpcInput, VpcOutput]):
                 DryRun=dry,
                 CidrBlock=self.input.cidr_block
             )
-            vpc.wait_until_available()
+            self.wait_until_ready(provider, 'available', vpc.vpc_id,
+                                  lambda provider_, ids: dict(zip(ids, describe_vpcs(provider_, ids))),
+                                  lambda desc: desc['State'] == 'available')
             self._output.vpc_id = vpc.vpc_id
             self._output.cidr_block = self.input.cidr_block
             self.logger.info(f"vpc_id:{vpc.vpc_id}")
@@ -82,27 +107,28 @@ class Vpc(SimplifiedResource[VpcInput, VpcOutput]):
 
         ec2_set_tags(ec2, self.input.tags, dry, vpc.vpc_id)
 
+    @classmethod
+    def describe(cls, provider, outputs: List[VpcOutput]) -> List[Dict[str, Any] | None]:
+        return describe_vpcs(provider, [output.vpc_id for output in outputs])
+
     @log_func()
     def is_drifted(self, provider, dry):
         if dry:
             return False
-        ec2 = provider.create_resource('ec2')
-        try:
-            vpc = ec2.Vpc(self._output.vpc_id)
-            device_tags = _aws_tags_to_dict(vpc.tags)
-            if 'apply_uuid' in device_tags:
-                del device_tags['apply_uuid']
+        vpc = self.get_description(provider)
+        if vpc is None:
+            # Vpc was deleted on aws
+            return True
 
-            ret = vpc.state != 'available' or \
-                  vpc.cidr_block != self.input.cidr_block or \
-                  device_tags != self.input.tags
+        device_tags = _aws_tags_to_dict(vpc.get('Tags', []))
+        if 'apply_uuid' in device_tags:
+            del device_tags['apply_uuid']
 
-            return ret
-        except botocore.exceptions.ClientError as e:
-            if ".NotFound" in e.response['Error']['Code']:
-                # Vpc was deleted on aws
-                return True
-            raise
+        ret = vpc['State'] != 'available' or \
+              vpc['CidrBlock'] != self.input.cidr_block or \
+              device_tags != self.input.tags
+
+        return ret
 
 
 @dataclass_json
@@ -194,6 +220,8 @@ class SubnetOutput:
 
 
 class Subnet(SimplifiedResource[SubnetInput, SubnetOutput]):
+    wait_backoff = Backoff(initial=0.1, cap=1.0)
+
     @log_func()
     def do_destroy(self, env_inputs: Dict[str, Any], resource_manager, provider, apply_uuid, dry):
         if dry:
@@ -257,28 +285,28 @@ class Subnet(SimplifiedResource[SubnetInput, SubnetOutput]):
         ec2_set_tags(ec2_client, self.input.tags, dry, self._output.subnet_id)
 
         if not dry:
-            ec2 = provider.create_resource('ec2')
-            subnet = ec2.Subnet(self._output.subnet_id)
+            subnet = self.wait_until_ready(provider, 'available', self._output.subnet_id,
+                                           lambda provider_, ids: dict(zip(ids, describe_subnets(provider_, ids))),
+                                           lambda desc: desc['State'] == 'available')
+            self._output.state = subnet['State']
 
-            do_with_timeout(lambda: (subnet.reload(), subnet.state != 'available')[-1], 30)
-            self._output.state = subnet.state
+    @classmethod
+    def describe(cls, provider, outputs: List[SubnetOutput]) -> List[Dict[str, Any] | None]:
+        return describe_subnets(provider, [output.subnet_id for output in outputs])
 
     @log_func()
     def is_drifted(self, provider, dry):
         if dry:
             return False
+        subnet = self.get_description(provider)
+        if subnet is None:
+            # Subnet was deleted on aws
+            return True
+
         drifted = False
-        ec2 = provider.create_resource('ec2')
-        try:
-            subnet = ec2.Subnet(self._output.subnet_id)
-            drifted = drifted or self._output.cidr_block != subnet.cidr_block
-            drifted = drifted or self._output.availability_zone != subnet.availability_zone
-            drifted = drifted or self._output.state != subnet.state
-        except botocore.exceptions.ClientError as e:
-            if ".NotFound" in e.response['Error']['Code']:
-                # Subnet was deleted on aws
-                return True
-            raise
+        drifted = drifted or self._output.cidr_block != subnet['CidrBlock']
+        drifted = drifted or self._output.availability_zone != subnet['AvailabilityZone']
+        drifted = drifted or self._output.state != subnet['State']
         return drifted
 
 
@@ -342,21 +370,20 @@ class RouteTable(SimplifiedResource[RouteTableInput, RouteTableOutput]):
 
         ec2_set_tags(ec2_client, self.input.tags, dry, self._output.rout_table_id)
 
+    @classmethod
+    def describe(cls, provider, outputs: List[RouteTableOutput]) -> List[Dict[str, Any] | None]:
+        return ec2_describe(provider, 'describe_route_tables', 'RouteTables', 'route-table-id', 'RouteTableId',
+                            [output.rout_table_id for output in outputs])
+
     @log_func()
     def is_drifted(self, provider, dry):
         if dry:
             return False
-        drifted = False
-        ec2 = provider.create_resource('ec2')
-        try:
-            route_table = ec2.RouteTable(self._output.rout_table_id)
-            drifted = drifted or route_table.vpc_id != self.input.vpc_id
-        except botocore.exceptions.ClientError as e:
-            if ".NotFound" in e.response['Error']['Code']:
-                # Subnet was deleted on aws
-                return True
-            raise
-        return drifted
+        route_table = self.get_description(provider)
+        if route_table is None:
+            # Route table was deleted on aws
+            return True
+        return route_table['VpcId'] != self.input.vpc_id
 
 
 @dataclass_json
@@ -0,0 +1,234 @@
+import json
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Dict, Type
+
+from pdep.inter import implements
+from pdep.utils import atomic_write_bytes
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+class CodecNotAvailable(Exception):
+    pass
+
+
+class StateCodec:
+
+    @property
+    def name(self) -> str:
+        pass
+
+    def dumps(self, state: dict) -> bytes:
+        pass
+
+    def loads(self, data: bytes | str) -> dict:
+        pass
+
+
+def _json_loads(data: bytes | str):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson refuses integers wider than 64 bit, the stdlib doesn't
+            pass
+    return json.loads(data)
+
+
+@implements(StateCodec)
+class JsonCodec(StateCodec):
+    # the original, human readable format
+
+    @property
+    def name(self) -> str:
+        return "json"
+
+    def dumps(self, state: dict) -> bytes:
+        return json.dumps(state, indent=4).encode('utf-8')
+
+    def loads(self, data: bytes | str) -> dict:
+        return _json_loads(data)
+
+
+@implements(StateCodec)
+class CompactJsonCodec(StateCodec):
+
+    @property
+    def name(self) -> str:
+        return "json-compact"
+
+    def dumps(self, state: dict) -> bytes:
+        return json.dumps(state, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes | str) -> dict:
+        return _json_loads(data)
+
+
+@implements(StateCodec)
+class OrjsonCodec(StateCodec):
+
+    def __init__(self):
+        if orjson is None:
+            raise CodecNotAvailable("the 'orjson' codec needs the orjson package")
+
+    @property
+    def name(self) -> str:
+        return "orjson"
+
+    def dumps(self, state: dict) -> bytes:
+        try:
+            return orjson.dumps(state, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return json.dumps(state, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes | str) -> dict:
+        return _json_loads(data)
+
+
+@implements(StateCodec)
+class MsgpackCodec(StateCodec):
+
+    def __init__(self):
+        if msgpack is None:
+            raise CodecNotAvailable("the 'msgpack' codec needs the msgpack package")
+
+    @property
+    def name(self) -> str:
+        return "msgpack"
+
+    def dumps(self, state: dict) -> bytes:
+        return msgpack.packb(state, use_bin_type=True)
+
+    def loads(self, data: bytes | str) -> dict:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+@implements(StateCodec)
+class ZlibCodec(StateCodec):
+    # state is mostly repeated uuids, class names and paths, it compresses several times over
+
+    def __init__(self, inner: StateCodec, level=6):
+        self.__inner = inner
+        self.__level = level
+
+    @property
+    def name(self) -> str:
+        return f"{self.__inner.name}+zlib"
+
+    def dumps(self, state: dict) -> bytes:
+        return zlib.compress(self.__inner.dumps(state), self.__level)
+
+    def loads(self, data: bytes | str) -> dict:
+        return self.__inner.loads(zlib.decompress(data))
+
+
+CODECS: Dict[str, Type[StateCodec]] = {
+    "json": JsonCodec,
+    "json-compact": CompactJsonCodec,
+    "orjson": OrjsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+
+def get_codec(codec: str | StateCodec | None) -> StateCodec:
+    if codec is None:
+        return JsonCodec()
+    if isinstance(codec, str):
+        name, _, compression = codec.partition("+")
+        if name not in CODECS or compression not in ("", "zlib"):
+            raise ValueError(f"unknown state codec '{codec}', expected one of {', '.join(CODECS)}, "
+                             f"optionally with a '+zlib' suffix")
+        return ZlibCodec(CODECS[name]()) if compression else CODECS[name]()
+    return codec
+
+
+def available_codecs():
+    available = []
+    for name, cls in CODECS.items():
+        try:
+            cls()
+        except CodecNotAvailable:
+            continue
+        available.append(name)
+    return available
+
+
+def is_zlib(data: bytes | str) -> bool:
+    # a zlib stream header is 0x78 which is neither json nor a msgpack map
+    return isinstance(data, bytes) and data[:1] == b'\x78'
+
+
+def is_json(data: bytes | str) -> bool:
+    if isinstance(data, str):
+        return True
+    stripped = data.lstrip()
+    return not stripped or stripped[:1] in (b'{', b'[')
+
+
+def decode_state(data: bytes | str) -> dict:
+    # every codec can be read back regardless of which one the manager writes, so switching is a no-op
+    if is_zlib(data):
+        data = zlib.decompress(data)
+    if is_json(data):
+        return _json_loads(data)
+    if msgpack is None:
+        raise CodecNotAvailable("state is msgpack encoded but the msgpack package is not installed")
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def detect_codec(data: bytes | str) -> StateCodec:
+    # the codec that wrote `data`, so rewriting it keeps its format
+    if is_zlib(data):
+        return ZlibCodec(detect_codec(zlib.decompress(data)))
+    if not is_json(data):
+        return MsgpackCodec()
+    # only the default codec indents
+    newline = '\n' if isinstance(data, str) else b'\n'
+    return JsonCodec() if not data.strip() or newline in data else CompactJsonCodec()
+
+
+def encode_column(codec: StateCodec, state: dict) -> bytes | str:
+    # json goes into TEXT columns as text so sqlite's json functions keep working on it
+    data = codec.dumps(state)
+    return data.decode('utf-8') if is_json(data) else data
+
+
+def migrate_state_file(src: str | Path, dst: str | Path = None, codec: str | StateCodec = "json") -> Path:
+    src = Path(src)
+    dst = Path(dst) if dst else src
+    codec = get_codec(codec)
+
+    with src.open('rb') as fp:
+        is_sqlite = fp.read(len(_SQLITE_MAGIC)) == _SQLITE_MAGIC
+    if is_sqlite:
+        if dst != src:
+            raise ValueError("sqlite state is re-encoded in place, copy the database first")
+        _migrate_sqlite(src, codec)
+    else:
+        atomic_write_bytes(dst, codec.dumps(decode_state(src.read_bytes())))
+    return dst
+
+
+def _migrate_sqlite(path: Path, codec: StateCodec):
+    conn = sqlite3.connect(str(path))
+    try:
+        with conn:
+            for table, key in (("states", "uuid"), ("to_destroy", "seq")):
+                rows = conn.execute(f"SELECT {key}, state FROM {table}").fetchall()
+                conn.executemany(f"UPDATE {table} SET state = ? WHERE {key} = ?",
+                                 [(encode_column(codec, decode_state(state)), row_key) for row_key, state in rows])
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+
+from pdep.utils import stable_hash
+
+
+def drift_key(uuid, input_dict, output_dict) -> str:
+    # state dicts can carry provider values like datetimes, their str form is stable enough here
+    return stable_hash(str(uuid), input_dict, output_dict, strict=False)
+
+
+class DriftCache:
+
+    def __init__(self, ttl=60.0, max_entries=10000, clock=time.time):
+        self.__ttl = ttl
+        self.__max_entries = max_entries
+        self.__clock = clock
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return self.__ttl
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
+
+    def is_clean(self, key) -> bool:
+        with self.__lock:
+            checked_at = self.__entries.get(key)
+            if checked_at is None:
+                return False
+            if self.__clock() - checked_at > self.__ttl:
+                del self.__entries[key]
+                return False
+            self.__entries.move_to_end(key)
+            return True
+
+    def checked_at(self, key) -> float | None:
+        with self.__lock:
+            return self.__entries.get(key)
+
+    def mark_clean(self, key, checked_at=None):
+        checked_at = self.__clock() if checked_at is None else checked_at
+        with self.__lock:
+            if self.__entries.get(key, checked_at) > checked_at:
+                return
+            self.__entries[key] = checked_at
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Any, Dict, List, Awaitable
+
+from pdep.graph import DependencyGraph, DependencyCycle
+
+
+class ExecutionFailed(Exception):
+    def __init__(self, failures: Dict[Any, BaseException], skipped: List[Any] = None):
+        self.failures = failures
+        self.skipped = skipped or []
+        errors = ", ".join(f"{node}: {exc!r}" for node, exc in failures.items())
+        super().__init__(f"{len(failures)} node(s) failed, {len(self.skipped)} skipped: {errors}")
+
+
+def closure(nodes: Iterable[Any], edges_of: Callable[[Any], Iterable[Any]]) -> List[Any]:
+    seen = {}
+    queue = deque(nodes)
+    while queue:
+        node = queue.popleft()
+        if node in seen:
+            continue
+        seen[node] = None
+        queue.extend(edges_of(node))
+    return list(seen)
+
+
+class DagExecutor:
+
+    def __init__(self, max_workers=8, fail_fast=True, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__max_workers = max_workers
+        self.__fail_fast = fail_fast
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def max_workers(self):
+        return self.__max_workers
+
+    def run(self, nodes: Iterable[Any], dependencies_of: Callable[[Any], Iterable[Any]],
+            func: Callable[[Any], Any]) -> None:
+        self.run_graph(DependencyGraph(nodes, dependencies_of), func)
+
+    def run_graph(self, graph: DependencyGraph, func: Callable[[Any], Any]) -> None:
+        graph.check_acyclic()
+        ready = graph.ready_set()
+        failures = {}
+        stop = False
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix="pdep") as pool:
+            running = {}
+            while ready or running:
+                while ready and not stop:
+                    node = ready.pop()
+                    running[pool.submit(func, node)] = node
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    exc = future.exception()
+                    if exc is not None:
+                        self.logger.error(f"{node} failed: {exc!r}")
+                        failures[node] = exc
+                        ready.fail(node)
+                        stop = stop or self.__fail_fast
+                        continue
+                    ready.done(node)
+
+        if failures:
+            raise ExecutionFailed(failures, ready.skipped()) from next(iter(failures.values()))
+
+
+class AsyncDagExecutor:
+
+    def __init__(self, max_concurrency=64, fail_fast=True, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__max_concurrency = max_concurrency
+        self.__fail_fast = fail_fast
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def max_concurrency(self):
+        return self.__max_concurrency
+
+    async def run(self, nodes: Iterable[Any], dependencies_of: Callable[[Any], Iterable[Any]],
+                  func: Callable[[Any], Awaitable[Any]]) -> None:
+        await self.run_graph(DependencyGraph(nodes, dependencies_of), func)
+
+    async def run_graph(self, graph: DependencyGraph, func: Callable[[Any], Awaitable[Any]]) -> None:
+        graph.check_acyclic()
+        ready = graph.ready_set()
+        failures = {}
+        stop = False
+
+        # tasks are created only when a node is ready and a slot is free
+        running = {}
+        try:
+            while ready or running:
+                while ready and not stop and len(running) < self.__max_concurrency:
+                    node = ready.pop()
+                    running[asyncio.ensure_future(func(node))] = node
+                if not running:
+                    break
+
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    node = running.pop(task)
+                    exc = task.exception()
+                    if exc is not None:
+                        self.logger.error(f"{node} failed: {exc!r}")
+                        failures[node] = exc
+                        ready.fail(node)
+                        stop = stop or self.__fail_fast
+                        continue
+                    ready.done(node)
+        finally:
+            if running:
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if failures:
+            raise ExecutionFailed(failures, ready.skipped()) from next(iter(failures.values()))
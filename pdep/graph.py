@@ -0,0 +1,208 @@
+from collections import deque
+from typing import Any, Callable, Iterable, List, Tuple
+
+
+class DependencyCycle(Exception):
+    def __init__(self, cycle: List[Any]):
+        self.cycle = cycle
+        super().__init__(f"dependency cycle: {' -> '.join(str(node) for node in cycle)}")
+
+
+class DependencyGraph:
+    # nodes get dense ids in the order given, edges are id lists kept both ways, nothing here recurses
+
+    def __init__(self, nodes: Iterable[Any], dependencies_of: Callable[[Any], Iterable[Any]]):
+        self.__nodes = list(dict.fromkeys(nodes))
+        self.__ids = {node: i for i, node in enumerate(self.__nodes)}
+        self.__depends: List[List[int]] = []
+        self.__dependents: List[List[int]] = [[] for _ in self.__nodes]
+        for i, node in enumerate(self.__nodes):
+            # dependencies outside the graph and self references are not edges
+            deps = [dep for dep in dict.fromkeys(self.__ids[dep] for dep in dependencies_of(node) if dep in self.__ids)
+                    if dep != i]
+            self.__depends.append(deps)
+            for dep in deps:
+                self.__dependents[dep].append(i)
+        self.__in_degree = [len(deps) for deps in self.__depends]
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    def __contains__(self, node):
+        return node in self.__ids
+
+    @property
+    def nodes(self) -> List[Any]:
+        return list(self.__nodes)
+
+    @property
+    def edge_count(self) -> int:
+        return sum(self.__in_degree)
+
+    def id_of(self, node) -> int:
+        return self.__ids[node]
+
+    def node(self, node_id: int):
+        return self.__nodes[node_id]
+
+    def in_degree(self, node_id: int) -> int:
+        return self.__in_degree[node_id]
+
+    def dependency_ids(self, node_id: int) -> List[int]:
+        return self.__depends[node_id]
+
+    def dependent_ids(self, node_id: int) -> List[int]:
+        return self.__dependents[node_id]
+
+    def dependencies(self, node) -> List[Any]:
+        return [self.__nodes[dep] for dep in self.__depends[self.__ids[node]]]
+
+    def dependents(self, node) -> List[Any]:
+        return [self.__nodes[dep] for dep in self.__dependents[self.__ids[node]]]
+
+    def roots(self) -> List[Any]:
+        return [node for node, degree in zip(self.__nodes, self.__in_degree) if not degree]
+
+    def descendants(self, node) -> List[Any]:
+        # everything that depends on the node, directly or not, breadth first
+        seen = {self.__ids[node]}
+        found = []
+        queue = deque(self.__dependents[self.__ids[node]])
+        while queue:
+            node_id = queue.popleft()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            found.append(node_id)
+            queue.extend(self.__dependents[node_id])
+        return [self.__nodes[node_id] for node_id in found]
+
+    def __walk(self) -> Tuple[List[int], List[int] | None]:
+        # depth first post order with an explicit stack, the order a recursive apply would visit in
+        unseen, active, finished = 0, 1, 2
+        color = bytearray(len(self.__nodes))
+        order = []
+        for root in range(len(self.__nodes)):
+            if color[root]:
+                continue
+            color[root] = active
+            stack = [[root, 0]]
+            while stack:
+                frame = stack[-1]
+                node_id, next_dep = frame
+                deps = self.__depends[node_id]
+                if next_dep < len(deps):
+                    frame[1] += 1
+                    dep = deps[next_dep]
+                    if color[dep] == unseen:
+                        color[dep] = active
+                        stack.append([dep, 0])
+                    elif color[dep] == active:
+                        start = next(i for i, (stacked, _) in enumerate(stack) if stacked == dep)
+                        return order, [stacked for stacked, _ in stack[start:]] + [dep]
+                    continue
+                stack.pop()
+                color[node_id] = finished
+                order.append(node_id)
+        return order, None
+
+    def find_cycle(self) -> List[Any] | None:
+        order, cycle = self.__walk()
+        return [self.__nodes[node_id] for node_id in cycle] if cycle else None
+
+    def check_acyclic(self) -> None:
+        cycle = self.find_cycle()
+        if cycle:
+            raise DependencyCycle(cycle)
+
+    def topological_order(self) -> List[Any]:
+        order, cycle = self.__walk()
+        if cycle:
+            raise DependencyCycle([self.__nodes[node_id] for node_id in cycle])
+        return [self.__nodes[node_id] for node_id in order]
+
+    def levels(self) -> List[List[Any]]:
+        # successive ready sets when everything in a level runs at once
+        ready_set = self.ready_set()
+        levels = []
+        level = ready_set.drain()
+        while level:
+            levels.append(level)
+            for node in level:
+                ready_set.done(node)
+            level = ready_set.drain()
+        if ready_set.done_count != len(self.__nodes):
+            self.check_acyclic()
+        return levels
+
+    def critical_path(self, weight_of: Callable[[Any], float] = None) -> Tuple[List[Any], float]:
+        # heaviest chain of dependencies, every node weighs 1 unless told otherwise
+        order, cycle = self.__walk()
+        if cycle:
+            raise DependencyCycle([self.__nodes[node_id] for node_id in cycle])
+        cost = [0.0] * len(self.__nodes)
+        previous = [-1] * len(self.__nodes)
+        for node_id in order:
+            best = max(self.__depends[node_id], key=cost.__getitem__, default=-1)
+            cost[node_id] = (cost[best] if best >= 0 else 0.0) + \
+                (weight_of(self.__nodes[node_id]) if weight_of else 1.0)
+            previous[node_id] = best
+        if not order:
+            return [], 0.0
+        node_id = max(range(len(cost)), key=cost.__getitem__)
+        total = cost[node_id]
+        path = []
+        while node_id >= 0:
+            path.append(self.__nodes[node_id])
+            node_id = previous[node_id]
+        return list(reversed(path)), total
+
+    def ready_set(self) -> 'ReadySet':
+        return ReadySet(self, self.__in_degree, self.__dependents)
+
+
+class ReadySet:
+    # what can run next as nodes finish; a completion costs its out-degree, a ready node is found in O(1)
+
+    def __init__(self, graph: DependencyGraph, in_degree: List[int], dependents: List[List[int]]):
+        self.__graph = graph
+        self.__waiting = list(in_degree)
+        self.__dependents = dependents
+        self.__ready = deque(node_id for node_id, degree in enumerate(self.__waiting) if not degree)
+        self.__skipped = bytearray(len(in_degree))
+        self.__done_count = 0
+
+    def __bool__(self):
+        return bool(self.__ready)
+
+    @property
+    def done_count(self) -> int:
+        return self.__done_count
+
+    def pop(self):
+        return self.__graph.node(self.__ready.popleft())
+
+    def drain(self) -> List[Any]:
+        ready = [self.__graph.node(node_id) for node_id in self.__ready]
+        self.__ready.clear()
+        return ready
+
+    def done(self, node) -> None:
+        self.__done_count += 1
+        for dependent in self.__dependents[self.__graph.id_of(node)]:
+            self.__waiting[dependent] -= 1
+            if not self.__waiting[dependent] and not self.__skipped[dependent]:
+                self.__ready.append(dependent)
+
+    def fail(self, node) -> None:
+        # a failed node counts as finished, whatever depends on it never becomes ready
+        self.__done_count += 1
+        queue = deque(self.__dependents[self.__graph.id_of(node)])
+        while queue:
+            node_id = queue.popleft()
+            if not self.__skipped[node_id]:
+                self.__skipped[node_id] = 1
+                queue.extend(self.__dependents[node_id])
+
+    def skipped(self) -> List[Any]:
+        return [self.__graph.node(node_id) for node_id, skipped in enumerate(self.__skipped) if skipped]
@@ -0,0 +1,319 @@
+import contextlib
+import copy
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Type, Iterator
+from uuid import UUID
+
+from pdep.codecs import StateCodec, get_codec, decode_state
+from pdep.inter import implements
+from pdep.plan import ResourceManager, TransactionalResourceManager, OutputTypeNotFound, state_file_path
+from pdep.serde import from_dict
+from pdep.utils import log_func, class_full_name, atomic_write_bytes
+
+
+@implements(ResourceManager)
+class JournalResourceManager(TransactionalResourceManager):
+
+    def __init__(self, path: str | Path, logger=None, sync_every=None, compact_every=1000, keep_history=True,
+                 codec: str | StateCodec = "json-compact", checkpoint_every=100):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        # only the snapshot goes through the codec, journal records stay json lines
+        self.__codec = get_codec(codec)
+        self.__path = state_file_path(path)
+        self.__snapshot_path = self.__path.with_name(f"{self.__path.name}.snapshot")
+        # serializes appends and compaction across processes, seq stays unique
+        self.__lock_path = self.__path.with_name(f"{self.__path.name}.lock")
+        self.__folder = "/"
+        # None fsyncs only on flush, i.e. once per apply
+        self.__sync_every = sync_every
+        self.__compact_every = compact_every
+        self.__keep_history = keep_history
+        # ops applied in memory, given a seq only when written under the writer lock
+        self.__pending = []
+        self.__lock = threading.RLock()
+        super().__init__(self.__lock, checkpoint_every)
+
+        self.__state = {"to_destroy": []}
+        self.__seq = 0
+        self.__snapshot_seq = 0
+        self.__unsynced = 0
+        self.__fp = None
+        self.__writer_depth = 0
+        self.__seen = None
+        with self.__writer():
+            self.__load()
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def folder(self) -> str:
+        return self.__folder
+
+    @folder.setter
+    def folder(self, folder):
+        self.__folder = folder
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def codec(self) -> StateCodec:
+        return self.__codec
+
+    @property
+    def seq(self):
+        return self.__seq
+
+    def __load(self):
+        self.__state = {"to_destroy": []}
+        self.__seq = self.__snapshot_seq = 0
+        if self.__snapshot_path.exists():
+            snapshot = decode_state(self.__snapshot_path.read_bytes())
+            self.__state = snapshot['state']
+            self.__seq = self.__snapshot_seq = snapshot['seq']
+
+        replayed = 0
+        for record in self.__read_records(self.__path, repair=True):
+            if record['seq'] <= self.__snapshot_seq:
+                continue
+            self.__apply_op(record['op'], record['uuid'], record.get('state'))
+            self.__seq = record['seq']
+            replayed += 1
+        self.__seen = self.__disk_stamp()
+        self.logger.debug(f"loaded snapshot seq:{self.__snapshot_seq}, replayed {replayed} journal record(s)")
+
+    def __disk_stamp(self):
+        stamp = []
+        for path in (self.__path, self.__snapshot_path):
+            try:
+                stat = path.stat()
+                stamp.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    @contextlib.contextmanager
+    def __writer(self):
+        with self.__lock:
+            if self.__writer_depth:
+                self.__writer_depth += 1
+                try:
+                    yield
+                finally:
+                    self.__writer_depth -= 1
+                return
+            with self.__lock_path.open('a') as fp:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+                self.__writer_depth = 1
+                try:
+                    yield
+                finally:
+                    self.__writer_depth = 0
+
+    def __catch_up(self):
+        # another process appended or compacted since we last looked, replay it and put our ops after it
+        if self.__disk_stamp() == self.__seen:
+            return
+        self.logger.debug(f"journal '{self.__path}' changed by another writer, reloading")
+        if self.__fp is not None:
+            self.__sync()
+            self.__fp.close()
+            self.__fp = None
+        self.__load()
+        for op, uuid, state in self.__pending:
+            self.__apply_op(op, uuid, state)
+
+    def __refresh(self):
+        # reads see what other writers appended, the stat is cheap next to a replay
+        with self.__lock:
+            if self.__disk_stamp() != self.__seen:
+                with self.__writer():
+                    self.__catch_up()
+
+    def __read_records(self, path: Path, repair=False) -> Iterator[dict]:
+        if not path.exists():
+            return
+        valid_size = 0
+        with path.open('rb') as fp:
+            for line in fp:
+                if not line.endswith(b'\n'):
+                    # a torn write from a crash is never acknowledged by a sync, drop it
+                    self.logger.warning(f"ignoring incomplete journal record in '{path}'")
+                    if repair:
+                        os.truncate(path, valid_size)
+                    break
+                valid_size += len(line)
+                yield json.loads(line)
+
+    def __apply_op(self, op, uuid, state):
+        if op == 'set':
+            self.__state[uuid] = state
+        elif op == 'delete':
+            self.__state.pop(uuid, None)
+        elif op == 'mark_destroy':
+            self.__state["to_destroy"].append(state)
+        elif op == 'delete_destroy':
+            # the newest entry, the one get_state(from_delete=True) returns
+            to_destroy = self.__state["to_destroy"]
+            for i in range(len(to_destroy) - 1, -1, -1):
+                if uuid == to_destroy[i]['uuid']:
+                    del to_destroy[i]
+                    break
+
+    def __append(self, op, uuid, state=None):
+        with self.__lock:
+            self.__apply_op(op, uuid, state)
+            self.__pending.append((op, uuid, state))
+            if self.in_transaction:
+                if self._checkpoint_due(len(self.__pending)):
+                    self.__write_pending()
+                    self.__sync()
+                return
+            self.__write_pending()
+            if self.__sync_every and self.__unsynced >= self.__sync_every:
+                self.__sync()
+
+    def __write_pending(self):
+        if not self.__pending:
+            return
+        with self.__writer():
+            self.__catch_up()
+            lines = []
+            for op, uuid, state in self.__pending:
+                self.__seq += 1
+                record = {'seq': self.__seq, 'at': time.time(), 'op': op, 'uuid': uuid}
+                if state is not None:
+                    record['apply_uuid'] = state.get('apply_uuid')
+                    record['state'] = state
+                lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+            if self.__fp is None:
+                self.__fp = self.__path.open('a')
+            self.__fp.write(''.join(lines))
+            # visible to other writers before the lock is released, fsync still follows sync_every
+            self.__fp.flush()
+            self.__unsynced += len(lines)
+            self.__pending = []
+            self.__seen = self.__disk_stamp()
+
+    def __sync(self):
+        if self.__fp is not None and self.__unsynced:
+            self.__fp.flush()
+            os.fsync(self.__fp.fileno())
+        self.__unsynced = 0
+
+    @log_func()
+    def compact(self) -> None:
+        with self.__writer():
+            self.__write_pending()
+            self.__catch_up()
+            self.__sync()
+            # the snapshot lands first, records it covers are skipped on replay if we crash before rotating
+            atomic_write_bytes(self.__snapshot_path, self.__codec.dumps({'seq': self.__seq, 'state': self.__state}))
+            self.__snapshot_seq = self.__seq
+            if self.__fp is not None:
+                self.__fp.close()
+                self.__fp = None
+            if self.__path.exists():
+                if self.__keep_history:
+                    os.replace(self.__path, self.__path.with_name(f"{self.__path.name}.{self.__seq:012d}"))
+                else:
+                    self.__path.unlink()
+            self.__seen = self.__disk_stamp()
+
+    def history(self, apply_uuid: UUID | str = None) -> Iterator[dict]:
+        with self.__lock:
+            self.__sync()
+            paths = sorted(self.__path.parent.glob(f"{self.__path.name}.[0-9]*")) if self.__keep_history else []
+            paths.append(self.__path)
+        for path in paths:
+            for record in self.__read_records(path):
+                if apply_uuid is None or record.get('apply_uuid') == str(apply_uuid):
+                    yield record
+
+    @log_func()
+    def get_state(self, uuid: UUID | str, from_delete=False) -> dict | None:
+        uuid = str(uuid)
+        with self.__lock:
+            self.__refresh()
+            state = self.__state
+            if from_delete:
+                state = {value['uuid']: value for value in self.__state["to_destroy"]}
+            return state.get(uuid)
+
+    @log_func()
+    def get_states(self, uuids: List[UUID | str]) -> Dict[str, dict | None]:
+        with self.__lock:
+            self.__refresh()
+            return {str(uuid): self.__state.get(str(uuid)) for uuid in uuids}
+
+    def set_state(self, uuid: UUID | str, state: dict) -> None:
+        state['folder'] = self.__folder
+        self.__append('set', str(uuid), state)
+
+    def mark_destroy(self, uuid: UUID | str, state: dict) -> None:
+        self.__append('mark_destroy', str(uuid), state)
+
+    def delete_state(self, uuid: UUID | str, from_delete=False) -> None:
+        self.__append('delete_destroy' if from_delete else 'delete', str(uuid))
+
+    def get_to_destroy(self) -> List[Dict[str, Any]]:
+        with self.__lock:
+            self.__refresh()
+            return copy.deepcopy(self.__state['to_destroy'])
+
+    def get_output(self, cls: Type):
+        with self.__lock:
+            self.__refresh()
+            states = list(self.__state.items())
+
+        cls_fullname = class_full_name(cls)
+        for uuid, state in states:
+            if uuid == 'to_destroy':
+                continue
+            if self.__folder.startswith(state['folder']) and state['output_type'] == cls_fullname:
+                return from_dict(cls, state['output'])
+        else:
+            raise OutputTypeNotFound()
+
+    @log_func()
+    def flush(self) -> None:
+        with self.__lock:
+            self.__write_pending()
+            self.__sync()
+            if self.__compact_every and self.__seq - self.__snapshot_seq >= self.__compact_every:
+                self.compact()
+
+    def _pending_count(self) -> int:
+        return len(self.__pending)
+
+    def _write_transaction(self) -> None:
+        # one append and one fsync for the whole transaction
+        self.flush()
+
+    def _drop_transaction(self) -> None:
+        # memory is rebuilt from disk
+        self.__pending = []
+        self.__sync()
+        with self.__writer():
+            self.__load()
+
+    def close(self):
+        with self.__lock:
+            self.__write_pending()
+            self.__sync()
+            if self.__fp is not None:
+                self.__fp.close()
+                self.__fp = None
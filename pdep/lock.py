@@ -0,0 +1,184 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class LeaseTimeout(Exception):
+    pass
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class FileLease:
+    # a lease record kept in one lock file that is never removed. Every read-modify-write of the record happens
+    # under fcntl.flock on that file, which the kernel drops when a process dies, so the holder token is compared
+    # and replaced in place. A holder that dies leaves a lease anyone can take over once it expires, a live holder
+    # renews it from a background thread every renew_every seconds.
+
+    def __init__(self, path: str | Path, ttl=30.0, timeout=None, poll=0.02, logger=None, clock=time.time,
+                 renew_every=None):
+        self.__path = Path(path)
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__ttl = ttl
+        self.__timeout = timeout
+        self.__poll = poll
+        self.__clock = clock
+        self.__renew_every = ttl / 3 if renew_every is None else renew_every
+        self.__token = None
+        self.__lost = False
+        self.__depth = 0
+        self.__renewer = None
+        self.__stop_renewing = None
+        self.__lock = threading.RLock()
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def held(self):
+        return self.__token is not None and not self.__lost
+
+    def __guarded(self, func):
+        fd = os.open(self.__path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), 'r+') as fp:
+                try:
+                    lease = json.loads(fp.read() or 'null')
+                except ValueError:
+                    # a writer died mid write, nobody holds it
+                    lease = None
+                lease, result = func(lease)
+                if lease is not False:
+                    fp.seek(0)
+                    fp.truncate()
+                    if lease is not None:
+                        json.dump(lease, fp)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                return result
+        finally:
+            os.close(fd)
+
+    def __new_lease(self, token):
+        return {'token': token, 'pid': os.getpid(), 'host': socket.gethostname(),
+                'expires': self.__clock() + self.__ttl}
+
+    def __try_take(self) -> bool:
+        token = uuid.uuid4().hex
+
+        def take(lease):
+            if lease and lease.get('expires', 0) > self.__clock():
+                return False, False
+            if lease:
+                self.logger.warning(f"broke expired lease '{self.__path}' held by pid:{lease.get('pid')} "
+                                    f"host:{lease.get('host')}")
+            return self.__new_lease(token), True
+
+        if not self.__guarded(take):
+            return False
+        self.__token = token
+        self.__lost = False
+        return True
+
+    def renew(self) -> None:
+        # no thread lock here, the holding thread keeps it for as long as it is inside the with block
+        token = self.__token
+        if token is None:
+            raise LeaseLost(f"lease '{self.__path}' is not held")
+
+        def extend(lease):
+            if not lease or lease.get('token') != token:
+                return False, False
+            return self.__new_lease(token), True
+
+        if not self.__guarded(extend):
+            self.__lost = True
+            raise LeaseLost(f"lease '{self.__path}' was taken over after expiring")
+
+    def __renew_loop(self, stop: threading.Event):
+        while not stop.wait(self.__renew_every):
+            try:
+                self.renew()
+            except LeaseLost as e:
+                self.logger.error(str(e))
+                return
+            except OSError as e:
+                self.logger.warning(f"could not renew lease '{self.__path}': {e}")
+
+    def __start_renewing(self):
+        if not self.__renew_every:
+            return
+        self.__stop_renewing = threading.Event()
+        self.__renewer = threading.Thread(target=self.__renew_loop, args=(self.__stop_renewing,),
+                                          name=f"renew {self.__path.name}", daemon=True)
+        self.__renewer.start()
+
+    def __stop_renewer(self):
+        if self.__renewer is None:
+            return
+        self.__stop_renewing.set()
+        if self.__renewer is not threading.current_thread():
+            self.__renewer.join()
+        self.__renewer = self.__stop_renewing = None
+
+    def acquire(self):
+        with self.__lock:
+            if self.__depth:
+                self.__depth += 1
+                return self
+            start_t = self.__clock()
+            while not self.__try_take():
+                if self.__timeout is not None and self.__clock() - start_t > self.__timeout:
+                    raise LeaseTimeout(f"could not acquire '{self.__path}' within {self.__timeout}s")
+                time.sleep(self.__poll)
+            self.__depth = 1
+            self.__start_renewing()
+            return self
+
+    def release(self):
+        with self.__lock:
+            self.__depth -= 1
+            if self.__depth:
+                return
+            self.__stop_renewer()
+            token, self.__token = self.__token, None
+
+            def clear(lease):
+                if not lease or lease.get('token') != token:
+                    return False, False
+                return None, True
+
+            if not self.__guarded(clear):
+                self.logger.warning(f"lease '{self.__path}' was broken while held, expired after {self.__ttl}s")
+
+    def __enter__(self):
+        self.__lock.acquire()
+        try:
+            return self.acquire()
+        except BaseException:
+            self.__lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.release()
+        finally:
+            self.__lock.release()
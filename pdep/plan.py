@@ -1,13 +1,15 @@
+import contextlib
 import copy
 import dataclasses
 import importlib
 import inspect
 import logging
 import os
+import threading
 import uuid
+import weakref
 from dataclasses import dataclass
 from functools import wraps
-import json
 from hashlib import md5
 from pathlib import Path
 from typing import TypeVar, Generic, get_args, Union, Dict, Any, List, Type
@@ -15,11 +17,20 @@ from uuid import UUID
 
 import appdirs
 import boto3
+import botocore.config
 from dataclasses_json import dataclass_json
 
+from pdep.codecs import StateCodec, get_codec, decode_state, detect_codec
+from pdep.drift import DriftCache, drift_key
+from pdep.executor import DagExecutor, closure
+from pdep.graph import DependencyGraph
 from pdep.inter import implements
-from pdep.utils import DynamicDataContainer, dict_to_class, log_func, load_class_from_str, convert_something_values, \
-    unused, class_full_name
+from pdep.lock import FileLease
+from pdep.preview import PlanPreview, PlannedChange, CREATE, UPDATE, REPLACE, DESTROY, NO_OP
+from pdep.serde import to_dict, from_dict
+from pdep.trace import trace_span, botocore_call_hook
+from pdep.utils import DynamicDataContainer, log_func, load_class_from_str, class_full_name, atomic_write_bytes, \
+    stable_hash, class_code_version, Backoff, shared_batch_waiter, find_value_slots, fill_value_slots
 
 zstr = Union[str, None, Any]
 
@@ -28,11 +39,24 @@ class OutputTypeNotFound(Exception):
     pass
 
 
+class NoTransaction(Exception):
+    pass
+
+
+class StateConflict(Exception):
+    def __init__(self, uuids: List[str]):
+        self.uuids = uuids
+        super().__init__(f"state record(s) changed by another writer: {', '.join(uuids)}")
+
+
 class ResourceManager:
 
     def get_state(self, uuid: UUID | str, from_delete=False) -> dict | None:
         pass
 
+    def get_states(self, uuids: List[UUID | str]) -> Dict[str, dict | None]:
+        pass
+
     def set_state(self, uuid: UUID | str, state: dict) -> None:
         pass
 
@@ -48,6 +72,18 @@ class ResourceManager:
     def get_output(self, cls: Type):
         pass
 
+    def flush(self) -> None:
+        pass
+
+    def begin(self, apply_uuid: UUID | str) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
     @property
     def folder(self) -> str:
         pass
@@ -56,19 +92,140 @@ class ResourceManager:
     def folder(self, folder):
         pass
 
+
+class TransactionalResourceManager(ResourceManager):
+    # begin/commit/rollback bookkeeping shared by the managers. Nested begins join the outermost transaction and only
+    # its commit writes, a commit that fails leaves the transaction open to roll back. Subclasses say what is pending
+    # and how it is written or dropped.
+
+    def __init__(self, lock: threading.RLock, checkpoint_every: int | None):
+        self.__txn_lock = lock
+        self.__txn_depth = 0
+        self.__apply_uuid = None
+        # a transaction is written out every this many changes, bounds what a crash loses
+        self.__checkpoint_every = checkpoint_every
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.__txn_depth > 0
+
+    @property
+    def apply_uuid(self) -> str | None:
+        return self.__apply_uuid
+
+    def _checkpoint_due(self, pending: int) -> bool:
+        return bool(self.__txn_depth and self.__checkpoint_every and pending >= self.__checkpoint_every)
+
+    def _pending_count(self) -> int:
+        pass
+
+    def _begin_transaction(self) -> None:
+        pass
+
+    def _write_transaction(self) -> None:
+        pass
+
+    def _drop_transaction(self) -> None:
+        pass
+
+    def begin(self, apply_uuid: UUID | str) -> None:
+        with self.__txn_lock:
+            if not self.__txn_depth:
+                self._begin_transaction()
+                self.__apply_uuid = str(apply_uuid)
+            self.__txn_depth += 1
+
+    @log_func()
+    def commit(self) -> None:
+        with self.__txn_lock:
+            if not self.__txn_depth:
+                raise NoTransaction(f"commit without begin on {self.full_name}")
+            if self.__txn_depth > 1:
+                self.__txn_depth -= 1
+                return
+            self.logger.debug(f"committing {self._pending_count()} state change(s) apply_uuid:{self.__apply_uuid}")
+            self._write_transaction()
+            self.__txn_depth = 0
+            self.__apply_uuid = None
+
+    @log_func()
+    def rollback(self) -> None:
+        with self.__txn_lock:
+            if not self.__txn_depth:
+                raise NoTransaction(f"rollback without begin on {self.full_name}")
+            self.__txn_depth -= 1
+            if not self.__txn_depth:
+                self.__apply_uuid = None
+            # everything since the last checkpoint is dropped, nested or not
+            pending = self._pending_count()
+            if pending:
+                self.logger.warning(f"rolling back {pending} unwritten state change(s)")
+            self._drop_transaction()
+
+
+def _commit_or_roll_back(resource_manager: ResourceManager, logger):
+    try:
+        with trace_span("commit"):
+            resource_manager.commit()
+    except BaseException:
+        # a manager left inside the transaction would buffer every later write
+        try:
+            resource_manager.rollback()
+        except Exception as e:
+            logger.error(f"rollback after a failed commit failed: {e!r}")
+        raise
+
+
+@contextlib.contextmanager
+def state_transaction(resource_manager: ResourceManager, apply_uuid, logger, active=True):
+    # whatever was applied before a failure is committed too, the infrastructure exists. If that commit fails as
+    # well it is logged and the original error is the one raised.
+    if not active:
+        yield
+        return
+    resource_manager.begin(apply_uuid)
+    try:
+        yield
+    except BaseException:
+        try:
+            _commit_or_roll_back(resource_manager, logger)
+        except Exception as e:
+            logger.error(f"could not record the state of a failed apply: {e!r}")
+        raise
+    _commit_or_roll_back(resource_manager, logger)
+
+
+def state_file_path(path: str | Path) -> Path:
+    path = Path(path)
+    if not path.is_absolute():
+        path = Path(appdirs.user_data_dir("pdep", "msops")).joinpath(path)
+    os.makedirs(path.parent, exist_ok=True)
+    return path
+
+
 @implements(ResourceManager)
-class FileResourceManager(ResourceManager):
+class FileResourceManager(TransactionalResourceManager):
 
-    def __init__(self, path: str | Path, logger=None):
+    def __init__(self, path: str | Path, logger=None, cached=False, codec: str | StateCodec = None, lock=False,
+                 lease_ttl=30.0, lock_timeout=None, checkpoint_every=100):
         self.__logger = logger if logger else logging.getLogger(self.full_name)
-        self.__path = Path(path)
-        if not self.__path.is_absolute():
-            self.__path = Path(appdirs.user_data_dir("pdep", "msops")).joinpath(path)
-        os.makedirs(self.__path.parent, exist_ok=True)
-
+        self.__path = state_file_path(path)
+        # with no codec given an existing file keeps the one it was written with, e.g. after a migrate
+        self.__detect_codec = codec is None
+        self.__codec = get_codec(codec)
+        # opt in, shares the state file between processes through '<state>.lock'
+        self.__lease = FileLease(self.__path.with_name(f"{self.__path.name}.lock"), ttl=lease_ttl,
+                                 timeout=lock_timeout, logger=self.__logger) if lock else None
 
         self.__state = {"to_destroy": []}
         self.__folder = "/"
+        self.__cached = cached
+        self.__stamp = None
+        self.__pending = []
+        # what each record we changed looked like on disk before the change, to spot concurrent writers
+        self.__base = {}
+        self.__lock = threading.RLock()
+        super().__init__(self.__lock, checkpoint_every)
 
     @property
     def logger(self):
@@ -86,93 +243,172 @@ class FileResourceManager(ResourceManager):
     def folder(self, folder):
         self.__folder = folder
 
+    @property
+    def cached(self):
+        return self.__cached
 
+    @property
+    def codec(self) -> StateCodec:
+        return self.__codec
+
+    def __buffering(self):
+        return self.__cached or self.in_transaction
+
+    def __file_stamp(self):
+        try:
+            stat = self.__path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def __locked(self):
+        return self.__lease if self.__lease is not None else contextlib.nullcontext()
+
+    def __load(self, force=False):
+        stamp = self.__file_stamp()
+        if self.__buffering() and stamp == self.__stamp and not force:
+            return
+
+        if self.__buffering() and self.__stamp is not None:
+            self.logger.info(f"state file '{self.__path}' changed on disk, reloading")
+
+        if stamp is None:
+            state = {"to_destroy": []}
+        else:
+            data = self.__path.read_bytes()
+            if self.__detect_codec:
+                self.__codec = detect_codec(data)
+            state = decode_state(data)
+        # unflushed changes are replayed on top of whatever is on disk now and other writers' records survive,
+        # but a record both of us changed is a conflict: nothing is loaded or written until the caller rolls back
+        conflicts = [uuid for uuid, base in self.__base.items() if state.get(uuid) != base]
+        if conflicts:
+            raise StateConflict(conflicts)
+        self.__state = state
+        self.__stamp = stamp
+        for op in self.__pending:
+            self.__apply_op(*op)
+
+    def __apply_op(self, op, uuid, state):
+        if op == 'set':
+            self.__state[uuid] = state
+        elif op == 'delete':
+            self.__state.pop(uuid, None)
+        elif op == 'mark_destroy':
+            self.__state["to_destroy"].append(state)
+        elif op == 'delete_destroy':
+            # the newest entry, the one get_state(from_delete=True) returns
+            to_destroy = self.__state["to_destroy"]
+            for i in range(len(to_destroy) - 1, -1, -1):
+                if uuid == to_destroy[i]['uuid']:
+                    del to_destroy[i]
+                    break
+
+    def __mutate(self, op, uuid, state=None):
+        with self.__lock:
+            if self.__buffering():
+                self.__load()
+                if op in ('set', 'delete') and uuid not in self.__base:
+                    self.__base[uuid] = self.__state.get(uuid)
+                self.__apply_op(op, uuid, state)
+                self.__pending.append((op, uuid, state))
+                if self._checkpoint_due(len(self.__pending)):
+                    self.flush()
+                return
+            with self.__locked():
+                self.__load(force=True)
+                self.__apply_op(op, uuid, state)
+                self.__dump()
+
+    def __dump(self):
+        # only ever called right after a load, holding the lease if there is one
+        atomic_write_bytes(self.__path, self.__codec.dumps(self.__state))
+        self.__stamp = self.__file_stamp()
 
     @log_func()
     def get_state(self, uuid: UUID | str, from_delete=False) -> dict | None:
         uuid = str(uuid)
-        if not self.__path.exists():
-            return None
+        with self.__lock:
+            self.__load()
 
-        with self.__path.open('r') as fp:
-            self.__state = json.load(fp)
-            fp.close()
-        state = self.__state
-        if from_delete:
-            state = {value['uuid']: value for value in self.__state["to_destroy"]}
-        if uuid in state:
-            return state[uuid]
-        else:
-            return None
+            state = self.__state
+            if from_delete:
+                state = {value['uuid']: value for value in self.__state["to_destroy"]}
+            if uuid in state:
+                return state[uuid]
+            else:
+                return None
 
-    def set_state(self, uuid: UUID | str, state: dict) -> None:
-        if self.__path.exists():
-            with self.__path.open('r') as fp:
-                self.__state = json.load(fp)
-                fp.close()
+    @log_func()
+    def get_states(self, uuids: List[UUID | str]) -> Dict[str, dict | None]:
+        with self.__lock:
+            self.__load()
+            return {str(uuid): self.__state.get(str(uuid)) for uuid in uuids}
 
+    def set_state(self, uuid: UUID | str, state: dict) -> None:
         state['folder'] = self.__folder
-        self.__state[str(uuid)] = state
-
-        with self.__path.open('w') as fp:
-            json.dump(self.__state, fp, indent=4)
-            fp.close()
+        self.__mutate('set', str(uuid), state)
 
     def mark_destroy(self, uuid: UUID | str, state: dict) -> None:
-        unused(uuid)
-        self.__state["to_destroy"].append(state)
-        with self.__path.open('w') as fp:
-            json.dump(self.__state, fp, indent=4)
-            fp.close()
+        self.__mutate('mark_destroy', str(uuid), state)
 
     def delete_state(self, uuid: UUID | str, from_delete=False) -> None:
-        if self.__path.exists():
-            with self.__path.open('r') as fp:
-                self.__state = json.load(fp)
-                fp.close()
-
-        if from_delete:
-            for i, state in enumerate(self.__state["to_destroy"]):
-                if str(uuid) == state['uuid']:
-                    del self.__state["to_destroy"][i]
-                    break
-        else:
-            if str(uuid) in self.__state:
-                del self.__state[str(uuid)]
-
-        with self.__path.open('w') as fp:
-            json.dump(self.__state, fp, indent=4)
-            fp.close()
+        self.__mutate('delete_destroy' if from_delete else 'delete', str(uuid))
 
     def get_to_destroy(self) -> List[Dict[str, Any]]:
-        if self.__path.exists():
-            with self.__path.open('r') as fp:
-                self.__state = json.load(fp)
-                fp.close()
-        else:
-            return []
-
-        return copy.deepcopy(self.__state['to_destroy'])
+        with self.__lock:
+            self.__load()
+            return copy.deepcopy(self.__state['to_destroy'])
 
     def get_output(self, cls: Type):
-        if self.__path.exists():
-            with self.__path.open('r') as fp:
-                self.__state = json.load(fp)
-                fp.close()
+        with self.__lock:
+            self.__load()
+            states = list(self.__state.items())
 
         cls_fullname = class_full_name(cls)
-        for uuid, state in self.__state.items():
+        for uuid, state in states:
             if uuid == 'to_destroy':
                 continue
             if self.__folder.startswith(state['folder']) and state['output_type'] == cls_fullname:
-                return cls.from_dict(state['output'])
+                return from_dict(cls, state['output'])
         else:
             raise OutputTypeNotFound()
 
+    @log_func()
+    def flush(self) -> None:
+        with self.__lock:
+            if not self.__pending:
+                return
+            with self.__locked():
+                self.__load(force=self.__lease is not None)
+                self.__dump()
+            self.__pending = []
+            self.__base = {}
+
+    def _pending_count(self) -> int:
+        return len(self.__pending)
+
+    def _begin_transaction(self) -> None:
+        # cached changes from before the transaction are not the rollback's to drop
+        self.flush()
+
+    def _write_transaction(self) -> None:
+        # one locked rewrite of the file for the whole transaction
+        self.flush()
+
+    def _drop_transaction(self) -> None:
+        self.__pending = []
+        self.__base = {}
+        self.__load(force=True)
+
 
 class AwsLocalStackProvider:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, max_pool_connections=10, tcp_keepalive=True):
         self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__config = botocore.config.Config(
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=tcp_keepalive
+        )
         self.__session = boto3.Session(
             aws_access_key_id="test",
             aws_secret_access_key="test",
@@ -206,6 +442,15 @@ class AwsLocalStackProvider:
             "events": "http://localhost:4566",
             "elbv2": "http://localhost:4566",
         }
+        # boto3 sessions are not thread safe, client creation is serialized for parallel applies
+        self.__lock = threading.Lock()
+        # clients are thread safe and shared, resources are not and are cached per thread
+        self.__clients = {}
+        self.__local = threading.local()
+        # clients copy the session's hooks when created, api calls are counted per trace span by default
+        self.__session.events.register("before-call", botocore_call_hook)
+        # only to hook clients that already exist, a client nobody uses any more is not kept alive
+        self.__live_clients = weakref.WeakSet()
 
     @property
     def logger(self):
@@ -222,11 +467,37 @@ class AwsLocalStackProvider:
     def get_endpoint(self, name):
         return self.__endpoints[name]
 
+    @property
+    def config(self):
+        return self.__config
+
+    def add_event_hook(self, event_name, handler):
+        with self.__lock:
+            self.__session.events.register(event_name, handler)
+            for client in list(self.__live_clients):
+                client.meta.events.register(event_name, handler)
+
     def create_resource(self, name):
-        return self.__session.resource(name, endpoint_url=self.get_endpoint(name))
+        if not hasattr(self.__local, 'resources'):
+            self.__local.resources = {}
+        resource = self.__local.resources.get(name)
+        if resource is None:
+            with self.__lock:
+                resource = self.__session.resource(name, endpoint_url=self.get_endpoint(name), config=self.__config)
+                self.__live_clients.add(resource.meta.client)
+            self.__local.resources[name] = resource
+        return resource
 
     def create_client(self, name):
-        return self.__session.client(name, endpoint_url=self.get_endpoint(name))
+        client = self.__clients.get(name)
+        if client is None:
+            with self.__lock:
+                client = self.__clients.get(name)
+                if client is None:
+                    client = self.__session.client(name, endpoint_url=self.get_endpoint(name), config=self.__config)
+                    self.__live_clients.add(client)
+                    self.__clients[name] = client
+        return client
 
 
 T = TypeVar('T')
@@ -256,20 +527,27 @@ class Connector:
         return self.__value
 
     def resolve(self):
-        def visitor(value):
-            if isinstance(value, Connector):
-                return value.value
-            return value
-
         if not self.__resolved:
             self.__value = self.__func[0](self.__obj)
             if self.__attr:
                 self.__value = getattr(self.__value, self.__attr)
-            self.__value = convert_something_values(self.__value, visitor)
+            self.__value = resolve_connectors(self.__value)
             self.__resolved = True
 
+    def peek(self) -> Any:
+        # what resolve() would produce right now, nothing along the chain is cached or filled in
+        if self.__resolved:
+            return self.__value
+        if isinstance(self.__obj, Connector) and self.__func[0] is Connector.get_value:
+            value = self.__obj.peek()
+        else:
+            value = self.__func[0](self.__obj)
+        if self.__attr:
+            value = getattr(value, self.__attr)
+        return peek_connectors(value)
+
     def __getattr__(self, name):
-        if name.startswith("_") or name in ['resolve', 'value', 'root_objs', 'get_value']:
+        if name.startswith("_") or name in ['resolve', 'value', 'root_objs', 'get_value', 'peek']:
             return self.__getattribute__(name)
         return Connector(self, Connector.get_value, name)
 
@@ -307,41 +585,63 @@ class CalcConnector(Connector):
         return self.__value
 
     def resolve(self):
-        def visitor(value):
-            if isinstance(value, Connector):
-                return value.value
-            return value
-
         if not self.__resolved:
-            args = []
-            for arg in self.__args:
-                if isinstance(arg, Connector):
-                    value = convert_something_values(arg.value, visitor)
-                    args.append(value)
-                else:
-                    args.append(arg)
-
-            kwargs = {}
-            for key, arg in self.__kwargs.items():
-                if isinstance(arg, Connector):
-                    value = convert_something_values(arg.value, visitor)
-                    kwargs[key] = value
-                else:
-                    kwargs[key] = arg
+            # a connector value is already resolved all the way down
+            args = [connector_value(arg) for arg in self.__args]
+            kwargs = {key: connector_value(arg) for key, arg in self.__kwargs.items()}
 
             self.__value = self.__func[0](*args, **kwargs)
-            self.__value = convert_something_values(self.__value, visitor)
+            self.__value = resolve_connectors(self.__value)
             self.__resolved = True
 
+    def peek(self) -> Any:
+        if self.__resolved:
+            return self.__value
+        args = [peek_connectors(arg) for arg in self.__args]
+        kwargs = {key: peek_connectors(arg) for key, arg in self.__kwargs.items()}
+        return peek_connectors(self.__func[0](*args, **kwargs))
+
     def calc(self, *args, **kwargs):
         pass
 
     def __getattr__(self, name):
-        if name.startswith("_") or name in ['resolve', 'value', 'calc', 'root_objs', 'get_value']:
+        if name.startswith("_") or name in ['resolve', 'value', 'calc', 'root_objs', 'get_value', 'peek']:
             return self.__getattribute__(name)
         return Connector(self, Connector.get_value, name)
 
 
+def is_connector(value):
+    return isinstance(value, Connector)
+
+
+def connector_value(value):
+    if isinstance(value, Connector):
+        return value.value
+    return value
+
+
+def resolve_connectors(something):
+    something = connector_value(something)
+    fill_value_slots(find_value_slots(something, is_connector), connector_value)
+    return something
+
+
+def peek_connectors(something, slots=None):
+    # a resolved copy, the connectors in the original stay where they are
+    if isinstance(something, Connector):
+        return something.peek()
+    if slots is None:
+        if type(something) not in (list, dict) and not dataclasses.is_dataclass(something):
+            return something
+        slots = find_value_slots(something, is_connector)
+    memo = {}
+    for holder, key in slots:
+        value = holder[key] if type(holder) in (list, dict) else getattr(holder, key)
+        if isinstance(value, Connector):
+            memo[id(value)] = value.peek()
+    return copy.deepcopy(something, memo) if memo else something
+
+
 def output_property(prop_func):
     @wraps(prop_func)
     def func(self):
@@ -385,13 +685,14 @@ class BaseBaseResource(Generic[InputT, OutputT]):
         self.__scan_input_for_dependencies()
 
     def __scan_input_for_dependencies(self):
-        def visit(value):
-            if isinstance(value, Connector):
-                for obj in value.root_objs:
-                    self.depends_on(obj)
-            return value
-
-        convert_something_values(self._input, visit)
+        # the places holding connectors are found once, resolving only revisits them
+        self.__input_slots = find_value_slots(self._input, is_connector)
+        connectors = [self._input] if isinstance(self._input, Connector) else []
+        connectors += [holder[key] if type(holder) in (list, dict) else getattr(holder, key)
+                       for holder, key in self.__input_slots]
+        for connector in connectors:
+            for obj in connector.root_objs:
+                self.depends_on(obj)
 
     @property
     def system_tags(self):
@@ -441,6 +742,10 @@ class BaseBaseResource(Generic[InputT, OutputT]):
             return self.__plan.root_plan
         return self
 
+    @property
+    def drift_cache(self):
+        return self.__plan.drift_cache if self.__plan else None
+
     @plan.setter
     def plan(self, plan: 'BasePlan'):
         self.__plan = plan
@@ -461,30 +766,68 @@ class BaseBaseResource(Generic[InputT, OutputT]):
     def reset_apply_state(self):
         self._applied = False
 
+    @property
+    def input_class(self):
+        return self.__input_t
+
+    @property
+    def output_class(self):
+        return self.__output_t
+
+    @property
+    def dependencies(self):
+        return self.__depends
+
+    def _pending_graph(self, neighbours) -> DependencyGraph:
+        # only what hasn't run yet is walked, running in this order never walks a finished subtree again
+        def pending(res):
+            return [other for other in neighbours(res) if not other._applied]
+        return DependencyGraph(closure([self], pending), pending)
+
+    def _dependencies_to_apply(self) -> List['BaseBaseResource']:
+        # dependencies of dependencies come first
+        return [res for res in self._pending_graph(lambda res: res.dependencies).topological_order() if res is not self]
+
+    def _dependents_to_destroy(self) -> List['BaseBaseResource']:
+        # what depends on a resource goes before it, a resource's own plan is left to the plan
+        graph = self._pending_graph(lambda res: [sup for sup in res._supports if sup != res.plan])
+        return [res for res in graph.topological_order() if res is not self]
+
     def depends_on(self, res: 'BaseResource'):
         self.__depends.add(res)
         res._supports.add(self)
 
     def resolve_dependent_values(self):
-        def visitor(item):
-            if isinstance(item, Connector):
-                return item.value
-            return item
-
-        self._input = convert_something_values(self._input, visitor)
+        self._input = connector_value(self._input)
+        fill_value_slots(self.__input_slots, connector_value)
+
+    def input_hash(self, input: InputT) -> str | None:
+        return self.__input_dict_hash(to_dict(input) if input else None)
+
+    def __input_dict_hash(self, input_dict) -> str | None:
+        # hashes what is stored, so fields with their own encoders hash the way they are written
+        try:
+            return stable_hash(self.class_full_name, input_dict, sorted(str(res.uuid) for res in self.__depends))
+        except TypeError as e:
+            # no stable form, the resource is applied every time instead of never
+            self.logger.debug(f"{self.full_name} input has no stable hash, it is never skipped: {e}")
+            return None
 
     def _create_state_dict(self, output, input, apply_uuid):
+        input_dict = to_dict(input) if input else None
         return {
-            'output': output.to_dict(),
+            'output': to_dict(output),
             'output_type': class_full_name(output.__class__),
-            'input': input.to_dict() if input else None,
+            'input': input_dict,
             'input_type': class_full_name(input.__class__) if input else None,
+            'input_hash': self.__input_dict_hash(input_dict),
             'class': f"{self.__class__.__module__}.{self.__class__.__name__}",
             'path': self.path,
             'uuid': str(self.uuid),
             'plan': f"{self.__plan.__class__.__module__}.{self.__plan.__class__.__name__}" if self.plan else None,
             'plan_uuid': str(self.__plan.uuid) if self.plan else None,
-            'apply_uuid': str(apply_uuid)
+            'apply_uuid': str(apply_uuid),
+            'depends': sorted(str(res.uuid) for res in self.__depends)
         }
 
     @log_func()
@@ -494,17 +837,76 @@ class BaseBaseResource(Generic[InputT, OutputT]):
         state_dict = self._create_state_dict(self._output, env_inputs, apply_uuid)
         resource_manager.mark_destroy(self.uuid, state_dict)
 
+    def _fetch_state(self, resource_manager: ResourceManager, from_deleted=False):
+        # the plan reads all of its resources' states in one call up front, each is taken once
+        if not from_deleted and self.__plan is not None:
+            found, state_dict = self.__plan._take_prefetched_state(self.uuid)
+            if found:
+                return state_dict
+        return resource_manager.get_state(self.uuid, from_deleted)
+
     def _read_state(self, resource_manager: ResourceManager, from_deleted=False):
+        state_dict = self._fetch_state(resource_manager, from_deleted)
+        self._on_state_read(state_dict)
+        return self._state_values(state_dict)
+
+    def _state_values(self, state_dict: dict | None):
         input = None
         output = self.__output_t()
-
-        state_dict = resource_manager.get_state(self.uuid, from_deleted)
         if state_dict:
-            input = self.__input_t.from_dict(state_dict['input']) if state_dict['input'] else None
-            output = self.__output_t.from_dict(state_dict['output'])
-
+            input = from_dict(self.__input_t, state_dict['input']) if state_dict['input'] else None
+            output = from_dict(self.__output_t, state_dict['output'])
         return input, output
 
+    def _on_state_read(self, state_dict: dict | None):
+        pass
+
+    def can_skip_apply(self, state_dict: dict | None, check_drift) -> bool:
+        # unchanged resolved input and nothing to re-check means the stored state is already current
+        if not state_dict or check_drift or state_dict.get('input_hash') is None:
+            return False
+        return state_dict['input_hash'] == self.input_hash(self._input)
+
+    def _is_drift_clean(self, state_dict: dict) -> bool:
+        return False
+
+    def _peeked_input_hash(self) -> str:
+        # the hash the input would have once resolved, connectors read the outputs as they are now
+        return self.input_hash(peek_connectors(self._input, self.__input_slots))
+
+    def plan_change(self, env_inputs: InputT) -> str:
+        # how an apply would move the stored input to the current one, decided without the provider
+        return UPDATE
+
+    def _preview_change(self, state_dict: dict | None, changed_dependencies) -> PlannedChange:
+        if not state_dict or not state_dict['input']:
+            return PlannedChange(self.path, self.class_full_name, str(self.uuid), CREATE)
+
+        known = True
+        try:
+            input = peek_connectors(self._input, self.__input_slots)
+        except Exception:
+            if not changed_dependencies:
+                raise
+            # calculated from an output that doesn't exist yet, the connectors stand in for the unknown values
+            input, known = self._input, False
+        if known and state_dict.get('input_hash') is not None and state_dict['input_hash'] == self.input_hash(input):
+            return PlannedChange(self.path, self.class_full_name, str(self.uuid), NO_OP)
+        env_inputs = from_dict(self.__input_t, state_dict['input'])
+        if known and env_inputs == input:
+            return PlannedChange(self.path, self.class_full_name, str(self.uuid), NO_OP)
+
+        peeked, self._input = self._input, input
+        try:
+            action = self.plan_change(env_inputs)
+        finally:
+            self._input = peeked
+        reason = "input changed"
+        if changed_dependencies:
+            reason += ", depends on " + ", ".join(f"{res.path} ({dependency_action})"
+                                                  for res, dependency_action in changed_dependencies)
+        return PlannedChange(self.path, self.class_full_name, str(self.uuid), action, reason)
+
     @log_func()
     def apply(self, resource_manager: ResourceManager, provider, dry=False, check_dirft=True, apply_uuid=None):
         if self._applied:
@@ -515,22 +917,43 @@ class BaseBaseResource(Generic[InputT, OutputT]):
             apply_uuid = uuid.uuid4()
             self.logger.info(f"New Apply apply_uuid:{apply_uuid}")
 
-        for res in self.__depends:
-            res.apply(resource_manager, provider, dry, check_dirft, apply_uuid=apply_uuid)
+        with state_transaction(resource_manager, apply_uuid, self.logger, active=first_apply):
+            for res in self._dependencies_to_apply():
+                res.apply(resource_manager, provider, dry, check_dirft, apply_uuid=apply_uuid)
 
-        self.logger.debug(f"{self.full_name} apply dry:{dry}")
-        input, self._output = self._read_state(resource_manager)
-        self.resolve_dependent_values()
-        self.do_apply(input, resource_manager, provider, dry, check_dirft, apply_uuid)
-        state_dict = self._create_state_dict(self._output, self._input, apply_uuid=apply_uuid)
-        resource_manager.set_state(self.uuid, state_dict)
-
-        self._applied = True
-        self.logger.info(f"Apply {self.full_name} Done, output:{self._output}")
+            self.logger.debug(f"{self.full_name} apply dry:{dry}")
+            with trace_span("apply", self):
+                skip, input = self._begin_apply(resource_manager, check_dirft)
+                if not skip:
+                    self.do_apply(input, resource_manager, provider, dry, check_dirft, apply_uuid)
+                    self._end_apply(resource_manager, apply_uuid)
 
         if first_apply:
             self.logger.info(f"Apply Finished apply_uuid:{apply_uuid}")
 
+    def _begin_apply(self, resource_manager: ResourceManager, check_drift):
+        with trace_span("resolve_dependent_values", self):
+            self.resolve_dependent_values()
+        with trace_span("read_state", self):
+            state_dict = self._fetch_state(resource_manager)
+            self._on_state_read(state_dict)
+            if self.can_skip_apply(state_dict, check_drift):
+                self._output = from_dict(self.__output_t, state_dict['output'])
+                self._applied = True
+                self.logger.info(f"Apply {self.full_name} skipped, input unchanged, output:{self._output}")
+                return True, None
+
+            input, self._output = self._state_values(state_dict)
+        return False, input
+
+    def _end_apply(self, resource_manager: ResourceManager, apply_uuid):
+        with trace_span("set_state", self):
+            state_dict = self._create_state_dict(self._output, self._input, apply_uuid=apply_uuid)
+            resource_manager.set_state(self.uuid, state_dict)
+
+        self._applied = True
+        self.logger.info(f"Apply {self.full_name} Done, output:{self._output}")
+
     @log_func()
     def do_apply(self, inputs: Dict[str, Any], resource_manager, provider, dry, check_drift, apply_uuid):
         pass
@@ -545,20 +968,33 @@ class BaseBaseResource(Generic[InputT, OutputT]):
             apply_uuid = uuid.uuid4()
             self.logger.info(f"New Destroy apply_uuid:{apply_uuid}")
 
-        if not from_deleted:
-            for res in self._supports:
-                if res != self.__plan:
+        with state_transaction(resource_manager, apply_uuid, self.logger, active=first_apply):
+            if not from_deleted:
+                for res in self._dependents_to_destroy():
                     res.destroy(resource_manager, provider, dry, apply_uuid=apply_uuid)
-        org_output = self._output
-        input, self._output = self._read_state(resource_manager, from_deleted)
-        self.resolve_dependent_values()
-        self.do_destroy(input, resource_manager, provider, apply_uuid, dry=dry)
-        resource_manager.delete_state(self.uuid, from_deleted)
+            org_output = self._output
+            with trace_span("destroy", self):
+                input = self._begin_destroy(resource_manager, from_deleted)
+                with trace_span("do_destroy", self):
+                    self.do_destroy(input, resource_manager, provider, apply_uuid, dry=dry)
+                self._end_destroy(resource_manager, from_deleted, org_output)
+
+        if first_apply:
+            self.logger.info(f"Destroy Finished")
+
+    def _begin_destroy(self, resource_manager: ResourceManager, from_deleted):
+        with trace_span("read_state", self):
+            input, self._output = self._read_state(resource_manager, from_deleted)
+        with trace_span("resolve_dependent_values", self):
+            self.resolve_dependent_values()
+        return input
+
+    def _end_destroy(self, resource_manager: ResourceManager, from_deleted, org_output):
+        with trace_span("delete_state", self):
+            resource_manager.delete_state(self.uuid, from_deleted)
         if from_deleted:
             self._output = org_output
         self._applied = True
-        if first_apply:
-            self.logger.info(f"Destroy Finished")
 
     @log_func()
     def do_destroy(self, env_state: T, inputs: Dict[str, Any], resource_manager, provider, apply_uuid, dry):
@@ -576,9 +1012,11 @@ def sub_uuid(uuid: UUID, obj: Any, name: str):
 
 
 class BasePlan(BaseBaseResource[InputT, OutputT]):
-    def __init__(self, input: InputT, uuid=None, logger=None):
+    def __init__(self, input: InputT, uuid=None, logger=None, drift_cache: DriftCache = None):
         super().__init__(input, logger)
         self.__res = DynamicDataContainer()
+        self.__drift_cache = drift_cache
+        self.__prefetched_states: Dict[str, dict | None] | None = None
         self._set_uuid(uuid)
         self.plan = None
         self.do_init_resources()
@@ -606,6 +1044,16 @@ class BasePlan(BaseBaseResource[InputT, OutputT]):
     def resources(self):
         return self.__res
 
+    @property
+    def drift_cache(self):
+        if self.__drift_cache is None and self.plan:
+            return self.plan.drift_cache
+        return self.__drift_cache
+
+    @drift_cache.setter
+    def drift_cache(self, drift_cache: DriftCache):
+        self.__drift_cache = drift_cache
+
     @log_func()
     def reset_apply_state(self):
         super().reset_apply_state()
@@ -613,15 +1061,73 @@ class BasePlan(BaseBaseResource[InputT, OutputT]):
             res.reset_apply_state()
 
     def _resolve_output_values(self):
-        def visitor(item):
-            if isinstance(item, Connector):
-                return item.value
-            return item
+        self._output = resolve_connectors(self._output)
+
+    def dependency_graph(self) -> DependencyGraph:
+        # the plan's resources and whatever they depend on outside it, edges point at dependencies
+        resources = [value for path, value in self.__res.items() if isinstance(value, BaseResource)]
+        return DependencyGraph(closure(resources, lambda res: res.dependencies), lambda res: res.dependencies)
 
-        self._output = convert_something_values(self._output, visitor)
+    @log_func()
+    def preview(self, resource_manager: ResourceManager) -> PlanPreview:
+        # diffs resolved inputs against stored state, reads state once and never writes it or calls the provider
+        with trace_span("plan_preview", plan=self.class_full_name):
+            order = self.dependency_graph().topological_order()
+            states = resource_manager.get_states([res.uuid for res in order])
+            preview = PlanPreview(self.class_full_name)
+            # outputs are swapped for the stored ones while peeking, new resources' outputs aren't known yet
+            outputs = {res: res._output for res in order}
+            unknown = {}
+            try:
+                for res in order:
+                    state_dict = states[str(res.uuid)]
+                    res._output = from_dict(res.output_class, state_dict['output']) if state_dict \
+                        else res.output_class()
+                    change = res._preview_change(state_dict, [(dep, unknown[dep]) for dep in res.dependencies
+                                                              if dep in unknown])
+                    if change.action in (CREATE, REPLACE):
+                        unknown[res] = change.action
+                        res._output = res.output_class()
+                    preview.changes.append(change)
+            finally:
+                for res, output in outputs.items():
+                    res._output = output
+
+            for state in resource_manager.get_to_destroy():
+                preview.changes.append(PlannedChange(state.get('path'), state['class'], state['uuid'], DESTROY,
+                                                     "left over by an earlier apply"))
+        return preview
+
+    def destroy_graph(self) -> DependencyGraph:
+        # a resource is destroyed only after everything it supports is gone
+        def supported(res):
+            return [sup for sup in res._supports if sup != res.plan]
+
+        return DependencyGraph(closure([res for path, res in self.__res.items()], supported), supported)
+
+    def _prefetch_states(self, resource_manager: ResourceManager, resources) -> None:
+        with trace_span("prefetch_states"):
+            self.__prefetched_states = resource_manager.get_states(
+                [self.uuid] + [res.uuid for res in resources if isinstance(res, BaseResource)])
+
+    def _take_prefetched_state(self, uuid):
+        states = self.__prefetched_states
+        if states is None or str(uuid) not in states:
+            return False, None
+        return True, states.pop(str(uuid), None)
+
+    def _peek_state(self, resource_manager: ResourceManager, uuid):
+        states = self.__prefetched_states
+        if states is not None and str(uuid) in states:
+            return states[str(uuid)]
+        return resource_manager.get_state(uuid)
+
+    def _clear_prefetched_states(self):
+        self.__prefetched_states = None
 
     @log_func()
-    def apply(self, resource_manager: ResourceManager, provider, dry=False, check_drift=True, apply_uuid=None):
+    def apply(self, resource_manager: ResourceManager, provider, dry=False, check_drift=True, apply_uuid=None,
+              max_workers=None):
         if self._applied:
             return
 
@@ -632,27 +1138,140 @@ class BasePlan(BaseBaseResource[InputT, OutputT]):
 
         self.logger.debug(f"{self.full_name} apply dry:{dry}")
 
-        self.reset_apply_state()
-        input, _ = self._read_state(resource_manager)
-        self.resolve_dependent_values()
+        with trace_span("plan_apply", plan=self.class_full_name):
+            self.reset_apply_state()
+            resources = [value for path, value in self.__res.items() if isinstance(value, BaseResource)]
+            with state_transaction(resource_manager, apply_uuid, self.logger, active=first_apply):
+                try:
+                    self._prefetch_states(resource_manager, resources)
+                    found, state_dict = self._take_prefetched_state(self.uuid)
+                    self._on_state_read(state_dict)
+                    self.resolve_dependent_values()
+
+                    if not self._skip_memoized(resource_manager, state_dict, check_drift):
+                        if check_drift and not dry:
+                            with trace_span("prefetch_descriptions"):
+                                self._prefetch_descriptions(resources, resource_manager, provider)
+                        graph = self.dependency_graph()
+                        if max_workers and max_workers > 1:
+                            DagExecutor(max_workers, logger=self.logger).run_graph(
+                                graph, lambda res: res.apply(resource_manager, provider, dry, check_drift, apply_uuid)
+                            )
+                        else:
+                            # dependencies come first, so no apply recurses into another
+                            for res in graph.topological_order():
+                                res.apply(resource_manager, provider, dry, check_drift, apply_uuid)
+
+                        self._resolve_output_values()
+                        resource_manager.set_state(self.uuid, self._create_plan_state_dict(apply_uuid, dry))
+
+                    if apply_uuid:
+                        with trace_span("clean_to_destroy"):
+                            self._clean_to_destroy(resource_manager, provider, dry, apply_uuid, max_workers)
+
+                    self._applied = True
+                finally:
+                    self._clear_prefetched_states()
 
-        for path, value in self.__res.items():
-            if isinstance(value, BaseResource):
-                value.apply(resource_manager, provider, dry, check_drift, apply_uuid)
+        if first_apply:
+            self.logger.info(f"Apply Finished plan:'{self.full_name}' output:{self.output} apply_uuid:{apply_uuid}")
 
-        self._resolve_output_values()
+    def _create_plan_state_dict(self, apply_uuid, dry):
         state_dict = self._create_state_dict(self._output, self._input, apply_uuid=apply_uuid)
-        resource_manager.set_state(self.uuid, state_dict)
+        memo = None if dry else self.__create_memo()
+        if memo:
+            state_dict['memo'] = memo
+        return state_dict
+
+    def __create_memo(self):
+        resources = [res for path, res in self.__res.items() if isinstance(res, BaseResource)]
+        # inputs fed by resources outside the plan can change without the plan's input changing
+        if any(dep is not self and dep not in resources for res in resources for dep in res.dependencies):
+            return None
+        children = {str(res.uuid): res.input_hash(res._input) for res in resources}
+        if None in children.values() or self.input_hash(self._input) is None:
+            return None
+        return {'key': self.__memo_key(children), 'children': children}
+
+    def __memo_key(self, children: dict) -> str:
+        # editing a resource class invalidates the memo just like editing the plan
+        code_versions = sorted({class_code_version(res.__class__) for path, res in self.__res.items()
+                                if isinstance(res, BaseResource)})
+        return stable_hash(self.input_hash(self._input), class_code_version(self.__class__), code_versions, children)
+
+    def __memo_children_match(self, resource_manager: ResourceManager, memo, check_drift, subtree: dict) -> bool:
+        children = [res for path, res in self.__res.items() if isinstance(res, BaseResource)]
+        if set(memo['children']) != {str(res.uuid) for res in children}:
+            return False
+        for res in children:
+            state_dict = self._peek_state(resource_manager, res.uuid)
+            if not state_dict or state_dict.get('input_hash') != memo['children'][str(res.uuid)] or \
+                    (check_drift and not res._is_drift_clean(state_dict)):
+                return False
+            subtree[res] = state_dict
+        return self.__memo_inputs_match(memo, subtree)
+
+    def __memo_inputs_match(self, memo, subtree: dict) -> bool:
+        # the stored hashes only say the last apply is complete, the inputs the plan builds now must match too
+        referenced = {dep for res in subtree for dep in res.dependencies if dep is not self}
+        for res in referenced:
+            res._output = from_dict(res.output_class, subtree[res]['output'])
+        for res in subtree:
+            try:
+                input_hash = res._peeked_input_hash()
+            except Exception as e:
+                self.logger.debug(f"memo of {self.full_name} not used, input of {res.full_name} unknown: {e}")
+                return False
+            if input_hash != memo['children'][str(res.uuid)]:
+                return False
+        return True
 
-        if apply_uuid:
-            self._clean_to_destroy(resource_manager, provider, dry, apply_uuid)
+    def _skip_memoized(self, resource_manager: ResourceManager, state_dict: dict | None, check_drift) -> bool:
+        # the subtree is skipped when the plan's input and code and every child state match the last apply
+        memo = state_dict.get('memo') if state_dict else None
+        subtree = {}
+        if not memo or memo['key'] != self.__memo_key(memo['children']) or \
+                not self.__memo_children_match(resource_manager, memo, check_drift, subtree):
+            return False
+
+        for res, res_state in subtree.items():
+            res._applied = True
+            # outputs read inside the subtree were decoded while matching inputs, the rest only when read outside
+            if not any(sup in subtree for sup in res._supports) and \
+                    any(sup is not self and sup not in subtree for sup in res._supports):
+                res._output = from_dict(res.output_class, res_state['output'])
+        self._output = from_dict(self.output_class, state_dict['output'])
+        self.logger.info(f"Apply {self.full_name} skipped, plan and {len(subtree)} resource(s) unchanged")
+        return True
 
-        self._applied = True
-        if first_apply:
-            self.logger.info(f"Apply Finished plan:'{self.full_name}' output:{self.output} apply_uuid:{apply_uuid}")
+    def _prefetch_descriptions(self, resources, resource_manager: ResourceManager, provider):
+        drift_cache = self.drift_cache
+        by_class = {}
+        for res in resources:
+            if isinstance(res, SimplifiedResource) and res.can_describe():
+                state_dict = self._peek_state(resource_manager, res.uuid)
+                if state_dict and drift_cache is not None and \
+                        drift_cache.is_clean(drift_key(res.uuid, state_dict['input'], state_dict['output'])):
+                    continue
+                if state_dict:
+                    output = from_dict(res.output_class, state_dict['output'])
+                    by_class.setdefault(res.__class__, []).append((res, output))
+
+        for cls, group in by_class.items():
+            batch_size = cls.describe_batch_size or len(group)
+            for start in range(0, len(group), batch_size):
+                batch = group[start:start + batch_size]
+                try:
+                    descriptions = cls.describe(provider, [output for res, output in batch])
+                except Exception as e:
+                    # resources left without a description describe themselves during apply
+                    self.logger.warning(f"batch describe of {class_full_name(cls)} failed: {e!r}")
+                    continue
+                for (res, output), description in zip(batch, descriptions):
+                    res.set_description(description)
 
     @log_func()
-    def destroy(self, resource_manager: ResourceManager, provider, dry=False, apply_uuid=None):
+    def destroy(self, resource_manager: ResourceManager, provider, dry=False, apply_uuid=None, max_workers=None):
         if self._applied:
             return
 
@@ -661,18 +1280,32 @@ class BasePlan(BaseBaseResource[InputT, OutputT]):
             apply_uuid = uuid.uuid4()
             self.logger.info(f"New Destroy apply_uuid:{apply_uuid}")
 
-        self.reset_apply_state()
-        for path, res in self.__res.items():
-            res.destroy(resource_manager, provider, dry, apply_uuid=apply_uuid)
-        resource_manager.delete_state(self.uuid)
-        self._applied = True
+        with trace_span("plan_destroy", plan=self.class_full_name):
+            self.reset_apply_state()
+            with state_transaction(resource_manager, apply_uuid, self.logger, active=first_apply):
+                try:
+                    resources = [res for path, res in self.__res.items()]
+                    self._prefetch_states(resource_manager, resources)
+                    graph = self.destroy_graph()
+                    if max_workers and max_workers > 1:
+                        DagExecutor(max_workers, fail_fast=False, logger=self.logger).run_graph(
+                            graph, lambda res: res.destroy(resource_manager, provider, dry, apply_uuid=apply_uuid)
+                        )
+                    else:
+                        for res in graph.topological_order():
+                            res.destroy(resource_manager, provider, dry, apply_uuid=apply_uuid)
+                    resource_manager.delete_state(self.uuid)
+                    self._applied = True
+                finally:
+                    self._clear_prefetched_states()
         if first_apply:
             self.logger.info(f"Destroy Finished apply_uuid:{apply_uuid}")
 
     @log_func()
-    def _clean_to_destroy(self, resource_manager: ResourceManager, provider, dry, apply_uuid):
+    def _clean_to_destroy(self, resource_manager: ResourceManager, provider, dry, apply_uuid, max_workers=None):
         to_destroy = resource_manager.get_to_destroy()
-        for state in reversed(to_destroy):
+
+        def destroy_state(state):
             cls = load_class_from_str(state['class'])
             self.logger.info(f"Destroying class:{cls} uuid:{state['uuid']}")
             res = cls(state['input'])
@@ -680,35 +1313,191 @@ class BasePlan(BaseBaseResource[InputT, OutputT]):
             res.destroy(resource_manager, provider, dry, from_deleted=True, apply_uuid=apply_uuid)
             self.logger.info(f"Destroying class:{cls} uuid:{state['uuid']} - Done")
 
+        # states written before 'depends' was recorded can only be destroyed in reverse order
+        if max_workers and max_workers > 1 and all('depends' in state for state in to_destroy):
+            destroy_before = _to_destroy_dependencies(to_destroy)
+            DagExecutor(max_workers, fail_fast=False, logger=self.logger).run(
+                range(len(to_destroy)),
+                lambda i: destroy_before[i],
+                lambda i: destroy_state(to_destroy[i])
+            )
+        else:
+            for state in reversed(to_destroy):
+                destroy_state(state)
+
+
+def _to_destroy_dependencies(to_destroy: List[Dict[str, Any]]) -> List[List[int]]:
+    by_uuid = {}
+    for i, state in enumerate(to_destroy):
+        by_uuid.setdefault(state['uuid'], []).append(i)
+
+    destroy_before = [[] for _ in to_destroy]
+    for i, state in enumerate(to_destroy):
+        # whatever depended on this state goes first
+        for dep_uuid in state['depends']:
+            for j in by_uuid.get(dep_uuid, []):
+                destroy_before[j].append(i)
+        # older generations of the same resource are destroyed after the newer ones
+        for j in by_uuid[state['uuid']]:
+            if j > i:
+                destroy_before[i].append(j)
+    return destroy_before
+
+
+_NOT_DESCRIBED = object()
+
 
 class SimplifiedResource(BaseResource[InputT, OutputT]):
+    describe_batch_size = 100
+    wait_backoff = Backoff()
+    wait_timeout = 30
+    _description = _NOT_DESCRIBED
+    _drift_key = None
+    _drift_checked_at = None
 
     @property
     def create_before_destroy(self):
         return True
 
+    @classmethod
+    def can_update(cls):
+        return cls.update is not SimplifiedResource.update
+
+    def plan_change(self, env_inputs: InputT) -> str:
+        # update() decides for real during apply, a resource without one is always replaced
+        return UPDATE if self.can_update() else REPLACE
+
+    def wait_until_ready(self, provider, name, key, describe_many, is_ready, timeout=None):
+        # concurrent waits of the same kind share one poll loop and one describe call per poll
+        waiter = shared_batch_waiter(provider, f"{self.class_full_name}.{name}", describe_many, is_ready,
+                                     self.wait_backoff)
+        with trace_span("wait", self, waiter=name):
+            return waiter.wait(key, timeout if timeout is not None else self.wait_timeout)
+
+    @classmethod
+    def describe(cls, provider, outputs: List[OutputT]) -> List[Any]:
+        # no description to batch or cache, subclasses that can describe override it
+        return [None] * len(outputs)
+
+    @classmethod
+    def can_describe(cls):
+        return cls.describe.__func__ is not SimplifiedResource.describe.__func__
+
+    def set_description(self, description):
+        self._description = description
+
+    def get_description(self, provider):
+        description = self._description
+        if description is _NOT_DESCRIBED:
+            if not self.can_describe():
+                return None
+            return self._describe_single(provider)
+        self._description = _NOT_DESCRIBED
+        return description
+
+    def _describe_single(self, provider):
+        return self.describe(provider, [self._output])[0]
+
     @log_func()
     def do_apply(self, env_inputs: InputT, resource_manager, provider, dry, check_drift, apply_uuid):
+        try:
+            self._do_apply(env_inputs, resource_manager, provider, dry, check_drift, apply_uuid)
+        finally:
+            self._description = _NOT_DESCRIBED
+
+    def _do_apply(self, env_inputs: InputT, resource_manager, provider, dry, check_drift, apply_uuid):
         if env_inputs is None:
-            ret = self.create(provider, apply_uuid, dry)
+            ret = self._traced_create(provider, apply_uuid, dry)
             if ret is False:
-                self.do_destroy(self.input, resource_manager, provider, apply_uuid, dry)
-                self.create(provider, apply_uuid, dry)
+                self._traced_do_destroy(self.input, resource_manager, provider, apply_uuid, dry)
+                self._traced_create(provider, apply_uuid, dry)
             return
-        if env_inputs != self.input or (check_drift and self.is_drifted(provider, dry)):
-            if not self.update(env_inputs, resource_manager, provider, apply_uuid, dry):
+        if env_inputs != self.input or (check_drift and self._check_drifted(provider, dry)):
+            with trace_span("update", self):
+                updated = self.update(env_inputs, resource_manager, provider, apply_uuid, dry)
+            if not updated:
                 if self.create_before_destroy:
                     self.mark_destroy(resource_manager, env_inputs, apply_uuid)
                 else:
-                    self.do_destroy(env_inputs, resource_manager, provider, apply_uuid, dry)
-                ret = self.create(provider, apply_uuid, dry)
+                    self._traced_do_destroy(env_inputs, resource_manager, provider, apply_uuid, dry)
+                ret = self._traced_create(provider, apply_uuid, dry)
                 if ret is False:
-                    self.do_destroy(self.input, resource_manager, provider, apply_uuid, dry)
-                    self.create(provider, apply_uuid, dry)
+                    self._traced_do_destroy(self.input, resource_manager, provider, apply_uuid, dry)
+                    self._traced_create(provider, apply_uuid, dry)
 
         else:
             self.logger.info("nothing to do")
 
+    def _check_drifted(self, provider, dry):
+        if self._drift_cached_clean():
+            return False
+        with trace_span("is_drifted", self):
+            drifted = self.is_drifted(provider, dry)
+        self._record_drift_result(drifted, dry)
+        return drifted
+
+    def _traced_create(self, provider, apply_uuid, dry):
+        with trace_span("create", self):
+            return self.create(provider, apply_uuid, dry)
+
+    def _traced_do_destroy(self, env_inputs: InputT, resource_manager, provider, apply_uuid, dry):
+        with trace_span("do_destroy", self):
+            return self.do_destroy(env_inputs, resource_manager, provider, apply_uuid, dry)
+
+    def _drift_cached_clean(self):
+        drift_cache = self.drift_cache
+        if drift_cache is None or self._drift_key is None:
+            return False
+        if drift_cache.is_clean(self._drift_key):
+            self.logger.info("drift check skipped, cached as clean")
+            self._drift_checked_at = drift_cache.checked_at(self._drift_key)
+            return True
+        return False
+
+    def _record_drift_result(self, drifted, dry):
+        drift_cache = self.drift_cache
+        if drift_cache is None or self._drift_key is None:
+            return
+        if drifted or dry:
+            drift_cache.invalidate(self._drift_key)
+        else:
+            drift_cache.mark_clean(self._drift_key)
+            self._drift_checked_at = drift_cache.checked_at(self._drift_key)
+
+    def can_skip_apply(self, state_dict: dict | None, check_drift) -> bool:
+        if not super().can_skip_apply(state_dict, False):
+            return False
+        if not check_drift:
+            return True
+        drift_cache = self.drift_cache
+        return drift_cache is not None and self._drift_key is not None and drift_cache.is_clean(self._drift_key)
+
+    def _is_drift_clean(self, state_dict: dict) -> bool:
+        self._on_state_read(state_dict)
+        drift_cache = self.drift_cache
+        return drift_cache is not None and self._drift_key is not None and drift_cache.is_clean(self._drift_key)
+
+    def _on_state_read(self, state_dict: dict | None):
+        self._drift_key = None
+        self._drift_checked_at = None
+        drift_cache = self.drift_cache
+        if not state_dict or drift_cache is None:
+            return
+
+        self._drift_key = drift_key(self.uuid, state_dict['input'], state_dict['output'])
+        drift_checked = state_dict.get('drift_checked')
+        if drift_checked and drift_checked['key'] == self._drift_key:
+            # results persisted by an earlier run are still subject to the cache ttl
+            drift_cache.mark_clean(self._drift_key, drift_checked['at'])
+
+    def _create_state_dict(self, output, input, apply_uuid):
+        state_dict = super()._create_state_dict(output, input, apply_uuid)
+        if self._drift_checked_at is not None:
+            key = drift_key(self.uuid, state_dict['input'], state_dict['output'])
+            if key == self._drift_key:
+                state_dict['drift_checked'] = {'key': key, 'at': self._drift_checked_at}
+        return state_dict
+
     @log_func()
     def update(self, env_inputs: InputT, resource_manager, provider, apply_uuid, dry):
         return False
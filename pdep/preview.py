@@ -0,0 +1,52 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+CREATE = "create"
+UPDATE = "update"
+REPLACE = "replace"
+DESTROY = "destroy"
+NO_OP = "no-op"
+
+ACTIONS = (CREATE, UPDATE, REPLACE, DESTROY, NO_OP)
+
+_SYMBOLS = {CREATE: "+", UPDATE: "~", REPLACE: "-/+", DESTROY: "-", NO_OP: "="}
+
+
+@dataclass
+class PlannedChange:
+    path: str
+    resource_class: str
+    uuid: str
+    action: str
+    reason: str | None = None
+
+
+@dataclass
+class PlanPreview:
+    plan: str
+    changes: List[PlannedChange] = field(default_factory=list)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = Counter(change.action for change in self.changes)
+        return {action: counts[action] for action in ACTIONS}
+
+    @property
+    def has_changes(self) -> bool:
+        return any(change.action != NO_OP for change in self.changes)
+
+    def by_action(self, action: str) -> List[PlannedChange]:
+        return [change for change in self.changes if change.action == action]
+
+    def summary(self, show_no_op=False) -> str:
+        lines = [f"plan {self.plan}"]
+        for change in self.changes:
+            if change.action == NO_OP and not show_no_op:
+                continue
+            reason = f" ({change.reason})" if change.reason else ""
+            lines.append(f"  {_SYMBOLS[change.action]:>3s} {change.path} {change.resource_class}{reason}")
+        counts = self.counts
+        lines.append(f"{counts[CREATE]} to create, {counts[UPDATE]} to update, {counts[REPLACE]} to replace, "
+                     f"{counts[DESTROY]} to destroy, {counts[NO_OP]} unchanged")
+        return "\n".join(lines)
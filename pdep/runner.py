@@ -0,0 +1,154 @@
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from pdep.plan import BasePlan, ResourceManager, FileResourceManager, AwsLocalStackProvider
+from pdep.serde import to_dict
+
+
+@dataclass
+class Environment:
+    name: str
+    folder: str
+    input: Any = None
+
+    @classmethod
+    def from_folder(cls, folder: str):
+        return cls(name=folder.strip('/').replace('/', '_') or 'root', folder=folder)
+
+
+@dataclass
+class EnvironmentResult:
+    name: str
+    folder: str
+    ok: bool
+    duration: float
+    pid: int
+    output: Dict[str, Any] | None = None
+    error: str | None = None
+
+
+@dataclass
+class FanOutReport:
+    action: str
+    duration: float
+    results: List[EnvironmentResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> List[EnvironmentResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[EnvironmentResult]:
+        return [result for result in self.results if not result.ok]
+
+    def summary(self) -> str:
+        lines = [f"{self.action} of {len(self.results)} environment(s) took {self.duration:.2f}s, "
+                 f"{len(self.succeeded)} ok, {len(self.failed)} failed"]
+        for result in sorted(self.results, key=lambda result: result.duration, reverse=True):
+            status = "ok" if result.ok else f"FAILED {result.error.splitlines()[-1] if result.error else ''}"
+            lines.append(f"  {result.name:30s} {result.folder:30s} {result.duration:8.2f}s pid:{result.pid} {status}")
+        return "\n".join(lines)
+
+
+class FileResourceManagerFactory:
+
+    def __init__(self, path_template="state_{name}.json", cached=True):
+        self.__path_template = path_template
+        self.__cached = cached
+
+    def __call__(self, env: Environment) -> ResourceManager:
+        return FileResourceManager(self.__path_template.format(name=env.name), cached=self.__cached)
+
+
+def default_provider_factory(env: Environment):
+    return AwsLocalStackProvider()
+
+
+def _run_environment(plan_factory, rm_factory, provider_factory, env: Environment, action, kwargs):
+    start_t = time.time()
+    try:
+        resource_manager = rm_factory(env)
+        resource_manager.folder = env.folder
+        provider = provider_factory(env)
+        plan: BasePlan = plan_factory(resource_manager, env)
+        if action == "apply":
+            plan.apply(resource_manager, provider, **kwargs)
+            output = to_dict(plan.output) if plan.output is not None else None
+        else:
+            plan.destroy(resource_manager, provider, **kwargs)
+            output = None
+        return EnvironmentResult(env.name, env.folder, True, time.time() - start_t, os.getpid(), output=output)
+    except Exception:
+        return EnvironmentResult(env.name, env.folder, False, time.time() - start_t, os.getpid(),
+                                 error=traceback.format_exc())
+
+
+class FanOutRunner:
+
+    def __init__(self, plan_factory: Callable[[ResourceManager, Environment], BasePlan],
+                 rm_factory: Callable[[Environment], ResourceManager] = None,
+                 provider_factory: Callable[[Environment], Any] = None,
+                 max_processes=None, mp_context=None, logger=None):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__plan_factory = plan_factory
+        self.__rm_factory = rm_factory or FileResourceManagerFactory()
+        self.__provider_factory = provider_factory or default_provider_factory
+        self.__max_processes = max_processes or os.cpu_count()
+        self.__mp_context = mp_context
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def max_processes(self):
+        return self.__max_processes
+
+    def apply(self, environments: List[Environment | str], **kwargs) -> FanOutReport:
+        return self.__run("apply", environments, kwargs)
+
+    def destroy(self, environments: List[Environment | str], **kwargs) -> FanOutReport:
+        return self.__run("destroy", environments, kwargs)
+
+    def __run(self, action, environments, kwargs) -> FanOutReport:
+        environments = [Environment.from_folder(env) if isinstance(env, str) else env for env in environments]
+        names = [env.name for env in environments]
+        if len(set(names)) != len(names):
+            raise Exception(f"environment names must be unique: {names}")
+
+        self.logger.info(f"{action} of {len(environments)} environment(s) with {self.__max_processes} process(es)")
+        start_t = time.time()
+        report = FanOutReport(action, 0.0)
+        args = (self.__plan_factory, self.__rm_factory, self.__provider_factory)
+        if self.__max_processes == 1:
+            for env in environments:
+                report.results.append(self.__log_result(_run_environment(*args, env, action, kwargs)))
+        else:
+            # workers are reused across environments, so imports and startup are paid once per process
+            with ProcessPoolExecutor(max_workers=min(self.__max_processes, len(environments) or 1),
+                                     mp_context=self.__mp_context) as pool:
+                futures = [pool.submit(_run_environment, *args, env, action, kwargs) for env in environments]
+                for future in as_completed(futures):
+                    report.results.append(self.__log_result(future.result()))
+            order = {name: i for i, name in enumerate(names)}
+            report.results.sort(key=lambda result: order[result.name])
+
+        report.duration = time.time() - start_t
+        self.logger.info(report.summary())
+        return report
+
+    def __log_result(self, result: EnvironmentResult) -> EnvironmentResult:
+        if result.ok:
+            self.logger.info(f"{result.name} ({result.folder}) done in {result.duration:.2f}s")
+        else:
+            self.logger.error(f"{result.name} ({result.folder}) failed in {result.duration:.2f}s\n{result.error}")
+        return result
@@ -0,0 +1,218 @@
+import copy
+import dataclasses
+import types
+import typing
+import warnings
+from collections.abc import Mapping, Collection
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Type, TypeVar, get_type_hints
+from uuid import UUID
+
+from dataclasses_json import cfg
+
+# Specialized replacements for dataclasses_json's to_dict()/from_dict(). dataclasses_json walks fields(),
+# get_type_hints() and the override config on every call; here that is done once per class and the result is
+# a closure over plain tuples. Only public dataclasses_json API is used: any class with overrides (letter case,
+# encoders, undefined parameter handling, global config) or a field type not handled below goes through the
+# class's own to_dict()/from_dict() so the output stays identical.
+
+T = TypeVar('T')
+
+_PLAIN = frozenset((str, int, float, bool, type(None)))
+
+_encoders: Dict[type, Callable[[Any], dict]] = {}
+_decoders: Dict[type, Callable[[Any], Any]] = {}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _has_global_config():
+    return bool(cfg.global_config.encoders or cfg.global_config.decoders or cfg.global_config.mm_fields)
+
+
+def _is_plain_dataclass(cls) -> bool:
+    config = getattr(cls, "dataclass_json_config", None) or {}
+    if any(value is not None for value in config.values()):
+        return False
+    for field in dataclasses.fields(cls):
+        if any(value is not None for value in field.metadata.get("dataclasses_json", {}).values()):
+            return False
+    return True
+
+
+def _encode_value(value):
+    if value.__class__ in _PLAIN:
+        return value
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _encoder(value.__class__)(value)
+    if isinstance(value, Mapping):
+        return {_encode_value(k): _encode_value(v) for k, v in value.items()}
+    if isinstance(value, Collection) and not isinstance(value, (str, bytes, Enum)):
+        return [_encode_value(v) for v in value]
+    return copy.deepcopy(value)
+
+
+def _compile_encoder(cls) -> Callable[[Any], dict]:
+    if not _is_plain_dataclass(cls):
+        return lambda obj: obj.to_dict()
+
+    names = tuple(field.name for field in dataclasses.fields(cls))
+
+    def encode(obj):
+        result = {}
+        for name in names:
+            value = getattr(obj, name)
+            result[name] = value if value.__class__ in _PLAIN else _encode_value(value)
+        return result
+
+    return encode
+
+
+def _encoder(cls) -> Callable[[Any], dict]:
+    encoder = _encoders.get(cls)
+    if encoder is None:
+        encoder = _encoders[cls] = _compile_encoder(cls)
+    return encoder
+
+
+def _identity(value):
+    return value
+
+
+def _is_new_type(type_):
+    return callable(type_) and hasattr(type_, "__supertype__")
+
+
+def _is_union(type_):
+    return typing.get_origin(type_) in (typing.Union, types.UnionType)
+
+
+def _dataclass_decoder(type_) -> Callable[[Any], Any]:
+    # looked up at call time so self referencing dataclasses compile
+    return lambda value: value if dataclasses.is_dataclass(value) else _decoder(type_)(value)
+
+
+def _extended_decoder(type_) -> Callable[[Any], Any]:
+    if isinstance(type_, type) and issubclass(type_, datetime):
+        def decode(value):
+            if isinstance(value, datetime):
+                return value
+            return datetime.fromtimestamp(value, tz=datetime.now(timezone.utc).astimezone().tzinfo)
+        return decode
+    if isinstance(type_, type) and issubclass(type_, (Decimal, UUID)):
+        return lambda value: value if isinstance(value, type_) else type_(value)
+    if type_ in _PLAIN or type_ is Any or isinstance(type_, TypeVar):
+        return _identity
+    raise _Unsupported(type_)
+
+
+def _type_decoder(type_) -> Callable[[Any], Any]:
+    # the shapes state classes actually use, anything else makes the whole class fall back
+    while _is_new_type(type_):
+        type_ = type_.__supertype__
+    if dataclasses.is_dataclass(type_):
+        return _dataclass_decoder(type_)
+    if isinstance(type_, type) and issubclass(type_, Enum):
+        return type_
+    origin, args = typing.get_origin(type_), typing.get_args(type_)
+    if _is_union(type_):
+        options = [arg for arg in args if arg is not type(None)]
+        if len(args) == 2 and len(options) == 1:
+            decode_arg = _type_decoder(options[0])
+            return lambda value: None if value is None else decode_arg(value)
+        if any(dataclasses.is_dataclass(option) for option in options):
+            # dataclasses_json versions disagree on these
+            raise _Unsupported(type_)
+        return _identity
+    if origin is list and len(args) == 1:
+        decode_item = _type_decoder(args[0])
+        return lambda value: None if value is None else [decode_item(v) for v in value]
+    if origin is dict and len(args) == 2:
+        key_type, value_type = args
+        if key_type is str:
+            decode_key = str
+        elif key_type is Any:
+            decode_key = _identity
+        else:
+            raise _Unsupported(type_)
+        decode_item = _type_decoder(value_type)
+        return lambda value: None if value is None else {decode_key(k): decode_item(v) for k, v in value.items()}
+    if origin is not None:
+        raise _Unsupported(type_)
+    return _extended_decoder(type_)
+
+
+def _is_optional(type_):
+    return type_ is Any or (_is_union(type_) and type(None) in typing.get_args(type_))
+
+
+def _compile_decoder(cls) -> Callable[[Any], Any]:
+    if not _is_plain_dataclass(cls):
+        raise _Unsupported(cls)
+
+    hints = get_type_hints(cls)
+    steps = []
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+        field_type = hints[field.name]
+        steps.append((field.name, field.default, field.default_factory, _is_optional(field_type),
+                      _type_decoder(field_type)))
+    steps = tuple(steps)
+    missing = dataclasses.MISSING
+
+    def decode(kvs):
+        if isinstance(kvs, cls):
+            return kvs
+        init_kwargs = {}
+        for name, default, default_factory, optional, decode_field in steps:
+            if name in kvs:
+                value = kvs[name]
+            elif default is not missing:
+                value = default
+            elif default_factory is not missing:
+                value = default_factory()
+            else:
+                raise KeyError(name)
+            if value is None:
+                if not optional:
+                    warnings.warn(f"`NoneType` object value of non-optional type {name} detected "
+                                  f"when decoding {cls.__name__}.", RuntimeWarning)
+                init_kwargs[name] = None
+            else:
+                init_kwargs[name] = decode_field(value)
+        return cls(**init_kwargs)
+
+    return decode
+
+
+def _decoder(cls) -> Callable[[Any], Any]:
+    decoder = _decoders.get(cls)
+    if decoder is None:
+        try:
+            decoder = _compile_decoder(cls)
+        except _Unsupported:
+            decoder = cls.from_dict
+        _decoders[cls] = decoder
+    return decoder
+
+
+def to_dict(obj) -> dict:
+    if _has_global_config():
+        return obj.to_dict()
+    return _encoder(obj.__class__)(obj)
+
+
+def from_dict(cls: Type[T], kvs: dict) -> T:
+    if _has_global_config():
+        return cls.from_dict(kvs)
+    return _decoder(cls)(kvs)
+
+
+def clear_cache():
+    _encoders.clear()
+    _decoders.clear()
@@ -0,0 +1,183 @@
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Type
+from uuid import UUID
+
+from pdep.codecs import StateCodec, get_codec, decode_state, encode_column
+from pdep.inter import implements
+from pdep.plan import ResourceManager, TransactionalResourceManager, OutputTypeNotFound, state_file_path
+from pdep.serde import from_dict
+from pdep.utils import log_func, class_full_name
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    uuid TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    output_type TEXT,
+    plan_uuid TEXT,
+    apply_uuid TEXT,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS states_folder ON states (folder);
+CREATE INDEX IF NOT EXISTS states_output_type_folder ON states (output_type, folder);
+CREATE INDEX IF NOT EXISTS states_plan_uuid ON states (plan_uuid);
+CREATE INDEX IF NOT EXISTS states_apply_uuid ON states (apply_uuid);
+
+CREATE TABLE IF NOT EXISTS to_destroy (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT NOT NULL,
+    folder TEXT,
+    output_type TEXT,
+    plan_uuid TEXT,
+    apply_uuid TEXT,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS to_destroy_uuid ON to_destroy (uuid);
+CREATE INDEX IF NOT EXISTS to_destroy_plan_uuid ON to_destroy (plan_uuid);
+CREATE INDEX IF NOT EXISTS to_destroy_apply_uuid ON to_destroy (apply_uuid);
+"""
+
+
+@implements(ResourceManager)
+class SqliteResourceManager(TransactionalResourceManager):
+
+    def __init__(self, path: str | Path, logger=None, codec: str | StateCodec = "json-compact", checkpoint_every=100):
+        self.__logger = logger if logger else logging.getLogger(self.full_name)
+        self.__codec = get_codec(codec)
+        self.__path = path if path == ":memory:" else state_file_path(path)
+        self.__folder = "/"
+        self.__uncommitted = 0
+        self.__lock = threading.RLock()
+        super().__init__(self.__lock, checkpoint_every)
+
+        self.__conn = sqlite3.connect(str(self.__path), check_same_thread=False)
+        if self.__path != ":memory:":
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+        with self.__conn:
+            self.__conn.executescript(_SCHEMA)
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @property
+    def full_name(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({id(self)})"
+
+    @property
+    def folder(self) -> str:
+        return self.__folder
+
+    @folder.setter
+    def folder(self, folder):
+        self.__folder = folder
+
+    @property
+    def codec(self) -> StateCodec:
+        return self.__codec
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+    def __query_one(self, sql, params):
+        with self.__lock:
+            row = self.__conn.execute(sql, params).fetchone()
+        return decode_state(row[0]) if row else None
+
+    def __execute(self, sql, params):
+        with self.__lock:
+            if not self.in_transaction:
+                with self.__conn:
+                    self.__conn.execute(sql, params)
+                return
+            # inside a transaction statements pile up in sqlite's own, reads on this connection see them
+            self.__conn.execute(sql, params)
+            self.__uncommitted += 1
+            if self._checkpoint_due(self.__uncommitted):
+                self.__conn.commit()
+                self.__uncommitted = 0
+
+    @log_func()
+    def get_state(self, uuid: UUID | str, from_delete=False) -> dict | None:
+        if from_delete:
+            return self.__query_one("SELECT state FROM to_destroy WHERE uuid = ? ORDER BY seq DESC LIMIT 1",
+                                    (str(uuid),))
+        return self.__query_one("SELECT state FROM states WHERE uuid = ?", (str(uuid),))
+
+    @log_func()
+    def get_states(self, uuids: List[UUID | str]) -> Dict[str, dict | None]:
+        uuids = [str(uuid) for uuid in uuids]
+        states = dict.fromkeys(uuids)
+        # stays under sqlite's bound parameter limit
+        for start in range(0, len(uuids), 500):
+            chunk = uuids[start:start + 500]
+            with self.__lock:
+                rows = self.__conn.execute(
+                    f"SELECT uuid, state FROM states WHERE uuid IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            for uuid, state in rows:
+                states[uuid] = decode_state(state)
+        return states
+
+    def set_state(self, uuid: UUID | str, state: dict) -> None:
+        state['folder'] = self.__folder
+        # upsert keeps the rowid, so get_output keeps returning the first written match
+        self.__execute(
+            "INSERT INTO states (uuid, folder, output_type, plan_uuid, apply_uuid, state) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (uuid) DO UPDATE SET folder = excluded.folder, output_type = excluded.output_type, "
+            "plan_uuid = excluded.plan_uuid, apply_uuid = excluded.apply_uuid, state = excluded.state",
+            (str(uuid), state['folder'], state.get('output_type'), state.get('plan_uuid'),
+             state.get('apply_uuid'), encode_column(self.__codec, state))
+        )
+
+    def mark_destroy(self, uuid: UUID | str, state: dict) -> None:
+        self.__execute(
+            "INSERT INTO to_destroy (uuid, folder, output_type, plan_uuid, apply_uuid, state) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(uuid), state.get('folder'), state.get('output_type'), state.get('plan_uuid'),
+             state.get('apply_uuid'), encode_column(self.__codec, state))
+        )
+
+    def delete_state(self, uuid: UUID | str, from_delete=False) -> None:
+        if from_delete:
+            self.__execute("DELETE FROM to_destroy WHERE seq = (SELECT MAX(seq) FROM to_destroy WHERE uuid = ?)",
+                           (str(uuid),))
+        else:
+            self.__execute("DELETE FROM states WHERE uuid = ?", (str(uuid),))
+
+    def get_to_destroy(self) -> List[Dict[str, Any]]:
+        with self.__lock:
+            rows = self.__conn.execute("SELECT state FROM to_destroy ORDER BY seq").fetchall()
+        return [decode_state(row[0]) for row in rows]
+
+    def get_output(self, cls: Type):
+        # a state matches when its folder is a prefix of the current folder
+        prefixes = [self.__folder[:i] for i in range(len(self.__folder) + 1)]
+        state = self.__query_one(
+            f"SELECT state FROM states WHERE output_type = ? AND folder IN ({', '.join('?' * len(prefixes))}) "
+            f"ORDER BY rowid LIMIT 1",
+            (class_full_name(cls), *prefixes)
+        )
+        if state is None:
+            raise OutputTypeNotFound()
+        return from_dict(cls, state['output'])
+
+    @log_func()
+    def flush(self) -> None:
+        with self.__lock:
+            self.__conn.commit()
+            self.__uncommitted = 0
+
+    def _pending_count(self) -> int:
+        return self.__uncommitted
+
+    def _write_transaction(self) -> None:
+        self.flush()
+
+    def _drop_transaction(self) -> None:
+        self.__conn.rollback()
+        self.__uncommitted = 0
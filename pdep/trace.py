@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Any, Tuple
+
+from pdep.graph import DependencyGraph
+
+# phases that are a resource's own work, as opposed to time spent inside its dependencies
+WORK_PHASES = {"read_state", "resolve_dependent_values", "is_drifted", "create", "update", "do_destroy", "wait",
+               "set_state", "delete_state"}
+
+_active_tracer: 'Tracer | None' = None
+_span_stack = contextvars.ContextVar("pdep_span_stack", default=())
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    tid: int
+    resource: str | None = None
+    end: float | None = None
+    calls: Counter = field(default_factory=Counter)
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+
+def _current_tid():
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    # tasks interleave on one thread, give each its own track
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Tracer:
+
+    def __init__(self, clock=time.perf_counter):
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__spans: List[Span] = []
+        self.__resources: Dict[str, Dict[str, Any]] = {}
+        self.__origin = clock()
+        self.__previous = None
+
+    @property
+    def spans(self) -> List[Span]:
+        with self.__lock:
+            return list(self.__spans)
+
+    @property
+    def resources(self) -> Dict[str, Dict[str, Any]]:
+        return self.__resources
+
+    def __enter__(self):
+        global _active_tracer
+        self.__previous = _active_tracer
+        _active_tracer = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active_tracer
+        _active_tracer = self.__previous
+
+    def note_resource(self, res):
+        key = str(res.uuid)
+        with self.__lock:
+            if key not in self.__resources:
+                self.__resources[key] = {
+                    "name": f"{res.class_full_name}:{res.path}",
+                    "depends": [str(dep.uuid) for dep in res.dependencies],
+                }
+        return key
+
+    @contextmanager
+    def span(self, name, res=None, **args):
+        span = Span(name, self.__clock(), _current_tid(), self.note_resource(res) if res is not None else None,
+                    args=args)
+        token = _span_stack.set(_span_stack.get() + (span,))
+        try:
+            yield span
+        finally:
+            span.end = self.__clock()
+            _span_stack.reset(token)
+            with self.__lock:
+                self.__spans.append(span)
+
+    def count_call(self, service, operation):
+        stack = _span_stack.get()
+        if stack:
+            stack[-1].calls[f"{service}.{operation}"] += 1
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.args)
+            if span.resource:
+                args["resource"] = self.__resources[span.resource]["name"]
+            if span.calls:
+                args["calls"] = dict(span.calls)
+            events.append({
+                "name": span.name,
+                "cat": "resource" if span.resource else "plan",
+                "ph": "X",
+                "ts": (span.start - self.__origin) * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": span.tid,
+                "args": args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str | Path):
+        with open(path, "w") as fp:
+            json.dump(self.chrome_trace(), fp)
+
+    def resource_work(self) -> Dict[str, float]:
+        work = Counter()
+        for span in self.spans:
+            if span.resource and span.name in WORK_PHASES:
+                work[span.resource] += span.duration
+        return dict(work)
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        # longest chain of resource work through the dependency DAG
+        work = self.resource_work()
+        resources = self.__resources
+        graph = DependencyGraph(resources, lambda key: resources[key]["depends"])
+        return graph.critical_path(lambda key: work.get(key, 0.0))
+
+    def summary(self, top=10) -> str:
+        spans = self.spans
+        by_name: Dict[str, List[Span]] = {}
+        for span in spans:
+            by_name.setdefault(span.name, []).append(span)
+
+        lines = [f"{'phase':28s} {'count':>7s} {'total s':>10s} {'mean ms':>10s} {'max ms':>10s} {'api calls':>10s}"]
+        for name, group in sorted(by_name.items(), key=lambda item: -sum(span.duration for span in item[1])):
+            durations = [span.duration for span in group]
+            calls = sum(sum(span.calls.values()) for span in group)
+            lines.append(f"{name:28s} {len(group):7d} {sum(durations):10.3f} {sum(durations) / len(group) * 1e3:10.2f} "
+                         f"{max(durations) * 1e3:10.2f} {calls:10d}")
+
+        work = self.resource_work()
+        calls_by_resource = Counter()
+        for span in spans:
+            if span.resource:
+                calls_by_resource[span.resource] += sum(span.calls.values())
+        lines.append("")
+        lines.append(f"top {top} resources by own work")
+        for key, seconds in sorted(work.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {self.__resources[key]['name']:60s} {seconds:10.3f}s {calls_by_resource[key]:6d} calls")
+
+        path, total = self.critical_path()
+        lines.append("")
+        lines.append(f"critical path {total:.3f}s over {len(path)} resource(s)")
+        for key in path:
+            lines.append(f"  {self.__resources[key]['name']:60s} {work.get(key, 0.0):10.3f}s")
+        return "\n".join(lines)
+
+
+def trace_span(name, res=None, **args):
+    tracer = _active_tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, res, **args)
+
+
+def trace_api_call(service, operation):
+    tracer = _active_tracer
+    if tracer is not None:
+        tracer.count_call(service, operation)
+
+
+def botocore_call_hook(model, **kwargs):
+    trace_api_call(model.service_model.service_name, model.name)
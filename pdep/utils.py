@@ -2,10 +2,20 @@ import time
 import copy
 import dataclasses
 import functools
+import hashlib
 import importlib
 import inspect
+import json
 import logging
+import os
+import random
+import threading
+import weakref
+from datetime import date
+from decimal import Decimal
+from enum import Enum
 from pathlib import Path
+from uuid import UUID
 
 
 class DynamicDataContainer:
@@ -105,11 +115,20 @@ class dict_to_class(object):
         return s
 
 
+def short_str(value, limit=200):
+    s = str(value)
+    if len(s) > limit:
+        s = f"{s[:limit]}...<{len(s)} chars>"
+    return s
+
+
 class log_func:
     ABOVE_DEBUG = 15
+    MAX_VALUE_LEN = 200
 
-    def __init__(self, level=15):
+    def __init__(self, level=15, max_value_len=MAX_VALUE_LEN):
         self.__level = level
+        self.__max_value_len = max_value_len
 
     def __log(self, logger, func, msg):
         fn, lno, func_, sinfo = logger.findCaller(stack_info=False, stacklevel=2)
@@ -118,21 +137,46 @@ class log_func:
         logger.handle(record)
 
     def __call__(self, func):
+        spec_args = inspect.getfullargspec(func).args
+        level = self.__level
+        limit = self.__max_value_len
+
+        def check_args(args):
+            if len(spec_args) <= len(args):
+                msg = f"Method:{func.__qualname__} missing positional args, method called with{args}: while spec:{spec_args}"
+                raise Exception(msg)
+
+        def log_call(logger, args, kwargs):
+            skwargs = {key: short_str(value, limit) for key, value in kwargs.items()}
+            for i, arg in enumerate(args):
+                skwargs[spec_args[i + 1]] = short_str(arg, limit)
+            self.__log(logger, func, f"{func.__qualname__}({skwargs})")
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_log_func(his_self, *args, **kwargs):
+                check_args(args)
+                logger = his_self.logger
+                if not logger.isEnabledFor(level):
+                    return await func(his_self, *args, **kwargs)
+
+                log_call(logger, args, kwargs)
+                ret = await func(his_self, *args, **kwargs)
+                self.__log(logger, func, f"{func.__qualname__} -> {short_str(ret, limit)}")
+                return ret
+
+            return async_log_func
 
         @functools.wraps(func)
         def log_func(his_self, *args, **kwargs):
+            check_args(args)
             logger = his_self.logger
-            spec = inspect.getfullargspec(func)
-            skwargs = {key: str(value) for key, value in kwargs.items()}
+            if not logger.isEnabledFor(level):
+                return func(his_self, *args, **kwargs)
 
-            if len(spec.args) <= len(args):
-                msg = f"Method:{func.__qualname__} missing positional args, method called with{args}: while spec:{spec.args}"
-                raise Exception(msg)
-            for i, arg in enumerate(args):
-                skwargs[spec.args[i + 1]] = str(arg)
-            self.__log(logger, func, f"{func.__qualname__}({skwargs})")
+            log_call(logger, args, kwargs)
             ret = func(his_self, *args, **kwargs)
-            self.__log(logger, func, f"{func.__qualname__} -> {str(ret)}")
+            self.__log(logger, func, f"{func.__qualname__} -> {short_str(ret, limit)}")
             return ret
 
         return log_func
@@ -181,6 +225,46 @@ def convert_something_values(something, conv_func):
     return new_something
 
 
+@functools.lru_cache(maxsize=None)
+def dataclass_field_names(cls):
+    return tuple(field.name for field in dataclasses.fields(cls))
+
+
+def find_value_slots(something, predicate):
+    slots = []
+    seen = set()
+    stack = [something]
+    while stack:
+        holder = stack.pop()
+        if id(holder) in seen:
+            continue
+        seen.add(id(holder))
+
+        if type(holder) == list:
+            items = enumerate(holder)
+        elif type(holder) == dict:
+            items = holder.items()
+        elif dataclasses.is_dataclass(holder) and not isinstance(holder, type):
+            items = ((name, getattr(holder, name)) for name in dataclass_field_names(type(holder)))
+        else:
+            continue
+
+        for key, value in items:
+            if predicate(value):
+                slots.append((holder, key))
+            elif type(value) in (list, dict) or dataclasses.is_dataclass(value):
+                stack.append(value)
+    return slots
+
+
+def fill_value_slots(slots, conv_func):
+    for holder, key in slots:
+        if type(holder) in (list, dict):
+            holder[key] = conv_func(holder[key])
+        else:
+            setattr(holder, key, conv_func(getattr(holder, key)))
+
+
 def load_class_from_str(cls_full_name):
     mod_name, cls_name = cls_full_name.rsplit('.', 1)
     mod = importlib.import_module(mod_name)
@@ -235,13 +319,176 @@ def unused(*args):
         del arg
 
 
-def do_with_timeout(predicate, timeout, sleep=5):
+class Backoff:
+
+    def __init__(self, initial=0.1, cap=5.0, factor=2.0, jitter=True):
+        self.__initial = initial
+        self.__cap = cap
+        self.__factor = factor
+        self.__jitter = jitter
+
+    @property
+    def initial(self):
+        return self.__initial
+
+    @property
+    def cap(self):
+        return self.__cap
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(initial={self.__initial}, cap={self.__cap}, factor={self.__factor}, " \
+               f"jitter={self.__jitter})"
+
+    def delays(self):
+        delay = self.__initial
+        while True:
+            # equal jitter: never less than half the nominal delay
+            yield delay / 2 + random.uniform(0, delay / 2) if self.__jitter else delay
+            delay = min(self.__cap, delay * self.__factor)
+
+
+DEFAULT_BACKOFF = Backoff()
+
+
+def do_with_timeout(predicate, timeout, sleep=None, backoff: Backoff = None):
+    delays = (backoff or DEFAULT_BACKOFF).delays()
     start_t = time.time()
     while predicate():
-        if time.time() - start_t > timeout:
+        remaining = timeout - (time.time() - start_t)
+        if remaining < 0:
             raise Exception(f"timeout")
-        time.sleep(sleep)
+        time.sleep(min(sleep if sleep is not None else next(delays), remaining))
+
+
+class _Waiting:
+    def __init__(self):
+        self.done = False
+        self.description = None
+
+
+class BatchWaiter:
+
+    def __init__(self, describe_many, is_ready, backoff: Backoff = None):
+        self.__describe_many = describe_many
+        self.__is_ready = is_ready
+        self.__backoff = backoff or DEFAULT_BACKOFF
+        self.__cond = threading.Condition()
+        self.__pending = {}
+        self.__polling = False
+        self.__last_poll = 0.0
+
+    def wait(self, key, timeout):
+        deadline = time.time() + timeout
+        delays = self.__backoff.delays()
+        with self.__cond:
+            waiting = self.__pending.setdefault(key, _Waiting())
+
+        try:
+            while True:
+                with self.__cond:
+                    while self.__polling and not waiting.done and time.time() < deadline:
+                        self.__cond.wait(deadline - time.time())
+                    if waiting.done:
+                        return waiting.description
+                    if time.time() >= deadline:
+                        raise Exception(f"timeout")
+                    self.__polling = True
+                    delay = self.__last_poll + next(delays) - time.time()
+
+                # a single thread at a time polls for every pending key
+                try:
+                    if delay > 0:
+                        time.sleep(max(0.0, min(delay, deadline - time.time())))
+                    self.__poll()
+                finally:
+                    with self.__cond:
+                        self.__polling = False
+                        self.__last_poll = time.time()
+                        self.__cond.notify_all()
+        finally:
+            with self.__cond:
+                if self.__pending.get(key) is waiting:
+                    del self.__pending[key]
+
+    def __poll(self):
+        with self.__cond:
+            keys = list(self.__pending)
+        descriptions = self.__describe_many(keys)
+        with self.__cond:
+            for key in keys:
+                description = descriptions.get(key)
+                waiting = self.__pending.get(key)
+                if waiting and description is not None and self.__is_ready(description):
+                    waiting.description = description
+                    waiting.done = True
+                    del self.__pending[key]
+            self.__cond.notify_all()
+
+
+_shared_waiters = weakref.WeakKeyDictionary()
+_shared_waiters_lock = threading.Lock()
+
+
+def shared_batch_waiter(owner, name, describe_many, is_ready, backoff: Backoff = None) -> BatchWaiter:
+    with _shared_waiters_lock:
+        waiters = _shared_waiters.setdefault(owner, {})
+        if name not in waiters:
+            owner_ref = weakref.ref(owner)
+            waiters[name] = BatchWaiter(lambda keys: describe_many(owner_ref(), keys), is_ready, backoff)
+        return waiters[name]
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp_path.open('wb') as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _stable_json(value):
+    # sets have no order, they are sorted by the encoding of their items
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=lambda item: json.dumps(item, sort_keys=True, separators=(',', ':'),
+                                                         default=_stable_json))
+    # the values dataclasses_json encodes itself, each has one exact text form
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"can't hash {value.__class__.__name__} value {value!r} stably, "
+                    f"only JSON types, sets, enums, UUIDs, decimals and datetimes are supported")
+
+
+def _lenient_json(value):
+    try:
+        return _stable_json(value)
+    except TypeError:
+        return str(value)
+
+
+def stable_hash(*parts, strict=True) -> str:
+    data = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=_stable_json if strict else _lenient_json)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
 
 def class_full_name(cls):
     return f"{cls.__module__}.{cls.__name__}"
+
+
+@functools.lru_cache(maxsize=None)
+def class_code_version(cls) -> str:
+    try:
+        source = inspect.getsource(cls)
+    except (OSError, TypeError):
+        # classes defined interactively have no source, fall back to their name
+        source = class_full_name(cls)
+    return stable_hash(class_full_name(cls), source)
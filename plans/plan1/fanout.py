@@ -0,0 +1,31 @@
+from uuid import UUID
+from pdep import FileResourceManager
+from pdep.aws.backbones.app.interfaces import SimpleAppBBInput
+from pdep.aws.backbones.app.simpleappbb import SimpleAppBB
+from pdep.aws.backbones.net.interfaces import BasicNetBBOutput
+from pdep.runner import FanOutRunner, Environment
+from pdep.utils import setup_logging, log_func
+
+
+def app_plan(rm, env: Environment):
+    # the network is shared by every environment and lives in the common state
+    net_rm = FileResourceManager("state.json")
+    net_rm.folder = env.folder
+    return SimpleAppBB(
+        SimpleAppBBInput(
+            name=env.name,
+            simple_net_bb=net_rm.get_output(BasicNetBBOutput)
+        ),
+        UUID('a4a8393f-aead-4396-9e29-038f4b346104')
+    )
+
+
+def deploy():
+    setup_logging(console_level=log_func.ABOVE_DEBUG)
+    runner = FanOutRunner(app_plan)
+    report = runner.apply([f"/env{i}" for i in range(8)], dry=False, check_drift=True)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    deploy()
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+
+class Boto3Provider:
+
+    def __init__(self, session):
+        self.__session = session
+        self.calls = []
+        session.events.register("before-call", lambda model, **kwargs: self.calls.append(model.name))
+
+    def create_client(self, name):
+        return self.__session.client(name)
+
+    def create_resource(self, name):
+        return self.__session.resource(name)
+
+
+@pytest.fixture
+def aws_provider():
+    moto = pytest.importorskip("moto")
+    import boto3
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        yield Boto3Provider(boto3.Session(region_name="us-east-1"))
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import uuid
+
+from bench.fake import FakeProvider
+from bench.plans import Node, AsyncNode, NodeInput, TreePlan, AsyncTreePlan, TreeInput
+from pdep.aio import ThreadedAsyncProvider
+from pdep.plan import FileResourceManager
+
+PLAN_UUID = uuid.UUID("3d7c9b1a-6e2f-4a85-b0c4-7f1e2d9a5c33")
+
+
+def mixed_node(input: NodeInput):
+    return (AsyncNode if input.level % 2 else Node)(input)
+
+
+class MixedTreePlan(AsyncTreePlan):
+    # async and sync nodes on alternating levels
+    node_class = staticmethod(mixed_node)
+
+
+class AsyncNodesTreePlan(TreePlan):
+    # the sync engine driving async resources through their sync wrappers
+    node_class = AsyncNode
+
+
+def parents(provider):
+    names = {item_id: item["Name"] for item_id, item in provider.items.items()}
+    return {item["Name"]: names.get(item["ParentId"]) for item in provider.items.values()}
+
+
+def expected_parents(count):
+    return {f"node-{i}": f"node-{(i - 1) // 2}" if i else None for i in range(count)}
+
+
+def test_apply_async_and_destroy_async(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+
+    async def run():
+        async_provider = ThreadedAsyncProvider(provider, max_workers=8)
+        try:
+            await AsyncTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).apply_async(resource_manager, async_provider)
+            assert parents(provider) == expected_parents(7)
+            assert resource_manager.get_state(PLAN_UUID) is not None
+
+            await AsyncTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).destroy_async(resource_manager,
+                                                                                       async_provider)
+        finally:
+            await async_provider.close()
+
+    asyncio.run(run())
+    assert provider.calls["bench.create_node"] == 7
+    assert provider.calls["bench.delete_node"] == 7
+    assert not provider.items
+    assert resource_manager.get_state(PLAN_UUID) is None
+
+
+def test_async_and_sync_nodes_mix(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+    plan = MixedTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID)
+    assert {type(node) for node in plan.resources.nodes} == {Node, AsyncNode}
+
+    plan.apply(resource_manager, provider)
+    assert parents(provider) == expected_parents(7)
+
+    provider.reset_calls()
+    MixedTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).apply(resource_manager, provider, check_drift=False)
+    assert provider.calls["bench.create_node"] == 0
+
+    MixedTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).destroy(resource_manager, provider)
+    assert not provider.items
+
+
+def test_sync_engine_applies_async_nodes(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+    AsyncNodesTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).apply(resource_manager, provider, max_workers=4)
+    assert parents(provider) == expected_parents(7)
+
+    AsyncNodesTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).destroy(resource_manager, provider, max_workers=4)
+    assert not provider.items
+
+
+def test_sync_wrapper_reuses_a_given_async_provider(tmp_path):
+    resource_manager = FileResourceManager(tmp_path / "state.json")
+    async_provider = ThreadedAsyncProvider(FakeProvider(), max_workers=2)
+    before = {thread for thread in threading.enumerate() if thread.name.startswith("pdep-aio")}
+
+    AsyncTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).apply(resource_manager, async_provider)
+    AsyncTreePlan(TreeInput(count=7, fanout=2), PLAN_UUID).destroy(resource_manager, async_provider)
+
+    pool_threads = {thread for thread in threading.enumerate() if thread.name.startswith("pdep-aio")} - before
+    assert len(pool_threads) <= 2
+    assert not async_provider.sync_provider.items
+    asyncio.run(async_provider.close())
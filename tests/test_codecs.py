@@ -0,0 +1,97 @@
+import pytest
+
+from pdep.__main__ import main
+from pdep.codecs import available_codecs, get_codec, decode_state, detect_codec, migrate_state_file
+from pdep.plan import FileResourceManager
+from pdep.sqlite import SqliteResourceManager
+
+STATE = {
+    "to_destroy": [{"uuid": "b", "input": {"n": 1}}],
+    "a": {"input": {"name": "x", "tags": {"k": "v"}}, "output": {"id": 2 ** 40, "ok": True, "none": None},
+          "folder": "/"},
+}
+CODECS = [name + suffix for name in available_codecs() for suffix in ("", "+zlib")]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(codec):
+    codec = get_codec(codec)
+    data = codec.dumps(STATE)
+    assert codec.loads(data) == STATE
+    # any codec reads back without being told which one wrote it
+    assert decode_state(data) == STATE
+    assert detect_codec(data).loads(data) == STATE
+
+
+def test_detects_the_writing_codec():
+    for codec in ("json", "json-compact", "json+zlib", "json-compact+zlib"):
+        assert detect_codec(get_codec(codec).dumps(STATE)).name == codec
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_migrate_state_file(tmp_path, codec):
+    src = tmp_path / "state.json"
+    src.write_bytes(get_codec("json").dumps(STATE))
+
+    dst = migrate_state_file(src, tmp_path / "migrated.json", codec)
+    assert dst == tmp_path / "migrated.json"
+    assert dst.read_bytes() == get_codec(codec).dumps(STATE)
+    assert decode_state(src.read_bytes()) == STATE
+
+    assert migrate_state_file(src, codec=codec) == src
+    assert decode_state(src.read_bytes()) == STATE
+
+
+def test_migrated_file_keeps_its_codec(tmp_path):
+    path = tmp_path / "state.json"
+    FileResourceManager(path).set_state("a", {"v": 1})
+    migrate_state_file(path, codec="json-compact+zlib")
+
+    resource_manager = FileResourceManager(path)
+    assert resource_manager.get_state("a")["v"] == 1
+    resource_manager.set_state("b", {"v": 2})
+    assert resource_manager.codec.name == "json-compact+zlib"
+    assert detect_codec(path.read_bytes()).name == "json-compact+zlib"
+
+    # an explicit codec still wins
+    FileResourceManager(path, codec="json").set_state("c", {"v": 3})
+    assert detect_codec(path.read_bytes()).name == "json"
+
+
+def test_migrate_sqlite_in_place(tmp_path):
+    path = tmp_path / "state.db"
+    resource_manager = SqliteResourceManager(path, codec="json")
+    resource_manager.set_state("a", {"input": {}, "output": {"v": 1}})
+    resource_manager.mark_destroy("b", {"uuid": "b", "input": {"v": 2}})
+    resource_manager.close()
+
+    with pytest.raises(ValueError):
+        migrate_state_file(path, tmp_path / "copy.db", "json+zlib")
+    migrate_state_file(path, codec="json+zlib")
+
+    resource_manager = SqliteResourceManager(path)
+    assert resource_manager.get_state("a")["output"] == {"v": 1}
+    assert resource_manager.get_to_destroy()[0]["input"] == {"v": 2}
+    resource_manager.close()
+
+
+def test_cli_migrates_every_src(tmp_path, capsys):
+    paths = [tmp_path / "a.json", tmp_path / "b.json"]
+    for path in paths:
+        path.write_bytes(get_codec("json").dumps(STATE))
+
+    main(["migrate", *map(str, paths), "--codec", "json-compact"])
+    assert all(detect_codec(path.read_bytes()).name == "json-compact" for path in paths)
+    assert "(json-compact)" in capsys.readouterr().out
+
+
+def test_cli_rejects_output_with_several_srcs(tmp_path, capsys):
+    paths = [tmp_path / "a.json", tmp_path / "b.json"]
+    for path in paths:
+        path.write_bytes(get_codec("json").dumps(STATE))
+
+    with pytest.raises(SystemExit) as exited:
+        main(["migrate", *map(str, paths), "-o", str(tmp_path / "out.json")])
+    assert exited.value.code == 2
+    assert "-o/--output takes a single src" in capsys.readouterr().err
+    assert not (tmp_path / "out.json").exists()
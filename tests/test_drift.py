@@ -0,0 +1,79 @@
+import uuid
+
+from bench.fake import FakeProvider
+from bench.plans import TreePlan, TreeInput
+from pdep.drift import DriftCache, drift_key
+from pdep.plan import FileResourceManager
+
+PLAN_UUID = uuid.UUID("5a1e8c3f-2b7d-4c96-a0e4-9f3b6d1c7e22")
+
+
+class Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_entry_expires_after_ttl():
+    clock = Clock()
+    cache = DriftCache(ttl=60, clock=clock)
+    cache.mark_clean("a")
+    clock.now += 60
+    assert cache.is_clean("a")
+    clock.now += 0.5
+    assert not cache.is_clean("a")
+    assert cache.checked_at("a") is None
+
+
+def test_older_check_never_replaces_a_newer_one():
+    clock = Clock()
+    cache = DriftCache(ttl=60, clock=clock)
+    cache.mark_clean("a")
+    cache.mark_clean("a", checked_at=clock.now - 30)
+    assert cache.checked_at("a") == clock.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DriftCache(max_entries=2, clock=Clock())
+    cache.mark_clean("a")
+    cache.mark_clean("b")
+    # a hit makes "a" the most recently used, "b" goes first
+    assert cache.is_clean("a")
+    cache.mark_clean("c")
+    assert cache.is_clean("a")
+    assert not cache.is_clean("b")
+    assert cache.is_clean("c")
+
+
+def test_key_changes_with_the_input():
+    output = {"id": "node-1", "name": "node-0"}
+    key = drift_key(PLAN_UUID, {"name": "node-0", "tags": {}}, output)
+    assert key == drift_key(PLAN_UUID, {"tags": {}, "name": "node-0"}, dict(output))
+    assert key != drift_key(PLAN_UUID, {"name": "node-0", "tags": {"a": "b"}}, output)
+
+
+def test_plan_skips_describes_while_clean(tmp_path):
+    clock = Clock()
+    cache = DriftCache(ttl=60, clock=clock)
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+
+    def apply(**tags):
+        provider.reset_calls()
+        TreePlan(TreeInput(count=5, fanout=2, tags=tags), PLAN_UUID, drift_cache=cache).apply(resource_manager,
+                                                                                               provider)
+        return provider.calls
+
+    assert apply()["bench.create_node"] == 5
+    assert apply()["bench.describe_nodes"] == 1
+    assert not apply()
+
+    clock.now += 61
+    assert apply()["bench.describe_nodes"] == 1
+
+    # a changed input is a new key, what was clean before says nothing about it
+    assert apply(a="b")["bench.update_node"] == 5
+    assert apply(a="b")["bench.describe_nodes"] == 1
+    assert not apply(a="b")
@@ -0,0 +1,174 @@
+import os
+from dataclasses import dataclass
+
+import pytest
+from dataclasses_json import dataclass_json
+
+from pdep.aws.dynamodb import DynamoDbResourceManager, InMemoryDynamoDbTable, Boto3DynamoDbTable
+from pdep.plan import StateConflict, OutputTypeNotFound
+from pdep.utils import class_full_name
+
+
+@dataclass_json
+@dataclass
+class Thing:
+    name: str = None
+
+
+class CountingTable(InMemoryDynamoDbTable):
+
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+
+    def query(self, pk: str):
+        self.queries += 1
+        return super().query(pk)
+
+
+@pytest.fixture(params=["memory", "moto"])
+def table(request):
+    if request.param == "memory":
+        yield InMemoryDynamoDbTable()
+        return
+    moto = pytest.importorskip("moto")
+    import boto3
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        yield Boto3DynamoDbTable.create(boto3.client("dynamodb"), "pdep-state")
+
+
+def state(output_type="pkg.Output", **output):
+    return {"output": output, "output_type": output_type}
+
+
+def test_get_set_delete(table):
+    rm = DynamoDbResourceManager(table)
+    assert rm.get_state("a") is None
+    rm.set_state("a", state(v=1))
+    rm.set_state("b", state(v=2))
+    assert rm.get_state("a")["output"] == {"v": 1}
+    assert rm.get_states(["a", "b", "c"]) == {"a": rm.get_state("a"), "b": rm.get_state("b"), "c": None}
+    rm.set_state("a", state(v=3))
+    rm.delete_state("b")
+    other = DynamoDbResourceManager(table)
+    assert other.get_state("a")["output"] == {"v": 3}
+    assert other.get_state("b") is None
+
+
+def test_namespaces_are_separate(table):
+    DynamoDbResourceManager(table, namespace="one").set_state("a", state(v=1))
+    assert DynamoDbResourceManager(table, namespace="two").get_state("a") is None
+
+
+def test_concurrent_write_is_a_conflict(table):
+    ours, theirs = DynamoDbResourceManager(table), DynamoDbResourceManager(table)
+    ours.set_state("a", state(v=1))
+    assert theirs.get_state("a")["output"] == {"v": 1}
+    ours.set_state("a", state(v=2))
+    with pytest.raises(StateConflict) as error:
+        theirs.set_state("a", state(v=3))
+    assert error.value.uuids == ["a"]
+    assert theirs.get_state("a")["output"] == {"v": 2}
+    # having read the current version it may write
+    theirs.set_state("a", state(v=3))
+    assert ours.get_state("a")["output"] == {"v": 3}
+
+
+def test_mark_destroy_and_clean_up(table):
+    rm = DynamoDbResourceManager(table)
+    rm.mark_destroy("a", {"uuid": "a", "generation": 1})
+    rm.mark_destroy("b", {"uuid": "b", "generation": 1})
+    rm.mark_destroy("a", {"uuid": "a", "generation": 2})
+    assert [(s["uuid"], s["generation"]) for s in rm.get_to_destroy()] == [("a", 1), ("b", 1), ("a", 2)]
+    # the state read and the record deleted are the same, newest generation
+    assert rm.get_state("a", from_delete=True)["generation"] == 2
+    rm.delete_state("a", from_delete=True)
+    assert rm.get_state("a", from_delete=True)["generation"] == 1
+    rm.delete_state("a", from_delete=True)
+    rm.delete_state("a", from_delete=True)
+    assert rm.get_state("a", from_delete=True) is None
+    assert [s["uuid"] for s in DynamoDbResourceManager(table).get_to_destroy()] == ["b"]
+
+
+def test_clean_up_pass_queries_once():
+    table = CountingTable()
+    rm = DynamoDbResourceManager(table)
+    for i in range(20):
+        rm.mark_destroy(str(i), {"uuid": str(i)})
+    table.queries = 0
+    to_destroy = rm.get_to_destroy()
+    for destroy_state in reversed(to_destroy):
+        assert rm.get_state(destroy_state["uuid"], from_delete=True) == destroy_state
+        rm.delete_state(destroy_state["uuid"], from_delete=True)
+    assert table.queries == 1
+    assert rm.get_to_destroy() == []
+
+
+def test_transaction_commit_and_rollback(table):
+    rm = DynamoDbResourceManager(table)
+    rm.set_state("kept", state(v=0))
+    rm.begin("apply-1")
+    rm.set_state("a", state(v=1))
+    rm.delete_state("kept")
+    rm.mark_destroy("old", {"uuid": "old"})
+    # staged changes are visible to reads, not written yet
+    assert rm.get_state("a")["output"] == {"v": 1}
+    assert rm.get_state("kept") is None
+    assert DynamoDbResourceManager(table).get_state("kept") is not None
+    rm.rollback()
+    assert rm.get_state("a") is None
+    assert rm.get_state("kept") is not None
+    assert rm.get_to_destroy() == []
+
+    rm.begin("apply-2")
+    rm.set_state("a", state(v=1))
+    rm.delete_state("kept")
+    rm.mark_destroy("old", {"uuid": "old"})
+    rm.commit()
+    fresh = DynamoDbResourceManager(table)
+    assert fresh.get_state("a")["output"] == {"v": 1}
+    assert fresh.get_state("kept") is None
+    assert [s["uuid"] for s in fresh.get_to_destroy()] == ["old"]
+
+
+def test_conflicting_commit_stays_open_to_roll_back(table):
+    ours, theirs = DynamoDbResourceManager(table), DynamoDbResourceManager(table)
+    ours.set_state("a", state(v=1))
+    theirs.get_state("a")
+    theirs.set_state("a", state(v=2))
+    ours.begin("apply")
+    ours.set_state("a", state(v=3))
+    ours.set_state("b", state(v=3))
+    with pytest.raises(StateConflict):
+        ours.commit()
+    ours.rollback()
+    assert ours.get_state("a")["output"] == {"v": 2}
+    assert ours.get_state("b") is None
+
+
+def test_put_states_is_conditional(table):
+    rm = DynamoDbResourceManager(table)
+    rm.put_states({str(i): state(v=i) for i in range(150)})
+    assert rm.get_state("149")["output"] == {"v": 149}
+    rm.put_states({"1": state(v="again")})
+    assert rm.get_state("1")["output"] == {"v": "again"}
+    with pytest.raises(StateConflict):
+        DynamoDbResourceManager(table).put_states({"2": state(v="blind")})
+    assert rm.get_state("2")["output"] == {"v": 2}
+
+
+def test_get_output_by_folder(table):
+    rm = DynamoDbResourceManager(table)
+    rm.folder = "/a"
+    rm.set_state("a", {"output": {"name": "first"}, "output_type": class_full_name(Thing)})
+    rm.folder = "/a/b"
+    rm.set_state("b", {"output": {"name": "second"}, "output_type": class_full_name(Thing)})
+    reader = DynamoDbResourceManager(table)
+    reader.folder = "/a/b/c"
+    assert reader.get_output(Thing) == Thing(name="first")
+    reader.folder = "/x"
+    with pytest.raises(OutputTypeNotFound):
+        reader.get_output(Thing)
@@ -0,0 +1,32 @@
+from bench.plans import Node
+from pdep.aws.eventbridge import EventBus, EventBusInput, EventBusOutput
+from pdep.plan import SimplifiedResource
+
+
+def test_single_describe_uses_input_name(aws_provider):
+    aws_provider.create_client("events").create_event_bus(Name="bus-a")
+    bus = EventBus(EventBusInput(name="bus-a"))
+    # a state written before create stored the name
+    bus._output = EventBusOutput(arn="arn")
+    assert bus.get_description(aws_provider)["Name"] == "bus-a"
+    assert aws_provider.calls[-1] == "DescribeEventBus"
+    assert EventBus(EventBusInput(name="missing")).get_description(aws_provider) is None
+
+
+def test_batch_describe_lists_once(aws_provider):
+    aws_provider.create_client("events").create_event_bus(Name="bus-a")
+    aws_provider.create_client("events").create_event_bus(Name="bus-b")
+    aws_provider.calls.clear()
+    outputs = [EventBusOutput(name=name) for name in ("bus-a", "missing", "bus-b")]
+    descriptions = EventBus.describe(aws_provider, outputs)
+    assert [d and d["Name"] for d in descriptions] == ["bus-a", None, "bus-b"]
+    assert aws_provider.calls == ["ListEventBuses"]
+
+
+def test_default_describe():
+    class Plain(SimplifiedResource[EventBusInput, EventBusOutput]):
+        pass
+
+    assert not Plain.can_describe() and EventBus.can_describe() and Node.can_describe()
+    assert Plain.describe(None, [EventBusOutput(), EventBusOutput()]) == [None, None]
+    assert Plain(EventBusInput(name="x")).get_description(None) is None
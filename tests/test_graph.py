@@ -0,0 +1,74 @@
+import sys
+import uuid
+
+import pytest
+
+from bench.fake import FakeProvider
+from bench.plans import TreePlan, TreeInput
+from pdep.graph import DependencyCycle, DependencyGraph
+from pdep.plan import FileResourceManager
+
+EDGES = {"app": ["db", "net"], "db": ["net"], "net": [], "dns": ["app"], "logs": []}
+
+
+def graph(edges=EDGES):
+    return DependencyGraph(edges, lambda node: edges[node])
+
+
+def test_topological_order():
+    order = graph().topological_order()
+    assert sorted(order) == sorted(EDGES)
+    for node, deps in EDGES.items():
+        assert all(order.index(dep) < order.index(node) for dep in deps)
+
+
+def test_edges_outside_the_graph_and_self_references_are_ignored():
+    g = DependencyGraph(["a", "b"], lambda node: {"a": ["a", "x"], "b": ["a"]}[node])
+    assert g.edge_count == 1
+    assert g.dependencies("b") == ["a"] and g.dependents("a") == ["b"]
+    assert g.roots() == ["a"]
+
+
+def test_levels_and_descendants():
+    assert [sorted(level) for level in graph().levels()] == [["logs", "net"], ["db"], ["app"], ["dns"]]
+    assert graph().descendants("net") == ["app", "db", "dns"]
+    path, cost = graph().critical_path()
+    assert path == ["net", "db", "app", "dns"] and cost == 4
+
+
+def test_cycle():
+    g = graph({"a": ["b"], "b": ["c"], "c": ["a"], "d": []})
+    assert g.find_cycle() in (["a", "b", "c", "a"], ["b", "c", "a", "b"], ["c", "a", "b", "c"])
+    with pytest.raises(DependencyCycle):
+        g.topological_order()
+    with pytest.raises(DependencyCycle):
+        g.levels()
+
+
+def test_ready_set():
+    g = graph()
+    ready_set = g.ready_set()
+    assert sorted(ready_set.drain()) == ["logs", "net"]
+    ready_set.done("net")
+    assert ready_set.pop() == "db"
+    ready_set.fail("db")
+    ready_set.done("logs")
+    assert not ready_set
+    assert sorted(ready_set.skipped()) == ["app", "dns"]
+    assert ready_set.done_count == 3
+
+
+def test_deep_chain_applies_and_destroys_without_recursing(tmp_path):
+    count = sys.getrecursionlimit() * 2
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json", cached=True), FakeProvider()
+    nodes = TreePlan(TreeInput(count=count, fanout=1), uuid.uuid4()).resources.nodes
+    nodes[-1].apply(resource_manager, provider, False, False)
+    assert provider.calls["bench.create_node"] == count
+    assert nodes[1].input.parent_id == nodes[0]._output.id is not None
+
+    for node in nodes:
+        node.reset_apply_state()
+    nodes[0].destroy(resource_manager, provider)
+    assert provider.calls["bench.delete_node"] == count
+    assert resource_manager.get_states([node.uuid for node in nodes[:2]]) == \
+        {str(node.uuid): None for node in nodes[:2]}
@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+from dataclasses import dataclass
+
+from dataclasses_json import dataclass_json
+
+from pdep.journal import JournalResourceManager
+from pdep.utils import class_full_name
+
+WRITERS = 8
+RECORDS = 25
+
+
+@dataclass_json
+@dataclass
+class Output:
+    v: int = 0
+
+
+def _write_records(args):
+    path, writer, transaction = args
+    resource_manager = JournalResourceManager(path, compact_every=40)
+    if transaction:
+        resource_manager.begin(f"writer-{writer}")
+    for i in range(RECORDS):
+        resource_manager.set_state(f"{writer}-{i}", {"output": {"i": i}, "output_type": "pkg.Output"})
+        if transaction and i % 10 == 9:
+            resource_manager.commit()
+            resource_manager.begin(f"writer-{writer}")
+    if transaction:
+        resource_manager.commit()
+    resource_manager.close()
+
+
+def _concurrent_writers(tmp_path, transaction):
+    path = tmp_path / "state.log"
+    with multiprocessing.get_context("fork").Pool(WRITERS) as pool:
+        pool.map(_write_records, [(path, writer, transaction) for writer in range(WRITERS)])
+
+    seqs = [record["seq"] for record in JournalResourceManager(path, compact_every=None).history()]
+    assert len(seqs) == len(set(seqs)) == WRITERS * RECORDS
+    assert seqs == sorted(seqs)
+    resource_manager = JournalResourceManager(path)
+    states = resource_manager.get_states([f"{w}-{i}" for w in range(WRITERS) for i in range(RECORDS)])
+    assert all(state is not None for state in states.values())
+
+
+def test_concurrent_writers(tmp_path):
+    _concurrent_writers(tmp_path, transaction=False)
+
+
+def test_concurrent_writers_in_transactions(tmp_path):
+    _concurrent_writers(tmp_path, transaction=True)
+
+
+def test_writer_sees_records_of_another(tmp_path):
+    path = tmp_path / "state.log"
+    first = JournalResourceManager(path)
+    second = JournalResourceManager(path)
+    first.set_state("a", {"output": {"v": 1}, "output_type": "pkg.Output"})
+    second.set_state("b", {"output": {"v": 2}, "output_type": "pkg.Output"})
+    assert second.get_state("a")["output"] == {"v": 1}
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record["seq"], record["uuid"]) for record in lines] == [(1, "a"), (2, "b")]
+
+
+def test_reader_catches_up_with_another_writer(tmp_path):
+    path = tmp_path / "state.log"
+    writer = JournalResourceManager(path, compact_every=None)
+    reader = JournalResourceManager(path, compact_every=None)
+    assert reader.get_state("a") is None
+
+    writer.set_state("a", {"output": {"v": 1}, "output_type": class_full_name(Output)})
+    writer.mark_destroy("old", {"uuid": "old", "input": {}})
+    assert reader.get_state("a")["output"] == {"v": 1}
+    assert reader.get_states(["a"])["a"]["output"] == {"v": 1}
+    assert reader.get_output(Output) == Output(v=1)
+    assert [state["uuid"] for state in reader.get_to_destroy()] == ["old"]
+
+    writer.set_state("a", {"output": {"v": 2}, "output_type": class_full_name(Output)})
+    writer.compact()
+    assert reader.get_state("a")["output"] == {"v": 2}
+
+    writer.delete_state("a")
+    assert reader.get_state("a") is None
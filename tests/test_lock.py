@@ -0,0 +1,133 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from pdep.lock import FileLease, LeaseTimeout, LeaseLost
+from pdep.plan import FileResourceManager, StateConflict
+from pdep.codecs import decode_state
+
+WRITERS = 8
+RECORDS = 25
+
+
+def holder(path):
+    return json.loads(open(path).read() or 'null')
+
+
+def test_lease_is_exclusive(tmp_path):
+    path = tmp_path / "state.lock"
+    with FileLease(path, ttl=5) as lease:
+        assert lease.held
+        with pytest.raises(LeaseTimeout):
+            FileLease(path, ttl=5, timeout=0.05).acquire()
+    assert holder(path) is None
+    with FileLease(path, ttl=5, timeout=0.05):
+        pass
+
+
+def test_lease_is_reentrant(tmp_path):
+    lease = FileLease(tmp_path / "state.lock", ttl=5)
+    with lease:
+        with lease:
+            assert lease.held
+        assert lease.held
+    assert not lease.held
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = tmp_path / "state.lock"
+    stale = FileLease(path, ttl=0.1, renew_every=0).acquire()
+    time.sleep(0.2)
+    fresh = FileLease(path, ttl=5, timeout=1).acquire()
+    token = holder(path)['token']
+    # the old holder must not clear the lease it lost
+    stale.release()
+    assert holder(path)['token'] == token
+    fresh.release()
+    assert holder(path) is None
+
+
+def test_renewed_lease_does_not_expire(tmp_path):
+    path = tmp_path / "state.lock"
+    with FileLease(path, ttl=0.3, renew_every=0.05):
+        time.sleep(0.6)
+        with pytest.raises(LeaseTimeout):
+            FileLease(path, ttl=5, timeout=0.1).acquire()
+
+
+def test_renew_fails_once_taken_over(tmp_path):
+    path = tmp_path / "state.lock"
+    lost = FileLease(path, ttl=0.1, renew_every=0).acquire()
+    time.sleep(0.2)
+    with FileLease(path, ttl=5, timeout=1):
+        with pytest.raises(LeaseLost):
+            lost.renew()
+        assert not lost.held
+    lost.release()
+
+
+def _die_holding(path):
+    FileLease(path, ttl=0.2, renew_every=0).acquire()
+    os._exit(0)
+
+
+def test_dead_holder_expires(tmp_path):
+    path = tmp_path / "state.lock"
+    process = multiprocessing.get_context("fork").Process(target=_die_holding, args=(path,))
+    process.start()
+    process.join()
+    assert holder(path)['pid'] == process.pid
+    with FileLease(path, ttl=5, timeout=2):
+        assert holder(path)['pid'] == os.getpid()
+
+
+def _write_records(args):
+    path, writer, transaction = args
+    resource_manager = FileResourceManager(path, lock=True, lock_timeout=30)
+    if transaction:
+        resource_manager.begin(f"apply-{writer}")
+    for i in range(RECORDS):
+        resource_manager.set_state(f"{writer}-{i}", {"writer": writer, "i": i})
+    resource_manager.mark_destroy(f"{writer}-gone", {"uuid": f"{writer}-gone"})
+    if transaction:
+        resource_manager.commit()
+
+
+@pytest.mark.parametrize("transaction", [False, True])
+def test_concurrent_writers_keep_every_record(tmp_path, transaction):
+    path = tmp_path / "state.json"
+    with multiprocessing.get_context("fork").Pool(WRITERS) as pool:
+        pool.map(_write_records, [(path, writer, transaction) for writer in range(WRITERS)])
+    state = decode_state(path.read_bytes())
+    assert len(state) - 1 == WRITERS * RECORDS
+    assert len(state["to_destroy"]) == WRITERS
+    assert sorted(os.listdir(tmp_path)) == ["state.json", "state.json.lock"]
+
+
+def test_lock_is_opt_in(tmp_path):
+    FileResourceManager(tmp_path / "state.json").set_state("a", {})
+    assert os.listdir(tmp_path) == ["state.json"]
+    assert list(decode_state((tmp_path / "state.json").read_bytes())) == ["to_destroy", "a"]
+
+
+def test_conflicting_write_fails_loudly(tmp_path):
+    path = tmp_path / "state.json"
+    ours = FileResourceManager(path, lock=True)
+    theirs = FileResourceManager(path, lock=True)
+    ours.set_state("shared", {"by": "ours"})
+    ours.begin("apply")
+    ours.set_state("shared", {"by": "ours", "again": True})
+    ours.set_state("mine", {"by": "ours"})
+    theirs.set_state("shared", {"by": "theirs"})
+    theirs.set_state("other", {"by": "theirs"})
+    with pytest.raises(StateConflict) as error:
+        ours.commit()
+    assert error.value.uuids == ["shared"]
+    # a failed commit leaves the transaction open
+    ours.rollback()
+    assert ours.get_state("shared")["by"] == "theirs"
+    assert ours.get_state("mine") is None
+    assert ours.get_state("other")["by"] == "theirs"
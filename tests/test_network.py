@@ -0,0 +1,32 @@
+import uuid
+from collections import Counter
+
+from pdep.aws.backbones.net.simplenetbb import SimpleNetBB, BasicNetBBInput
+from pdep.aws.network import Vpc, VpcInput, VpcOutput, describe_vpcs
+from pdep.plan import FileResourceManager
+
+
+def test_describe_skips_missing_ids(aws_provider):
+    vpc_id = aws_provider.create_client("ec2").create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+    descriptions = describe_vpcs(aws_provider, [None, vpc_id, "vpc-00000000"])
+    assert descriptions[0] is None and descriptions[2] is None
+    assert descriptions[1]["VpcId"] == vpc_id
+
+
+def test_never_created_resource_is_drifted(aws_provider):
+    vpc = Vpc(VpcInput(cidr_block="10.0.0.0/16"))
+    vpc._output = VpcOutput()
+    aws_provider.calls.clear()
+    assert vpc.is_drifted(aws_provider, dry=False)
+    assert aws_provider.calls == []
+
+
+def test_drift_check_describes_each_kind_once(aws_provider, tmp_path):
+    resource_manager, plan_uuid = FileResourceManager(tmp_path / "state.json"), uuid.uuid4()
+    net_input = BasicNetBBInput(vpc_cidr_block="10.0.0.0/16", subnets_num=4, region="us-east-1")
+    SimpleNetBB(net_input, plan_uuid).apply(resource_manager, aws_provider)
+
+    aws_provider.calls.clear()
+    SimpleNetBB(net_input, plan_uuid).apply(resource_manager, aws_provider)
+    # one batched describe per resource class, not one per subnet
+    assert Counter(aws_provider.calls) == {"DescribeVpcs": 1, "DescribeRouteTables": 1, "DescribeSubnets": 1}
@@ -0,0 +1,319 @@
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+import pytest
+from dataclasses_json import dataclass_json, config
+
+import pdep.plan
+from bench.fake import FakeProvider
+from bench.plans import Node, TreePlan, TreeInput
+from pdep.executor import ExecutionFailed
+from pdep.plan import FileResourceManager, SimplifiedResource, BaseBackbone
+from pdep.preview import CREATE, UPDATE, REPLACE, DESTROY, NO_OP, PlannedChange
+
+PLAN_UUID = uuid.UUID("7f0d7a52-3b1e-4f43-9c52-3c41ad0f0a11")
+
+
+class SuffixTreePlan(TreePlan):
+    suffix = ""
+
+    def do_init_resources(self):
+        super().do_init_resources()
+        for node in self.resources.nodes:
+            node.input.tags["suffix"] = self.suffix
+
+
+def apply(plan_class, resource_manager, provider):
+    provider.reset_calls()
+    plan_class(TreeInput(count=6, fanout=2), PLAN_UUID).apply(resource_manager, provider, check_drift=False)
+    return provider.calls
+
+
+def test_unchanged_plan_is_skipped(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+    assert apply(TreePlan, resource_manager, provider)["bench.create_node"] == 6
+    assert not apply(TreePlan, resource_manager, provider)
+    assert "memo" in resource_manager.get_state(PLAN_UUID)
+
+
+def test_changed_child_input_is_applied(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+    apply(SuffixTreePlan, resource_manager, provider)
+    # same plan input and code, the inputs the plan builds differ
+    SuffixTreePlan.suffix = "-b"
+    try:
+        assert apply(SuffixTreePlan, resource_manager, provider)["bench.update_node"] == 6
+    finally:
+        SuffixTreePlan.suffix = ""
+
+
+def test_changed_child_class_code_is_applied(tmp_path, monkeypatch, caplog):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), FakeProvider()
+    apply(TreePlan, resource_manager, provider)
+    class_code_version = pdep.plan.class_code_version
+    monkeypatch.setattr(pdep.plan, "class_code_version",
+                        lambda cls: "edited" if cls is Node else class_code_version(cls))
+    with caplog.at_level("INFO"):
+        apply(TreePlan, resource_manager, provider)
+    assert "resource(s) unchanged" not in caplog.text
+    assert caplog.text.count("skipped, input unchanged") == 6
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+@dataclass_json
+@dataclass
+class StampInput:
+    at: datetime = field(default=None, metadata=config(encoder=datetime.isoformat, decoder=datetime.fromisoformat))
+    id: UUID = None
+    color: Color = Color.RED
+    extra: Any = None
+
+
+@dataclass_json
+@dataclass
+class StampOutput:
+    created: int = 0
+
+
+class Stamp(SimplifiedResource[StampInput, StampOutput]):
+    created = 0
+
+    def create(self, provider, apply_uuid, dry):
+        Stamp.created += 1
+        self._output.created = Stamp.created
+
+    def update(self, env_inputs, resource_manager, provider, apply_uuid, dry):
+        return True
+
+
+class StampPlan(BaseBackbone[StampInput, StampOutput]):
+
+    def do_init_resources(self):
+        self.resources.stamp = Stamp(StampInput(at=self.input.at, id=self.input.id, color=self.input.color,
+                                                extra=self.input.extra))
+        self._output = self.resources.stamp.output
+
+
+@pytest.mark.parametrize("extra, skipped", [(None, True), ({1: "int key", "a": "str key"}, False)])
+def test_input_without_a_json_form(tmp_path, caplog, extra, skipped):
+    # orjson stores the datetime, UUID and Enum as they are, the mixed keys have no sorted json form
+    resource_manager = FileResourceManager(tmp_path / "state.json", codec="orjson")
+    input = StampInput(at=datetime(2024, 1, 1, tzinfo=timezone.utc), id=uuid.uuid4(), color=Color.BLUE, extra=extra)
+    plan = StampPlan(input, PLAN_UUID)
+    plan.apply(resource_manager, FakeProvider(), check_drift=False)
+    stamp_uuid = plan.resources.stamp.uuid
+    assert (resource_manager.get_state(stamp_uuid)["input_hash"] is not None) == skipped
+
+    with caplog.at_level("INFO"):
+        StampPlan(input, PLAN_UUID).apply(resource_manager, FakeProvider(), check_drift=False)
+    assert ("resource(s) unchanged" in caplog.text) == skipped
+    # applied again without an input hash, never created twice
+    assert resource_manager.get_state(stamp_uuid)["output"]["created"] == plan.resources.stamp._output.created
+
+
+class RenamedRootTreePlan(TreePlan):
+
+    def do_init_resources(self):
+        super().do_init_resources()
+        self.resources.nodes[0].input.name = "renamed-root"
+
+
+class NoWriteManager(FileResourceManager):
+    # fails the test on anything that would change state
+
+    def set_state(self, uuid, state):
+        raise AssertionError(f"set_state({uuid}) during preview")
+
+    def delete_state(self, uuid, from_delete=False):
+        raise AssertionError(f"delete_state({uuid}) during preview")
+
+    def mark_destroy(self, uuid, state):
+        raise AssertionError(f"mark_destroy({uuid}) during preview")
+
+    def begin(self, apply_uuid):
+        raise AssertionError("begin() during preview")
+
+
+def preview(plan_class, resource_manager, **input):
+    return plan_class(TreeInput(**{"count": 6, "fanout": 2, **input}), PLAN_UUID).preview(resource_manager)
+
+
+def actions(plan_preview):
+    return [change.action for change in plan_preview.changes]
+
+
+@pytest.fixture
+def applied(tmp_path):
+    path = tmp_path / "state.json"
+    TreePlan(TreeInput(count=6, fanout=2), PLAN_UUID).apply(FileResourceManager(path), FakeProvider(),
+                                                             check_drift=False)
+    return NoWriteManager(path)
+
+
+def test_preview_create(tmp_path):
+    plan_preview = preview(TreePlan, NoWriteManager(tmp_path / "state.json"))
+    assert actions(plan_preview) == [CREATE] * 6
+    assert plan_preview.counts[CREATE] == 6 and plan_preview.has_changes
+
+
+def test_preview_no_op(applied):
+    plan_preview = preview(TreePlan, applied)
+    assert actions(plan_preview) == [NO_OP] * 6
+    assert not plan_preview.has_changes
+    assert "0 to create, 0 to update, 0 to replace, 0 to destroy, 6 unchanged" in plan_preview.summary()
+
+
+def test_preview_update(applied):
+    assert actions(preview(TreePlan, applied, tags={"env": "test"})) == [UPDATE] * 6
+
+
+def test_preview_replace_because_of_a_dependency(applied):
+    plan_preview = preview(RenamedRootTreePlan, applied)
+    root, *rest = plan_preview.changes
+    assert root.path == "$.nodes[0]" and root.action == REPLACE and root.reason == "input changed"
+    # only the parent id changes below the root, it isn't known until the root is replaced
+    assert all(change.action == REPLACE and "depends on $.nodes[" in change.reason for change in rest)
+    assert "depends on $.nodes[0] (replace)" in plan_preview.changes[1].reason
+
+
+def test_preview_added_node(applied):
+    plan_preview = preview(TreePlan, applied, count=7)
+    assert actions(plan_preview) == [NO_OP] * 6 + [CREATE]
+    assert plan_preview.by_action(CREATE)[0].path == "$.nodes[6]"
+
+
+def test_preview_left_over_state_is_destroyed(tmp_path):
+    resource_manager = FileResourceManager(tmp_path / "state.json")
+    resource_manager.mark_destroy("gone", {"uuid": "gone", "path": "$.old", "class": "bench.plans.Node"})
+    plan_preview = preview(TreePlan, resource_manager)
+    assert plan_preview.by_action(DESTROY) == [PlannedChange("$.old", "bench.plans.Node", "gone", DESTROY,
+                                                             "left over by an earlier apply")]
+
+
+def test_preview_writes_nothing_and_calls_no_provider(applied, tmp_path, monkeypatch):
+    def no_call(provider, service, operation, **kwargs):
+        raise AssertionError(f"{service}.{operation} during preview")
+
+    # preview takes no provider, any fake provider call at all fails the test
+    monkeypatch.setattr(FakeProvider, "call", no_call)
+    before = (tmp_path / "state.json").read_bytes()
+    for plan_class, input in ((TreePlan, {}), (TreePlan, {"count": 7, "tags": {"env": "test"}}),
+                              (RenamedRootTreePlan, {})):
+        plan = plan_class(TreeInput(**{"count": 6, "fanout": 2, **input}), PLAN_UUID)
+        plan.preview(applied)
+        # the stored outputs swapped in while peeking are put back, nothing counts as applied
+        assert all(not node._applied and node._output.id is None for node in plan.resources.nodes)
+    assert (tmp_path / "state.json").read_bytes() == before
+
+
+class Broken(Exception):
+    pass
+
+
+class RecordingProvider(FakeProvider):
+    # fake cloud that records the order of node calls, how many overlapped and fails on the named nodes
+
+    def __init__(self, fail=(), **kwargs):
+        super().__init__(**kwargs)
+        self.fail = set(fail)
+        self.order = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.__lock = threading.Lock()
+
+    def call(self, service, operation, **kwargs):
+        name = kwargs.get("Name") or self.items.get(kwargs.get("Id"), {}).get("Name")
+        if operation in ("create_node", "delete_node") and name in self.fail:
+            raise Broken(name)
+        with self.__lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            result = super().call(service, operation, **kwargs)
+        finally:
+            with self.__lock:
+                self.in_flight -= 1
+        with self.__lock:
+            self.order.append((operation, name))
+        return result
+
+
+def tree(count=15):
+    return TreePlan(TreeInput(count=count, fanout=2), PLAN_UUID)
+
+
+def parents(provider):
+    names = {item_id: item["Name"] for item_id, item in provider.items.items()}
+    return {item["Name"]: names[item["ParentId"]] for item in provider.items.values() if item["ParentId"]}
+
+
+def positions(provider, operation):
+    return {name: i for i, (op, name) in enumerate(provider.order) if op == operation}
+
+
+def test_parallel_apply_creates_parents_first(tmp_path):
+    provider = RecordingProvider(latency=0.002, jitter=0.01)
+    tree().apply(FileResourceManager(tmp_path / "state.json"), provider, max_workers=8)
+
+    created = positions(provider, "create_node")
+    assert len(created) == 15
+    assert provider.max_in_flight > 1
+    for child, parent in parents(provider).items():
+        assert created[parent] < created[child]
+
+
+def test_parallel_destroy_runs_in_reverse_order(tmp_path):
+    resource_manager, provider = FileResourceManager(tmp_path / "state.json"), RecordingProvider(latency=0.002,
+                                                                                                   jitter=0.01)
+    tree().apply(resource_manager, provider, max_workers=8)
+    hierarchy = parents(provider)
+
+    tree().destroy(resource_manager, provider, max_workers=8)
+    deleted = positions(provider, "delete_node")
+    assert len(deleted) == 15
+    assert not provider.items
+    assert provider.max_in_flight > 1
+    for child, parent in hierarchy.items():
+        assert deleted[child] < deleted[parent]
+
+
+def names(resources):
+    return {res.input.name for res in resources}
+
+
+def test_failed_apply_skips_dependents_of_the_failure(tmp_path):
+    provider = RecordingProvider(fail={"node-1"})
+    with pytest.raises(ExecutionFailed) as failed:
+        tree(count=7).apply(FileResourceManager(tmp_path / "state.json"), provider, max_workers=4)
+
+    assert names(failed.value.failures) == {"node-1"}
+    assert all(isinstance(exc, Broken) for exc in failed.value.failures.values())
+    # node-1's children never start
+    assert {"node-3", "node-4"} <= names(failed.value.skipped)
+    assert not {"node-1", "node-3", "node-4"} & set(positions(provider, "create_node"))
+
+
+def test_failed_destroy_carries_on_and_reports_failed_and_skipped(tmp_path):
+    resource_manager = FileResourceManager(tmp_path / "state.json")
+    provider = RecordingProvider()
+    tree(count=7).apply(resource_manager, provider)
+    # node-0 -> node-1 -> node-3, node-4 and node-0 -> node-2 -> node-5, node-6
+    provider.fail = {"node-3"}
+    provider.order.clear()
+
+    with pytest.raises(ExecutionFailed) as failed:
+        tree(count=7).destroy(resource_manager, provider, max_workers=4)
+
+    assert names(failed.value.failures) == {"node-3"}
+    # whatever waits on node-3 to be gone is skipped, with fail_fast=False everything else still runs
+    assert names(failed.value.skipped) == {"node-1", "node-0"}
+    assert set(positions(provider, "delete_node")) == {"node-2", "node-4", "node-5", "node-6"}
@@ -0,0 +1,143 @@
+import uuid
+
+import pytest
+
+from bench.fake import FakeProvider
+from bench.plans import TreePlan, TreeInput
+from pdep.aws.dynamodb import DynamoDbResourceManager, InMemoryDynamoDbTable
+from pdep.journal import JournalResourceManager
+from pdep.plan import FileResourceManager, NoTransaction
+from pdep.sqlite import SqliteResourceManager
+
+MANAGERS = {
+    "file": lambda path: FileResourceManager(path / "state.json"),
+    "file-cached": lambda path: FileResourceManager(path / "state.json", cached=True),
+    "file-locked": lambda path: FileResourceManager(path / "state.json", lock=True),
+    "sqlite": lambda path: SqliteResourceManager(path / "state.db"),
+    "journal": lambda path: JournalResourceManager(path / "state.log"),
+    "dynamodb": lambda path: DynamoDbResourceManager(InMemoryDynamoDbTable()),
+}
+
+
+@pytest.fixture(params=list(MANAGERS))
+def resource_manager(request, tmp_path):
+    return MANAGERS[request.param](tmp_path)
+
+
+def state(**output):
+    return {"output": output, "output_type": "pkg.Output"}
+
+
+def test_get_set_delete(resource_manager):
+    assert resource_manager.get_state("a") is None
+    resource_manager.set_state("a", state(v=1))
+    resource_manager.set_state("b", state(v=2))
+    resource_manager.set_state("a", state(v=3))
+    assert resource_manager.get_state("a")["output"] == {"v": 3}
+    assert {uuid: s and s["output"] for uuid, s in resource_manager.get_states(["a", "b", "c"]).items()} == \
+        {"a": {"v": 3}, "b": {"v": 2}, "c": None}
+    resource_manager.delete_state("b")
+    assert resource_manager.get_state("b") is None
+
+
+def test_commit(resource_manager):
+    resource_manager.begin("apply")
+    resource_manager.begin("nested")
+    resource_manager.set_state("a", state(v=1))
+    resource_manager.mark_destroy("old", {"uuid": "old"})
+    resource_manager.commit()
+    assert resource_manager.in_transaction
+    assert resource_manager.apply_uuid == "apply"
+    resource_manager.commit()
+    assert not resource_manager.in_transaction
+    assert resource_manager.get_state("a")["output"] == {"v": 1}
+    assert [s["uuid"] for s in resource_manager.get_to_destroy()] == ["old"]
+    with pytest.raises(NoTransaction):
+        resource_manager.commit()
+
+
+def test_mark_destroy(resource_manager):
+    resource_manager.mark_destroy("a", {"uuid": "a", "generation": 1})
+    resource_manager.mark_destroy("b", {"uuid": "b", "generation": 1})
+    resource_manager.mark_destroy("a", {"uuid": "a", "generation": 2})
+    assert resource_manager.get_state("a", from_delete=True)["generation"] == 2
+    # the entry that was read is the one removed
+    resource_manager.delete_state("a", from_delete=True)
+    assert [(s["uuid"], s["generation"]) for s in resource_manager.get_to_destroy()] == [("a", 1), ("b", 1)]
+    assert resource_manager.get_state("a", from_delete=True)["generation"] == 1
+    resource_manager.delete_state("a", from_delete=True)
+    resource_manager.delete_state("b", from_delete=True)
+    assert resource_manager.get_to_destroy() == []
+
+
+def test_rollback(resource_manager):
+    resource_manager.set_state("kept", state(v=0))
+    resource_manager.begin("apply")
+    resource_manager.set_state("a", state(v=1))
+    resource_manager.delete_state("kept")
+    resource_manager.mark_destroy("old", {"uuid": "old"})
+    assert resource_manager.get_state("a")["output"] == {"v": 1}
+    resource_manager.rollback()
+    assert not resource_manager.in_transaction
+    assert resource_manager.get_state("a") is None
+    assert resource_manager.get_state("kept")["output"] == {"v": 0}
+    assert resource_manager.get_to_destroy() == []
+    with pytest.raises(NoTransaction):
+        resource_manager.rollback()
+
+
+def test_plan_state_round_trip(resource_manager):
+    provider, plan_uuid = FakeProvider(), uuid.uuid4()
+    applied = TreePlan(TreeInput(count=5, tags={"env": "test"}), plan_uuid)
+    applied.apply(resource_manager, provider, check_drift=False)
+    provider.reset_calls()
+    # outputs come back from stored state only, through the codec and from_dict
+    read_back = TreePlan(TreeInput(count=5, tags={"env": "test"}), plan_uuid)
+    read_back.apply(resource_manager, provider, check_drift=False)
+    assert not provider.calls
+    assert read_back._output == applied._output
+    assert read_back._output.root.id is not None
+
+
+class FailingProvider(FakeProvider):
+
+    def __init__(self, fail_on):
+        super().__init__()
+        self.__fail_on = fail_on
+
+    def call(self, service, operation, **kwargs):
+        if operation == "create_node" and kwargs.get("Name") == self.__fail_on:
+            raise RuntimeError(f"cannot create {self.__fail_on}")
+        return super().call(service, operation, **kwargs)
+
+
+class FailingCommitManager(FileResourceManager):
+
+    def _write_transaction(self) -> None:
+        raise OSError("disk full")
+
+
+def test_failed_apply_records_what_was_applied(tmp_path):
+    resource_manager = FileResourceManager(tmp_path / "state.json")
+    plan = TreePlan(TreeInput(count=5), uuid.uuid4())
+    with pytest.raises(RuntimeError, match="node-3"):
+        plan.apply(resource_manager, FailingProvider("node-3"), check_drift=False)
+    assert not resource_manager.in_transaction
+    recorded = resource_manager.get_states([res.uuid for res in plan.resources.nodes])
+    assert sum(state is not None for state in recorded.values()) == 3
+
+
+def test_failed_commit_does_not_mask_the_apply_error(tmp_path):
+    resource_manager = FailingCommitManager(tmp_path / "state.json")
+    plan = TreePlan(TreeInput(count=5), uuid.uuid4())
+    with pytest.raises(RuntimeError, match="node-3"):
+        plan.apply(resource_manager, FailingProvider("node-3"), check_drift=False)
+    assert not resource_manager.in_transaction
+
+
+def test_failed_commit_is_rolled_back(tmp_path):
+    resource_manager = FailingCommitManager(tmp_path / "state.json")
+    with pytest.raises(OSError):
+        TreePlan(TreeInput(count=5), uuid.uuid4()).apply(resource_manager, FakeProvider(), check_drift=False)
+    assert not resource_manager.in_transaction
+    assert resource_manager.get_to_destroy() == []
@@ -0,0 +1,50 @@
+import json
+import multiprocessing
+import os
+import uuid
+
+from bench.fake import FakeProvider
+from bench.plans import TreePlan, TreeInput
+from pdep.runner import FanOutRunner, FileResourceManagerFactory, Environment
+
+PLAN_UUID = uuid.UUID("0b6f2d8e-1c4a-4e57-8f3b-5d2a9c7e4b10")
+
+
+class Outage(Exception):
+    pass
+
+
+class OutageProvider(FakeProvider):
+
+    def call(self, service, operation, **kwargs):
+        raise Outage(f"{service}.{operation}")
+
+
+def tree_plan(resource_manager, env: Environment):
+    return TreePlan(TreeInput(count=3, prefix=env.name), PLAN_UUID)
+
+
+def provider_for(env: Environment):
+    return OutageProvider() if env.name == "broken" else FakeProvider()
+
+
+def test_environments_fan_out_to_processes(tmp_path):
+    runner = FanOutRunner(tree_plan, FileResourceManagerFactory(str(tmp_path / "state_{name}.json")), provider_for,
+                          max_processes=2, mp_context=multiprocessing.get_context("fork"))
+    report = runner.apply([Environment("dev", "/dev/"), Environment("broken", "/broken/")])
+
+    assert [result.name for result in report.results] == ["dev", "broken"]
+    dev, broken = report.results
+    assert dev.ok and dev.pid != os.getpid()
+    assert dev.output["count"] == 3
+    assert dev.output["root"]["name"] == "dev-0"
+    assert not broken.ok
+    assert "Outage: bench.create_node" in broken.error
+    assert [result.name for result in report.failed] == ["broken"]
+
+    states = json.loads((tmp_path / "state_dev.json").read_text())
+    assert states[str(PLAN_UUID)]["folder"] == "/dev/"
+    assert sorted(state["input"]["name"] for key, state in states.items()
+                  if key not in ("to_destroy", str(PLAN_UUID))) == ["dev-0", "dev-1", "dev-2"]
+    # broken failed on its first create, nothing was written for it
+    assert not (tmp_path / "state_broken.json").exists()
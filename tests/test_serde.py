@@ -0,0 +1,104 @@
+import warnings
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Union
+
+import pytest
+from dataclasses_json import dataclass_json, config, LetterCase
+
+from pdep.aws.backbones.net.interfaces import BasicNetBBOutput, BasicNetBBInput
+from pdep.aws.network import SubnetOutput, VpcOutput, SubnetInput
+from pdep.serde import to_dict, from_dict, clear_cache
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+@dataclass_json
+@dataclass
+class Leaf:
+    name: str = None
+    color: Color = Color.RED
+
+
+@dataclass_json
+@dataclass
+class Tree:
+    name: str
+    leaves: List[Leaf] = field(default_factory=list)
+    by_name: Dict[str, Leaf] = field(default_factory=dict)
+    best: Optional[Leaf] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+    either: Union[int, str, None] = None
+
+
+@dataclass_json(letter_case=LetterCase.CAMEL)
+@dataclass
+class Camel:
+    some_value: int = 0
+
+
+@dataclass_json
+@dataclass
+class Renamed:
+    value: int = field(default=0, metadata=config(field_name="v"))
+
+
+@dataclass_json
+@dataclass
+class UnionOfDataclasses:
+    item: Union[Leaf, Camel, None] = None
+
+
+def subnet(i):
+    return SubnetOutput(arn=f"arn:aws:ec2:us-east-1:000000000000:subnet/subnet-{i}", subnet_id=f"subnet-{i}",
+                        cidr_block=f"10.0.{i}.0/24", availability_zone="us-east-1a", state="available")
+
+
+SAMPLES = [
+    SubnetInput(vpc_id="vpc-1", cidr_block="10.0.1.0/24", availability_zone="us-east-1a", tags={"env": "test"}),
+    BasicNetBBInput(vpc_cidr_block="10.0.0.0/16", subnets_num=3, region="us-east-1", tags={"env": "test"}),
+    BasicNetBBOutput(region="us-east-1", vpc=VpcOutput(vpc_id="vpc-1", cidr_block="10.0.0.0/16"),
+                     subnets=[subnet(i) for i in range(3)], public_subnets=[subnet(3)]),
+    Tree(name="t", leaves=[Leaf("a"), Leaf("b", Color.BLUE)], by_name={"c": Leaf("c")}, best=Leaf("d"),
+         labels={"k": "v"}, either=3),
+    Camel(some_value=4),
+    Renamed(value=5),
+    UnionOfDataclasses(item=None),
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=lambda sample: sample.__class__.__name__)
+def test_round_trip_matches_dataclasses_json(sample):
+    encoded = to_dict(sample)
+    assert encoded == sample.to_dict()
+    assert from_dict(sample.__class__, encoded) == sample.__class__.from_dict(encoded) == sample
+
+
+def test_decodes_missing_fields_from_defaults():
+    assert from_dict(Tree, {"name": "t"}) == Tree(name="t")
+    with pytest.raises(KeyError):
+        from_dict(Tree, {})
+
+
+def test_none_for_non_optional_field_warns():
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert from_dict(Leaf, {"name": None, "color": None}).color is None
+    assert any(issubclass(warning.category, RuntimeWarning) for warning in caught)
+
+
+def test_overrides_fall_back_to_dataclasses_json():
+    assert to_dict(Camel(some_value=1)) == {"someValue": 1}
+    assert from_dict(Camel, {"someValue": 1}) == Camel(some_value=1)
+    assert to_dict(Renamed(value=2)) == {"v": 2}
+    assert from_dict(Renamed, {"v": 2}) == Renamed(value=2)
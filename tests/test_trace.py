@@ -0,0 +1,76 @@
+import gc
+import threading
+import weakref
+
+import pytest
+
+from bench.fake import FakeProvider
+from bench.plans import AsyncTreePlan, TreeInput
+from pdep.plan import AwsLocalStackProvider, FileResourceManager
+from pdep.trace import Tracer, trace_span
+
+
+class Sent(Exception):
+    pass
+
+
+def stop_before_sending(**kwargs):
+    # nothing listens on the localstack endpoint here, the call ends before it is sent
+    raise Sent()
+
+
+def call(client):
+    with pytest.raises(Sent):
+        client.list_queues()
+
+
+def test_provider_counts_calls_per_span():
+    provider = AwsLocalStackProvider()
+    provider.add_event_hook("before-send", stop_before_sending)
+    with Tracer() as tracer:
+        with trace_span("outer"):
+            call(provider.create_client("sqs"))
+            call(provider.create_resource("sqs").meta.client)
+    assert tracer.spans[0].calls == {"sqs.ListQueues": 2}
+
+
+def test_hook_added_later_reaches_existing_clients():
+    provider = AwsLocalStackProvider()
+    client = provider.create_client("sqs")
+    provider.add_event_hook("before-send", stop_before_sending)
+    call(client)
+    call(provider.create_resource("sqs").meta.client)
+
+
+def test_clients_of_finished_threads_are_not_kept():
+    provider = AwsLocalStackProvider()
+    clients = []
+
+    def create():
+        # boto3 resources are cached per thread
+        clients.append(weakref.ref(provider.create_resource("sqs").meta.client))
+
+    for _ in range(5):
+        thread = threading.Thread(target=create)
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert len(clients) == 5 and all(client() is None for client in clients)
+
+
+def test_async_plan_is_traced_like_the_sync_engine(tmp_path):
+    plan = AsyncTreePlan(TreeInput(count=7, fanout=2), "9e5a4c1e-5c7e-4f4a-9d6b-2b9a7c3e1f00")
+    with Tracer() as tracer:
+        plan.apply(FileResourceManager(tmp_path / "state.json"), FakeProvider())
+
+    names = [span.name for span in tracer.spans]
+    assert names.count("plan_apply") == 1
+    assert names.count("apply") == 7
+    assert names.count("create") == 7
+    create_calls = sum(span.calls["bench.create_node"] for span in tracer.spans if span.name == "create")
+    assert create_calls == 7
+
+    path, total = tracer.critical_path()
+    # root -> child -> grandchild
+    assert len(path) == 3
+    assert total > 0
@@ -0,0 +1,42 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+
+from bench.plans import Node, NodeInput
+from pdep.utils import stable_hash
+
+
+class Color(Enum):
+    RED = "red"
+
+
+def test_stable_hash_sorts_sets():
+    first = stable_hash({"b", "a", "c"}, frozenset({3, 1, 2}), [{"x", "y"}])
+    second = stable_hash({"c", "b", "a"}, frozenset({2, 3, 1}), [{"y", "x"}])
+    assert first == second
+    assert stable_hash({"a", "b"}) == stable_hash(["a", "b"])
+
+
+def test_stable_hash_encodes_extended_types():
+    assert stable_hash(datetime(2024, 1, 1)) == stable_hash("2024-01-01T00:00:00")
+    assert stable_hash(Decimal("1.50"), Color.RED) == stable_hash("1.50", "red")
+
+
+def test_stable_hash_rejects_values_without_a_json_form():
+    with pytest.raises(TypeError):
+        stable_hash({"at": object()})
+    with pytest.raises(TypeError):
+        stable_hash({1.5j: "complex"})
+
+
+def test_stable_hash_lenient():
+    assert stable_hash(object, strict=False) == stable_hash(str(object))
+
+
+def test_input_hash():
+    node = Node(NodeInput(name="a", tags={"x": "1", "y": "2"}))
+    assert node.input_hash(NodeInput(name="a", tags={"y": "2", "x": "1"})) == node.input_hash(node.input)
+    assert node.input_hash(NodeInput(name="b")) != node.input_hash(node.input)
+    assert node.input_hash(NodeInput(name="a", tags={"x": object()})) is None